@@ -1,2 +1,2 @@
 from . import api, cli, extra, core
-from .core import Habitica
+from .core import Habitica, AsyncHabitica
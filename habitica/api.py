@@ -1,11 +1,28 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
-import sys
+import sys, os
 import json, re
+import codecs
+import marshal, struct
+import mmap
+import gc
 import time
+import random
+import datetime
+import email.utils
+import threading
+import functools
+import collections, collections.abc
+import urllib.parse
+import concurrent.futures
 import logging
 logger = logging.getLogger('habitica')
 import contextlib
+import asyncio
+try:
+    import aiohttp
+except ImportError: # pragma: no cover
+    aiohttp = None
 try:
     import importlib_resources
     pkg_resources = None
@@ -17,9 +34,9 @@ logging.captureWarnings(True)
 import requests
 import requests.adapters
 import urllib3
-import urllib3.util.retry
 logging.getLogger('urllib3.connectionpool').setLevel(logging.CRITICAL)
 from . import config
+from . import cache
 
 @contextlib.contextmanager
 def load_resource_filename(module_name, path):
@@ -41,17 +58,89 @@ with load_resource_filename('habitica', 'data/USER_ID') as USER_ID_FILE:
         print('Please ensure that proper User ID is used (see https://habitica.com/user/settings/api)')
         sys.exit(1)
 
-class dotdict(dict):
+class dataview(dict):
     """ Dict that support dotted access:
       d['value']['nested_value'] == d.value.nested_value
+    Missing keys are returned as None.
+
+    Nested plain dicts are returned as views (see nestedview)
+    that wrap original dicts without copying them and without modifying container,
+    so changes made via nested views go directly to the original data.
+    Still a dict, so it can be passed wherever dicts are expected (json etc).
 
     <https://stackoverflow.com/a/23689767/2128769>
     """
+    __slots__ = ()
     def __getattr__(self, attr):
-        value = dict.get(self, attr)
-        return dotdict(value) if type(value) is dict else value
+        try:
+            value = dict.__getitem__(self, attr)
+        except KeyError:
+            return None
+        if type(value) is dict:
+            return nestedview(value)
+        return value
     __setattr__ = dict.__setitem__
     __delattr__ = dict.__delitem__
+    @staticmethod
+    def item(container, key):
+        """ Returns container[key] (container may be any mapping).
+        Plain dict value is wrapped into nestedview.
+        """
+        value = container[key]
+        if type(value) is dict:
+            return nestedview(value)
+        return value
+
+class nestedview(collections.abc.MutableMapping):
+    """ Lightweight view of a plain dict with the same dotted access as dataview.
+    All reads and writes go to the original dict, nothing is copied.
+    It is not a dict itself: use unwrap() where real dict is required (json, marshal).
+    """
+    __slots__ = ('_dict',)
+    def __init__(self, data):
+        object.__setattr__(self, '_dict', data)
+    def __getattr__(self, attr):
+        try:
+            value = self._dict[attr]
+        except KeyError:
+            return None
+        if type(value) is dict:
+            return nestedview(value)
+        return value
+    def __setattr__(self, attr, value):
+        self._dict[attr] = value
+    def __delattr__(self, attr):
+        del self._dict[attr]
+    def __getitem__(self, key):
+        return self._dict[key]
+    def __setitem__(self, key, value):
+        self._dict[key] = value
+    def __delitem__(self, key):
+        del self._dict[key]
+    def __contains__(self, key):
+        return key in self._dict
+    def __iter__(self):
+        return iter(self._dict)
+    def __len__(self):
+        return len(self._dict)
+    def get(self, key, default=None):
+        return self._dict.get(key, default)
+    def keys(self):
+        return self._dict.keys()
+    def items(self):
+        return self._dict.items()
+    def values(self):
+        return self._dict.values()
+    def __eq__(self, other):
+        return self._dict == unwrap(other)
+    def __repr__(self):
+        return repr(self._dict)
+
+def unwrap(value):
+    """ Returns original dict for nestedview, any other value as is. """
+    return value._dict if type(value) is nestedview else value
+
+dotdict = dataview # Old name, kept for compatibility.
 
 class Delay:
     """ Ensures specific interval between remote requests
@@ -65,9 +154,9 @@ class Delay:
         self.default_delay = default_delay
         self.method_delays = {key.lower():value for key,value in specific_method_delays.items()}
         self._last_request_time = 0
-    def wait_for(self, method):
-        """ Stops execution until proper delay between requests is reached.
-        May not freeze at all if last request was enough time ago.
+    def delay_for(self, method):
+        """ Returns time (in seconds) that is left until proper delay
+        between requests is reached. Zero if no wait is needed.
         """
         delay = self.method_delays.get(method.lower(), self.default_delay)
         passed = (time.time() - self._last_request_time)
@@ -75,6 +164,12 @@ class Delay:
         logger.debug('Max delay: {0}'.format(delay))
         delay = delay - passed
         logger.debug('Actual delay: {0}'.format(delay))
+        return max(0, delay)
+    def wait_for(self, method):
+        """ Stops execution until proper delay between requests is reached.
+        May not freeze at all if last request was enough time ago.
+        """
+        delay = self.delay_for(method)
         if delay > 0:
             time.sleep(delay)
     def update(self):
@@ -83,11 +178,941 @@ class Delay:
         """
         self._last_request_time = time.time()
 
+def parse_rate_limit_reset(value, now=None):
+    """ Parses value of X-RateLimit-Reset header into timestamp.
+    Habitica sends JS Date string ('Mon Oct 19 2026 10:00:00 GMT+0000 (Coordinated Universal Time)'),
+    HTTP dates and plain numbers (epoch timestamps or seconds from now) are supported too.
+    Returns None if value cannot be parsed.
+    """
+    if not value:
+        return None
+    value = str(value).strip()
+    try:
+        number = float(value)
+        if number > 10**9:
+            return number
+        return (time.time() if now is None else now) + number
+    except ValueError:
+        pass
+    match = re.match(r'^\w{3} (\w{3} \d{1,2} \d{4} \d{2}:\d{2}:\d{2}) GMT([+-]\d{4})', value)
+    if match:
+        try:
+            return datetime.datetime.strptime(' '.join(match.groups()), '%b %d %Y %H:%M:%S %z').timestamp()
+        except ValueError: # pragma: no cover
+            return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+class RateLimiter:
+    """ Token bucket that follows server rate limit.
+
+    Bucket holds up to <limit> tokens and is refilled at rate <limit> per <period> seconds,
+    every request takes one token. If there are tokens left, requests are performed
+    immediately (short bursts are allowed), otherwise caller waits for refill.
+    Once server reports actual budget via X-RateLimit-Limit/Remaining/Reset headers,
+    bucket is synced with it: remaining tokens are taken from server
+    and full refill happens at reset time (as on server).
+
+    If <reserve> is given, that number of tokens is never used
+    (e.g. batch requests leave part of budget for user's interactive calls).
+
+    If <state_file> is given, bucket state is stored in that file (guarded by file lock),
+    so all processes that use the same file draw from the single budget.
+    """
+    LIMIT = 30 # Default Habitica limit, requests...
+    PERIOD = 60 # ...per this amount of seconds.
+    def __init__(self, limit=LIMIT, period=PERIOD, reserve=0, state_file=None):
+        self.limit = limit
+        self.period = period
+        self.reserve = reserve
+        self.state_file = Path(state_file) if state_file else None
+        self._lock = threading.Lock()
+        self._state = None
+    def _default_state(self):
+        return {'tokens':self.limit, 'updated':time.time(), 'limit':self.limit, 'reset':None}
+    def _load(self):
+        if self.state_file is None:
+            return self._state or self._default_state()
+        try:
+            state = json.loads(self.state_file.read_text())
+            if not isinstance(state, dict) or not {'tokens', 'updated', 'limit', 'reset'} <= set(state):
+                raise ValueError('Invalid rate limit state: {0}'.format(state))
+            return state
+        except FileNotFoundError:
+            return self._default_state()
+        except ValueError as e:
+            logger.debug('Failed to load rate limit state: {0}'.format(e))
+            return self._default_state()
+    def _save(self, state):
+        self._state = state
+        if self.state_file is not None:
+            self.state_file.write_text(json.dumps(state))
+    @contextlib.contextmanager
+    def _locked_state(self):
+        """ Loads state (refilled up to current moment), yields it for modifications
+        and stores it back. Whole operation is guarded against other threads and processes.
+        """
+        with self._lock:
+            with (config.file_lock(self.state_file) if self.state_file else contextlib.nullcontext()):
+                state = self._load()
+                self._refill(state, time.time())
+                yield state
+                self._save(state)
+    def _refill(self, state, now):
+        limit = state['limit']
+        if state['reset'] is not None:
+            if now < state['reset']:
+                state['updated'] = now
+                return
+            state['tokens'] = min(limit, state['tokens'] + limit)
+            state['reset'] = None
+        else:
+            rate = limit / self.period
+            state['tokens'] = min(limit, state['tokens'] + max(0, now - state['updated']) * rate)
+        state['updated'] = now
+    def delay_for(self, method):
+        """ Takes token for the next request and returns time (in seconds)
+        that caller should wait before actually performing request. Zero if no wait is needed.
+        """
+        with self._locked_state() as state:
+            now = state['updated']
+            deficit = self.reserve + 1 - state['tokens']
+            rate = state['limit'] / self.period
+            if deficit <= 0:
+                delay = 0
+            elif state['reset'] is not None:
+                delay = (state['reset'] - now) + max(0, deficit - state['limit']) / rate
+            else:
+                delay = deficit / rate
+            state['tokens'] -= 1
+            logger.debug('Rate limit tokens left: %s, delay for %s: %s', state['tokens'], method, delay)
+        return delay
+    def wait_for(self, method):
+        """ Stops execution until there is token available for the request.
+        Does not freeze at all if there is enough budget left.
+        """
+        delay = self.delay_for(method)
+        if delay > 0:
+            time.sleep(delay)
+    def update(self, headers=None):
+        """ Updates bucket using server rate limit headers (if present).
+        Should be called right after actual remote request.
+        """
+        if not headers:
+            return
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        with self._locked_state() as state:
+            try:
+                state['limit'] = int(headers.get('X-RateLimit-Limit') or state['limit'])
+                state['tokens'] = min(state['limit'], int(remaining))
+            except ValueError:
+                logger.debug('Invalid rate limit headers: {0}'.format(headers))
+                return
+            state['reset'] = parse_rate_limit_reset(headers.get('X-RateLimit-Reset'), now=state['updated'])
+
+def connection_not_established(error):
+    """ Returns True if request failed because connection to server
+    could not be established, i.e. request was not sent at all.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError):
+        reason = error.args[0] if error.args else None
+        reason = getattr(reason, 'reason', reason)
+        return isinstance(reason, urllib3.exceptions.NewConnectionError)
+    return False
+
+class RetryPolicy:
+    """ Decides whether failed request should be retried and how long to wait before that.
+    Idempotent requests (IDEMPOTENT_METHODS) are retried on timeouts, connection errors
+    and HTTP errors with RETRY_STATUSES.
+    Other requests (e.g. scoring) are retried only if they certainly were not processed
+    by server (see was_not_processed()), otherwise retry could apply them twice.
+    - max_attempts: total number of attempts (including the first one);
+    - deadline: total time (seconds) for all attempts and waits, None means no limit;
+    - backoff: wait before the first retry, doubled for every next retry
+      up to max_backoff seconds;
+    - jitter: random part of wait (0..1), so many clients do not retry all at once.
+    Retry-After header (usually sent along with 429 and 503) is used as is instead of backoff.
+    Counts retries, total wait time and calls that gave up (see stats()). Thread-safe.
+    """
+    MAX_ATTEMPTS = 4
+    DEADLINE = 60.0
+    BACKOFF = 0.5
+    MAX_BACKOFF = 10.0
+    JITTER = 0.5
+    RETRY_STATUSES = (429, 502, 503, 504)
+    # DELETE is not here: repeating already processed deletion fails.
+    IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT')
+    def __init__(self, max_attempts=None, deadline=DEADLINE, backoff=None, max_backoff=MAX_BACKOFF, jitter=JITTER, random=random.random):
+        self.max_attempts = self.MAX_ATTEMPTS if max_attempts is None else max_attempts
+        self.deadline = deadline
+        self.backoff = self.BACKOFF if backoff is None else backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._random = random
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.gave_up = 0
+        self.waited = 0.0
+    def is_retryable(self, error, method='GET'):
+        if isinstance(error, CircuitOpenError):
+            return False
+        if method.upper() not in self.IDEMPOTENT_METHODS:
+            return self.was_not_processed(error)
+        if isinstance(error, requests.exceptions.HTTPError):
+            return getattr(error.response, 'status_code', None) in self.RETRY_STATUSES
+        return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+    def was_not_processed(self, error):
+        """ Returns True if failed request certainly was not processed by server:
+        connection was not established, rate limit was hit (429)
+        or service is unavailable (503) and asks to retry later (Retry-After).
+        """
+        if isinstance(error, requests.exceptions.HTTPError):
+            status = getattr(error.response, 'status_code', None)
+            return status == 429 or (status == 503 and self.retry_after(error) is not None)
+        return connection_not_established(error)
+    @staticmethod
+    def retry_after(error, now=None):
+        """ Returns wait time (seconds) from Retry-After header of HTTP error
+        (either delay in seconds or HTTP date) or None if there is no such header.
+        """
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+        if not headers:
+            return None
+        now = time.time() if now is None else now
+        retry_at = parse_rate_limit_reset(headers.get('Retry-After'), now=now)
+        return None if retry_at is None else max(0, retry_at - now)
+    def next_delay(self, attempt, error, elapsed, method='GET'):
+        """ Returns wait time before the next attempt
+        or None if call should fail with given error.
+        Attempt is the number of failed attempt (starting from 1),
+        elapsed is the time spent since the start of the call,
+        method is HTTP method of the request.
+        """
+        if not self.is_retryable(error, method):
+            return None
+        delay = self.retry_after(error)
+        if delay is None:
+            delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+            delay *= 1 - self.jitter * self._random()
+        with self._lock:
+            if attempt >= self.max_attempts or (self.deadline is not None and elapsed + delay > self.deadline):
+                self.gave_up += 1
+                return None
+            self.retries += 1
+            self.waited += delay
+        return delay
+    def stats(self):
+        """ Returns dict with counters: retries, gave_up, waited (seconds). """
+        with self._lock:
+            return {
+                    'retries': self.retries,
+                    'gave_up': self.gave_up,
+                    'waited': self.waited,
+                    }
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """ Raised without any actual request while circuit breaker is open. """
+
+class CircuitBreaker:
+    """ Fails calls fast while remote server seems to be down.
+    After <threshold> consecutive failed calls (timeouts, connection errors and 5xx
+    after all retries) breaker opens and all calls fail immediately with CircuitOpenError.
+    After <reset_timeout> seconds single trial call is let through (half-open state):
+    if it succeeds, breaker is closed again, otherwise it opens for another period.
+    Any response that is not a server error counts as success. Thread-safe.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+    THRESHOLD = 5
+    RESET_TIMEOUT = 30.0
+    def __init__(self, name, threshold=THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial = False
+    def before_call(self):
+        """ Raises CircuitOpenError if call should not be performed. """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = time.monotonic()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return
+            self.rejected += 1
+            retry_in = max(0, self.opened_at + self.reset_timeout - now)
+        raise CircuitOpenError('Circuit breaker for {0} is open, server seems to be down. Retry in {1:.0f}s.'.format(self.name, retry_in))
+    @staticmethod
+    def is_failure(error):
+        if isinstance(error, requests.exceptions.HTTPError):
+            return (getattr(error.response, 'status_code', None) or 0) >= 500
+        return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+    def after_call(self, error=None):
+        """ Records result of the call (error is None for success). """
+        with self._lock:
+            self._trial = False
+            if error is None or not self.is_failure(error):
+                self.state = self.CLOSED
+                self.failures = 0
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.debug('Circuit breaker for %s is open after %s failures.', self.name, self.failures)
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+    def stats(self):
+        """ Returns dict: state, failures (consecutive), opened (times), rejected (calls). """
+        with self._lock:
+            return {
+                    'state': self.state,
+                    'failures': self.failures,
+                    'opened': self.times_opened,
+                    'rejected': self.rejected,
+                    }
+
+class CircuitBreakers:
+    """ Set of circuit breakers, one per remote host.
+    Can be shared between several API objects.
+    """
+    def __init__(self, **breaker_params):
+        self._breaker_params = breaker_params
+        self._breakers = {}
+        self._lock = threading.Lock()
+    def get(self, uri):
+        """ Returns breaker for the host of given URI. """
+        host = urllib.parse.urlsplit(uri).netloc
+        with self._lock:
+            if host not in self._breakers:
+                self._breakers[host] = CircuitBreaker(host, **self._breaker_params)
+            return self._breakers[host]
+    def stats(self):
+        """ Returns stats of every breaker (see CircuitBreaker.stats()) by host name. """
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {host:breaker.stats() for host, breaker in breakers.items()}
+
+class SingleFlight:
+    """ Coalesces identical calls, so they share single actual call and its result.
+    While the call for the key is in progress, all other callers with the same key
+    wait for it and receive the same result (or the same exception).
+    If <window> is given, successful result is also reused by calls
+    that come within that many seconds after it was finished.
+    Reused results can be dropped via forget() (e.g. after data was changed on server).
+    Re-entrant call with the same key (e.g. from response hook of the call itself)
+    is performed directly instead of waiting for itself.
+    Thread-safe.
+    """
+    def __init__(self, window=0):
+        self.window = window
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._leaders = {}
+        self._recent = {}
+        self._generation = 0
+    def forget(self):
+        """ Drops all finished results, so next calls will be performed again. """
+        with self._lock:
+            self._recent.clear()
+            self._generation += 1
+    def _find_recent(self, key):
+        """ Returns (True, result) if there is recent result for the key,
+        otherwise (False, None). Should be called under lock.
+        """
+        if key not in self._recent:
+            return False, None
+        finished, result = self._recent[key]
+        if time.monotonic() - finished > self.window:
+            del self._recent[key]
+            return False, None
+        return True, result
+    @staticmethod
+    def _current_caller():
+        return threading.get_ident()
+    def _is_reentrant(self, key):
+        """ True if call for the key is already being performed by the current caller.
+        Should be called under lock.
+        """
+        return key in self._calls and self._leaders.get(key) == self._current_caller()
+    def _finish(self, key, generation, result):
+        """ Unregisters finished call and remembers its result (if any). """
+        with self._lock:
+            del self._calls[key]
+            del self._leaders[key]
+            if self.window > 0 and generation == self._generation:
+                self._recent[key] = (time.monotonic(), result)
+    def do(self, key, func):
+        """ Calls func() or waits for already running call with the same key. """
+        with self._lock:
+            found, result = self._find_recent(key)
+            if found:
+                logger.debug('Reusing recent result: {0}'.format(key))
+                return result
+            if self._is_reentrant(key):
+                return func()
+            future = self._calls.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = self._calls[key] = concurrent.futures.Future()
+                self._leaders[key] = self._current_caller()
+            generation = self._generation
+        if not is_leader:
+            logger.debug('Waiting for the same call in progress: {0}'.format(key))
+            return future.result()
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key, None, None)
+            future.set_exception(e)
+            raise
+        self._finish(key, generation, result)
+        future.set_result(result)
+        return result
+
+class AsyncSingleFlight(SingleFlight):
+    """ Asyncio variant of SingleFlight for calls within single event loop. """
+    @staticmethod
+    def _current_caller():
+        return asyncio.current_task()
+    async def do(self, key, coro_func):
+        """ Awaits coro_func() or already running call with the same key. """
+        found, result = self._find_recent(key)
+        if found:
+            logger.debug('Reusing recent result: {0}'.format(key))
+            return result
+        if self._is_reentrant(key):
+            return await coro_func()
+        future = self._calls.get(key)
+        if future is not None:
+            logger.debug('Waiting for the same call in progress: {0}'.format(key))
+            return await asyncio.shield(future)
+        future = self._calls[key] = asyncio.get_running_loop().create_future()
+        self._leaders[key] = self._current_caller()
+        generation = self._generation
+        try:
+            result = await coro_func()
+        except asyncio.CancelledError:
+            self._finish(key, None, None)
+            future.cancel()
+            raise
+        except BaseException as e:
+            self._finish(key, None, None)
+            future.set_exception(e)
+            future.exception() # Mark as retrieved in case there are no other waiters.
+            raise
+        self._finish(key, generation, result)
+        future.set_result(result)
+        return result
+
+class ConditionalCache:
+    """ Validator cache for conditional GET requests.
+    Stores ETag/Last-Modified of JSON responses along with raw response content
+    (per URL+query), so the next request for the same resource is sent
+    with If-None-Match/If-Modified-Since headers and on 304 Not Modified
+    the stored body is returned without downloading it again.
+    Content is parsed only on hits, so every hit returns new copy of the body
+    (callers may modify responses) and full responses cost nothing extra.
+    Keeps at most max_entries (least recently used ones are dropped).
+    Counts hits (304), misses (full responses) and bytes saved. Thread-safe.
+    """
+    MAX_ENTRIES = 100
+    Entry = collections.namedtuple('Entry', 'etag last_modified content')
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+    def __len__(self):
+        return len(self._entries)
+    def lookup(self, key):
+        """ Returns stored entry for the key or None. """
+        with self._lock:
+            return self._entries.get(key)
+    @staticmethod
+    def validators(entry):
+        """ Returns conditional request headers for given entry (may be None). """
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.etag:
+            headers['If-None-Match'] = entry.etag
+        if entry.last_modified:
+            headers['If-Modified-Since'] = entry.last_modified
+        return headers
+    def hit(self, key, entry):
+        """ Registers 304 response for the entry and returns new copy of its stored body. """
+        with self._lock:
+            self.hits += 1
+            self.bytes_saved += len(entry.content)
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return json.loads(entry.content)
+    def store(self, key, headers, content):
+        """ Registers full response with raw JSON content (bytes or str).
+        Stores it if it has validators, otherwise drops previous entry (if any).
+        """
+        etag = headers.get('ETag') if headers else None
+        last_modified = headers.get('Last-Modified') if headers else None
+        with self._lock:
+            self.misses += 1
+            if not etag and not last_modified:
+                self._entries.pop(key, None)
+                return
+            self._entries[key] = self.Entry(etag, last_modified, content)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    def stats(self):
+        """ Returns dict with counters: hits, misses, bytes_saved, entries. """
+        with self._lock:
+            return {
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'bytes_saved': self.bytes_saved,
+                    'entries': len(self._entries),
+                    }
+
+class LazyJSON:
+    """ Renders object as formatted JSON only when converted to string,
+    e.g. when log record is actually emitted:
+    >>> logger.debug('Response: %s', LazyJSON(response))
+    """
+    def __init__(self, obj):
+        self.obj = obj
+    def __str__(self):
+        return json.dumps(self.obj, indent=2, sort_keys=True)
+
+class JSONArrayParser:
+    """ Incremental (push) parser for huge JSON responses.
+    Decodes elements of JSON array one by one as soon as each of them is fully received,
+    so memory usage is bounded by a single element (plus a chunk), not by the whole document.
+    If field is specified, array is expected to be the value of that field of top-level object
+    (like 'data' in Habitica responses), other fields of that object are decoded as usual
+    and are collected in .rest; otherwise the whole document should be an array.
+    >>> parser = JSONArrayParser('data')
+    >>> for chunk in chunks:
+    ...     for item in parser.feed(chunk):
+    ...         process(item)
+    >>> for item in parser.close():
+    ...     process(item)
+    Raises ValueError on malformed or incomplete document.
+    """
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+    _NUMBER_START = '-0123456789'
+    _DELIMITERS = ' \t\n\r,]}'
+    def __init__(self, field='data'):
+        self.field = field
+        self.rest = {}
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'object' if field else 'array'
+        self._key = None
+        self._closed = False
+    def feed(self, chunk):
+        """ Adds next chunk (bytes) of document and returns list of completed elements. """
+        self._buffer = self._buffer[self._pos:] + self._text.decode(chunk)
+        self._pos = 0
+        return list(self._parse())
+    def close(self):
+        """ Marks end of document and returns list of remaining elements. """
+        self._buffer = self._buffer[self._pos:] + self._text.decode(b'', final=True)
+        self._pos = 0
+        self._closed = True
+        items = list(self._parse())
+        if self._state != 'done':
+            raise ValueError('Unexpected end of JSON document')
+        return items
+    def _next_char(self):
+        self._pos = self._WHITESPACE.match(self._buffer, self._pos).end()
+        return self._buffer[self._pos] if self._pos < len(self._buffer) else None
+    def _expect(self, char, expected):
+        if char not in expected:
+            raise ValueError('Expected one of {0} at {1}, got {2}'.format(repr(expected), self._pos, repr(char)))
+        self._pos += 1
+        return char
+    def _value(self):
+        """ Returns (True, value) or (False, None) if more data is needed. """
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if self._closed:
+                raise
+            return False, None
+        if not self._closed and self._buffer[self._pos] in self._NUMBER_START:
+            if end == len(self._buffer) or self._buffer[end] not in self._DELIMITERS:
+                return False, None # Number may be continued in the next chunk.
+        self._pos = end
+        return True, value
+    def _parse(self):
+        while True:
+            char = self._next_char()
+            if char is None:
+                return
+            if self._state == 'done':
+                raise ValueError('Extra data after JSON document at {0}'.format(self._pos))
+            elif self._state == 'object':
+                self._expect(char, '{')
+                self._state = 'key_or_end'
+            elif self._state in ('key', 'key_or_end'):
+                if self._state == 'key_or_end' and char == '}':
+                    self._pos += 1
+                    self._state = 'done'
+                    continue
+                self._expect(char, '"')
+                self._pos -= 1
+                complete, self._key = self._value()
+                if not complete:
+                    return
+                self._state = 'colon'
+            elif self._state == 'colon':
+                self._expect(char, ':')
+                self._state = 'field_value'
+            elif self._state == 'field_value':
+                if self._key == self.field:
+                    self._expect(char, '[')
+                    self._state = 'element_or_end'
+                    continue
+                complete, value = self._value()
+                if not complete:
+                    return
+                self.rest[self._key] = value
+                self._state = 'next_key'
+            elif self._state == 'next_key':
+                self._state = 'key' if self._expect(char, ',}') == ',' else 'done'
+            elif self._state == 'array':
+                self._expect(char, '[')
+                self._state = 'element_or_end'
+            elif self._state in ('element', 'element_or_end'):
+                if self._state == 'element_or_end' and char == ']':
+                    self._pos += 1
+                    self._state = 'next_key' if self.field else 'done'
+                    continue
+                complete, value = self._value()
+                if not complete:
+                    return
+                self._state = 'next_element'
+                yield value
+            elif self._state == 'next_element':
+                if self._expect(char, ',]') == ',':
+                    self._state = 'element'
+                else:
+                    self._state = 'next_key' if self.field else 'done'
+
+class CallSpan:
+    """ Timings and stats of a single actual API call (including all retries).
+    Timings (seconds) are accumulated per phase:
+    - queue: waiting for the turn in rate limiter (other threads and processes);
+    - rate_limit: sleeping until rate limit allows the request;
+    - network: sending request and receiving response;
+    - backoff: waiting between retries (see RetryPolicy);
+    - decode: parsing JSON response;
+    - hook: tracking server version and running response hook.
+    Also keeps number of attempts, sent/received bytes, last HTTP status
+    and exception (if call failed).
+    Request body and parsed response are attached only if payload was requested
+    (see Instrumentation.subscribe), and even then they are not serialized or copied.
+    """
+    PHASES = ('queue', 'rate_limit', 'network', 'backoff', 'decode', 'hook')
+    def __init__(self, method, uri, with_payload=False):
+        self.method = method.upper()
+        self.uri = uri
+        self.timings = dict.fromkeys(self.PHASES, 0.0)
+        self.attempts = 0
+        self.status = None
+        self.reason = None
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.error = None
+        self.with_payload = with_payload
+        self.request_body = None
+        self.response = None
+    @property
+    def total(self):
+        return sum(self.timings.values())
+    @contextlib.contextmanager
+    def measure(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[phase] += time.perf_counter() - start
+    def sent(self, size, body=None):
+        self.attempts += 1
+        self.request_bytes += size
+        if self.with_payload:
+            self.request_body = body
+    def received(self, status, reason, size):
+        self.status = status
+        self.reason = reason
+        self.response_bytes += size
+    def decoded(self, response):
+        if self.with_payload:
+            self.response = response
+    def failed(self, error):
+        self.error = error
+    def __repr__(self):
+        return '{0} {1} {2}: {3}'.format(self.method, self.uri, self.status,
+                ', '.join('{0}={1:.3f}s'.format(phase, self.timings[phase]) for phase in self.PHASES),
+                )
+
+class _NullSpan(CallSpan):
+    """ Span that records nothing. Used when there are no subscribers. """
+    _NULL_CONTEXT = contextlib.nullcontext()
+    def __init__(self):
+        pass
+    def measure(self, phase):
+        return self._NULL_CONTEXT
+    def sent(self, size, body=None):
+        pass
+    def received(self, status, reason, size):
+        pass
+    def decoded(self, response):
+        pass
+    def failed(self, error):
+        pass
+
+class Instrumentation:
+    """ Passes finished call spans (see CallSpan) to subscribers:
+    >>> api.instrumentation.subscribe(lambda span: print(span.method, span.uri, span.total))
+    Subscriber is called (in the thread that performed the call) once per actual request.
+    Requests that were served without network (coalesced or cached) do not produce spans.
+    If there are no subscribers, nothing is measured at all.
+    Exceptions from subscribers are logged and ignored.
+    """
+    NULL_SPAN = _NullSpan()
+    def __init__(self):
+        self._subscribers = []
+        self._with_payload = False
+    def subscribe(self, callback, payload=False):
+        """ Adds subscriber. If payload is True, spans will have
+        request body and parsed response attached.
+        Returns callback, so it can be used as a decorator.
+        """
+        self._subscribers = self._subscribers + [(callback, payload)]
+        self._with_payload = self._with_payload or payload
+        return callback
+    def unsubscribe(self, callback):
+        self._subscribers = [entry for entry in self._subscribers if entry[0] != callback]
+        self._with_payload = any(payload for _, payload in self._subscribers)
+    def start(self, method, uri):
+        if not self._subscribers:
+            return self.NULL_SPAN
+        return CallSpan(method, uri, with_payload=self._with_payload)
+    def finish(self, span):
+        if span is self.NULL_SPAN:
+            return
+        for callback, _ in self._subscribers:
+            try:
+                callback(span)
+            except:
+                logger.exception('Exception in API instrumentation subscriber!')
+
+@contextlib.contextmanager
+def gc_paused():
+    """ Disables garbage collector within context.
+    Cached data is acyclic, so there is no need to track new objects during load,
+    while collections triggered by bulk allocations would traverse the whole heap.
+    """
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+def write_atomic(filename, content):
+    """ Writes bytes to a temporary file and replaces target file with it,
+    so readers (including ones that have target file mapped into memory)
+    never see partially written content.
+    """
+    filename = Path(filename)
+    tmp_file = filename.with_name(filename.name + '.{0}.tmp'.format(os.getpid()))
+    tmp_file.write_bytes(content)
+    os.replace(str(tmp_file), str(filename))
+
+def write_marshal(filename, header, data):
+    """ Atomically writes data to file in marshal format, prefixed by header.
+    Raises ValueError if data contains non-plain types.
+    """
+    write_atomic(filename, header + marshal.dumps(data))
+
+def read_marshal(filename, header):
+    """ Returns data from file written by write_marshal()
+    or None if file is missing, corrupted or has different header.
+    """
+    try:
+        content = Path(filename).read_bytes()
+    except FileNotFoundError:
+        return None
+    if not content.startswith(header):
+        logger.debug('Binary cache {0} is outdated or incompatible.'.format(filename))
+        return None
+    try:
+        with gc_paused():
+            return marshal.loads(memoryview(content)[len(header):])
+    except (ValueError, EOFError, TypeError) as e:
+        logger.debug('Failed to load binary cache {0}: {1}'.format(filename, e))
+        return None
+
+class ShardedData(collections.abc.Mapping):
+    """ Read-only mapping, value for each key is stored in a separate file (shard)
+    and is loaded only on the first access.
+    If shard is missing or outdated (does not match header),
+    falls back to full data (loaded via given callable).
+    """
+    def __init__(self, directory, keys, header, load_full_data):
+        self._directory = Path(directory)
+        self._keys = list(keys)
+        self._header = header
+        self._load_full_data = load_full_data
+        self._loaded = {}
+    @staticmethod
+    def shard_file(directory, key):
+        return Path(directory)/'{0}.marshal'.format(urllib.parse.quote(key, safe=''))
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+        if key not in self._keys:
+            raise KeyError(key)
+        logger.debug('Loading shard: {0}'.format(key))
+        value = read_marshal(self.shard_file(self._directory, key), self._header)
+        if value is None:
+            logger.debug('Shard is invalid, loading full data.')
+            self._loaded.update(self._load_full_data())
+            return self._loaded[key]
+        self._loaded[key] = value
+        return value
+    def __iter__(self):
+        return iter(self._keys)
+    def __len__(self):
+        return len(self._keys)
+
+class MappedData(collections.abc.Mapping):
+    """ Read-only mapping over a pack file that is mapped into memory (mmap).
+    Pack file consists of marshalled values and index nodes:
+    every node maps keys to positions of values within file,
+    dicts that are large enough (MIN_NODE_SIZE) are stored as nested nodes,
+    everything else is stored as a single marshalled value.
+    Values are decoded lazily on the first access to each key,
+    so only touched parts of data are loaded into process memory,
+    and the file itself is shared between all processes via OS page cache.
+    Pack file is always replaced atomically (see write_atomic),
+    so already mapped data stays valid even when file is rebuilt.
+    If value cannot be decoded, falls back to full data (loaded via given callable).
+    """
+    MIN_NODE_SIZE = 4096 # Smaller dicts are stored as single value.
+    ROOT = struct.Struct('<QQ') # Position (offset, length) of root node, right after header.
+    def __init__(self, buffer, offset, length, load_full_data, _path=()):
+        self._buffer = buffer
+        self._path = _path
+        self._load_full_data = load_full_data
+        self._index = self._decode(offset, length)
+        self._loaded = {}
+    def _decode(self, offset, length):
+        if offset + length > len(self._buffer):
+            raise ValueError('Position {0}+{1} is out of pack file bounds'.format(offset, length))
+        with gc_paused():
+            return marshal.loads(self._buffer[offset:offset + length])
+    @classmethod
+    def pack(cls, data, header):
+        """ Returns content of pack file for given data (dict of plain types). """
+        chunks = []
+        position = [len(header) + cls.ROOT.size]
+        def _append(serialized):
+            offset = position[0]
+            chunks.append(serialized)
+            position[0] += len(serialized)
+            return offset, len(serialized)
+        def _pack(value, force_node=False):
+            serialized = marshal.dumps(value)
+            if not isinstance(value, dict) or (not force_node and len(serialized) < cls.MIN_NODE_SIZE):
+                return (False,) + _append(serialized)
+            index = {key:_pack(item) for key, item in value.items()}
+            return (True,) + _append(marshal.dumps(index))
+        _, root_offset, root_length = _pack(data, force_node=True)
+        return b''.join([header, cls.ROOT.pack(root_offset, root_length)] + chunks)
+    @classmethod
+    def open(cls, filename, header, load_full_data):
+        """ Maps pack file into memory and returns root MappedData
+        or None if file is missing, corrupted or has different header.
+        """
+        try:
+            with open(str(filename), 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e: # Empty file cannot be mapped.
+            logger.debug('Failed to map pack file {0}: {1}'.format(filename, e))
+            return None
+        if buffer[:len(header)] != header:
+            logger.debug('Pack file {0} is outdated or incompatible.'.format(filename))
+            return None
+        try:
+            root_offset, root_length = cls.ROOT.unpack_from(buffer, len(header))
+            return cls(buffer, root_offset, root_length, load_full_data)
+        except (struct.error, ValueError, EOFError, TypeError) as e:
+            logger.debug('Failed to load pack file {0}: {1}'.format(filename, e))
+            return None
+    def __getitem__(self, key):
+        try:
+            return self._loaded[key]
+        except KeyError:
+            pass
+        is_node, offset, length = self._index[key]
+        try:
+            if is_node:
+                value = type(self)(self._buffer, offset, length, self._load_full_data, _path=self._path + (key,))
+            else:
+                value = self._decode(offset, length)
+        except (ValueError, EOFError, TypeError) as e:
+            logger.debug('Failed to load {0} from pack file: {1}, loading full data.'.format('/'.join(self._path + (key,)), e))
+            value = self._load_full_data()
+            for part in self._path + (key,):
+                value = value[part]
+        self._loaded[key] = value
+        return value
+    def __iter__(self):
+        return iter(self._index)
+    def __len__(self):
+        return len(self._index)
+    def __contains__(self, key):
+        return key in self._index
+
 class API(object):
     """ Basic API facade. """
     TIMEOUT = 10.0 # Call timeout.
-    MAX_RETRY = 3 # Amount of retries for server errors (5xx, timeouts etc).
-    Delay = Delay
+    POOL_CONNECTIONS = 1 # Number of per-host connection pools (usually there is only one host).
+    POOL_MAXSIZE = 10 # Max connections per host.
+    BATCH_RESERVE = 0.2 # Part of rate limit that is left for interactive calls in batch mode.
+    COALESCE_WINDOW = 1.0 # Identical GET requests within this time (seconds) share the same result.
+    SingleFlight = SingleFlight
+    Delay = RateLimiter
+    RetryPolicy = RetryPolicy
+    STREAM_CHUNK_SIZE = 64 * 1024 # Bytes to read at once from streamed responses.
 
     class Exception(Exception):
         """ Basic API exception.
@@ -118,24 +1143,170 @@ class API(object):
                     raise exc()
             raise
 
-    class Cached: # pragma: no cover -- TODO uses external FS cache and invalidation by time.
-        def __init__(self, api, cache_entry_name):
+    class Cached:
+        """ File cache for rarely changed data (e.g. Habitica content).
+        Cache entry remembers server version (appVersion) it was built from
+        and is invalidated only when server reports another version.
+        Current version is taken from responses that were already received
+        (e.g. /user), no extra request is made just to get it.
+        If either version is unknown, entry is invalidated after max_age seconds.
+
+        Along with JSON, data is stored as pre-parsed binary snapshot (marshal),
+        which is much faster to load. Snapshot header contains format version,
+        Python version and size and mtime of JSON file it was made from,
+        so outdated or incompatible snapshot is ignored (and rebuilt from JSON).
+        """
+        MAX_AGE = 60*60*24*7 # Fallback max age (seconds) when server version is unknown.
+        SNAPSHOT_MAGIC = b'HBTC'
+        SNAPSHOT_VERSION = 1
+        def __init__(self, api, cache_entry_name, max_age=None):
             self.api = api
             self.name = cache_entry_name
+            self.max_age = self.MAX_AGE if max_age is None else max_age
+        @property
+        def cache_file(self):
+            return Path(config.get_cache_dir())/("{0}.cache.json".format(self.name))
+        @property
+        def meta_file(self):
+            return Path(config.get_cache_dir())/("{0}.cache.meta.json".format(self.name))
+        @property
+        def snapshot_file(self):
+            return Path(config.get_cache_dir())/("{0}.cache.marshal".format(self.name))
+        @classmethod
+        def snapshot_header(cls, json_stat):
+            return cls.SNAPSHOT_MAGIC + struct.pack('<HHBBQQ',
+                    cls.SNAPSHOT_VERSION, marshal.version,
+                    sys.version_info[0], sys.version_info[1],
+                    json_stat.st_size, json_stat.st_mtime_ns,
+                    )
+        def _write_snapshot(self, data, json_stat, serialized=None):
+            try:
+                write_marshal(self.snapshot_file, self.snapshot_header(json_stat), dict(data))
+            except ValueError: # Some values are not plain types (e.g. dict subclasses).
+                write_marshal(self.snapshot_file, self.snapshot_header(json_stat), json.loads(serialized or json.dumps(data)))
+        def _load_snapshot(self, json_stat):
+            """ Returns data from snapshot or None if there is no valid snapshot. """
+            return read_marshal(self.snapshot_file, self.snapshot_header(json_stat))
+        @property
+        def shards_dir(self):
+            return Path(config.get_cache_dir())/("{0}.cache.shards".format(self.name))
+        def _write_shards(self, data, json_stat):
+            """ Stores every top-level collection of data in a separate file. """
+            self.shards_dir.mkdir(exist_ok=True)
+            header = self.snapshot_header(json_stat)
+            keys = list(data.keys())
+            for key in keys:
+                value = data[key]
+                try:
+                    write_marshal(ShardedData.shard_file(self.shards_dir, key), header, value)
+                except ValueError: # Some values are not plain types (e.g. dict subclasses).
+                    write_marshal(ShardedData.shard_file(self.shards_dir, key), header, json.loads(json.dumps(value)))
+            write_marshal(self.shards_dir/'index.marshal', header, keys)
+        def _load_shards(self, field):
+            """ Returns ShardedData for the field of cached data
+            or None if shards are missing or outdated.
+            """
+            json_stat = self.cache_file.stat()
+            header = self.snapshot_header(json_stat)
+            keys = read_marshal(self.shards_dir/'index.marshal', header)
+            if keys is None:
+                return None
+            def _load_full_data():
+                return self._load()[field]
+            return ShardedData(self.shards_dir, keys, header, _load_full_data)
+        @property
+        def pack_file(self):
+            return Path(config.get_cache_dir())/("{0}.cache.pack".format(self.name))
+        def _write_pack(self, data, json_stat):
+            """ Stores data in a pack file (see MappedData). """
+            header = self.snapshot_header(json_stat)
+            try:
+                content = MappedData.pack(data, header)
+            except ValueError: # Some values are not plain types (e.g. dict subclasses).
+                content = MappedData.pack(json.loads(json.dumps(data)), header)
+            write_atomic(self.pack_file, content)
+        def _load_pack(self, field):
+            """ Returns MappedData for the field of cached data
+            or None if pack file is missing or outdated.
+            """
+            def _load_full_data():
+                return self._load()[field]
+            return MappedData.open(self.pack_file, self.snapshot_header(self.cache_file.stat()), _load_full_data)
+        def _load_meta(self):
+            try:
+                meta = json.loads(self.meta_file.read_text())
+                return meta if isinstance(meta, dict) else {}
+            except FileNotFoundError:
+                return {}
+            except ValueError as e:
+                logger.debug('Failed to load cache meta info: {0}'.format(e))
+                return {}
+        def _is_valid(self):
+            if not self.cache_file.exists():
+                return False
+            meta = self._load_meta()
+            cached_version, current_version = meta.get('version'), self.api.app_version
+            if cached_version and current_version:
+                logger.debug("Cache version: {0}, server version: {1}".format(cached_version, current_version))
+                return cached_version == current_version
+            stored = meta.get('stored') or self.cache_file.stat().st_mtime
+            return time.time() <= stored + self.max_age
+        def _load(self):
+            logger.debug("Cache was still valid, loading cached data...")
+            json_stat = self.cache_file.stat()
+            data = self._load_snapshot(json_stat)
+            if data is None:
+                data = json.loads(self.cache_file.read_text())
+                self._write_snapshot(data, json_stat)
+            return dataview(data)
+        def _store(self, data):
+            serialized = json.dumps(data)
+            self.cache_file.write_text(serialized)
+            self._write_snapshot(data, self.cache_file.stat(), serialized)
+            self.meta_file.write_text(json.dumps({
+                'version' : self.api.app_version,
+                'stored' : time.time(),
+                }))
         def _cached_request(self, method, *args, **kwargs):
-            cache_file = Path(config.get_cache_dir())/("{0}.cache.json".format(self.name))
+            if self.api.response_cache is not None:
+                return getattr(self.api, method)(*args, **kwargs) # Response cache takes care of it.
             logger.debug("Using cache entry '{0}'".format(self.name))
-            invalidated = not cache_file.exists() or time.time() > cache_file.stat().st_mtime + 60*60*24 # TODO how to invalidate Habitica content cache
-            if invalidated and self.api._inside_response_hook:
-                invalidated = False # Protection from direct API calls within response hook.
-            if invalidated:
-                logger.debug("Cache was invalid, making actual request...")
-                data = getattr(self.api, method)(*args, **kwargs)
-                cache_file.write_text(json.dumps(data))
-            else:
-                logger.debug("Cache was still valid, loading cached data...")
-                data = dotdict(json.loads(cache_file.read_text()))
+            if self._is_usable():
+                return self._load()
+            logger.debug("Cache was invalid, making actual request...")
+            data = getattr(self.api, method)(*args, **kwargs)
+            self._store(data)
             return data
+        def _is_usable(self):
+            """ Returns True if cached data can be used. """
+            # Direct API calls within response hook are not performed.
+            return self._is_valid() or (self.api._inside_response_hook and self.cache_file.exists())
+        def _lazy_request(self, load, write, path, field, params):
+            if self.api.response_cache is not None:
+                return self.api.get(*path, **params)[field]
+            logger.debug("Using lazy cache entry '{0}'".format(self.name))
+            if self._is_usable():
+                lazy_data = load(field)
+                if lazy_data is not None:
+                    return lazy_data
+                data = self._load()
+            else:
+                logger.debug("Cache was invalid, making actual request...")
+                data = self.api.get(*path, **params)
+                self._store(data)
+            write(data[field], self.cache_file.stat())
+            return data[field]
+        def get_sharded(self, *path, _field='data', **params):
+            """ Same as get(), but returns only specified field of response (dict),
+            which is loaded lazily: every top-level key of it is stored separately
+            and is loaded only on the first access (see ShardedData).
+            """
+            return self._lazy_request(self._load_shards, self._write_shards, path, _field, params)
+        def get_mapped(self, *path, _field='data', **params):
+            """ Same as get_sharded(), but data is stored in a single pack file
+            that is mapped into memory and shared between processes (see MappedData).
+            """
+            return self._lazy_request(self._load_pack, self._write_pack, path, _field, params)
         def get(self, *args, **kwargs):
             return self._cached_request('get', *args, **kwargs)
         def post(self, *args, **kwargs):
@@ -172,11 +1343,55 @@ class API(object):
         def __getattr__(self, attr): # pragma: no cover
             return getattr(self.api, attr)
 
-    def __init__(self, base_url, login, password, batch_mode=True):
+    def __init__(self, base_url, login, password, batch_mode=True,
+            pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+            pool_block=False, keep_alive=True,
+            coalesce_window=COALESCE_WINDOW, conditional_cache=None,
+            response_cache=None, instrumentation=None,
+            retry_policy=None, circuit_breakers=None, transport=None):
         """ Creates authenticated API instance.
-        If batch_mode is True (default), introduces significant delays
-        between consequent requests to reduce load on Habitica server.
-        Otherwise (for user input) uses default nominal delay <1 sec.
+        Requests are limited by token bucket (see RateLimiter) that follows
+        server rate limit and is shared between all processes that use the same API user.
+        If batch_mode is True (default), part of the budget is always left
+        for user's interactive calls.
+
+        All calls (including .v4 and .cached() proxies) share single HTTP session
+        with persistent connection pool:
+        - pool_connections: number of per-host pools to keep;
+        - pool_maxsize: max number of connections to keep for a single host;
+        - pool_block: if True, waits for a free connection instead of opening extra one;
+        - keep_alive: if False, closes connection after each request.
+        Session is created on the first call and should be released via close()
+        (or by using API object as a context manager).
+
+        Identical GET requests (same path and query) that are performed concurrently
+        or within coalesce_window seconds from each other share single actual request
+        and its parsed result (see SingleFlight). Any other request (POST/PUT/DELETE)
+        drops reused results, so data is always re-fetched after changes.
+
+        If conditional_cache is True (or ConditionalCache object),
+        JSON GET responses with ETag/Last-Modified are re-validated
+        via conditional requests (see ConditionalCache).
+        Response hook is not called for responses that were not modified.
+        Counters are available via api.conditional_cache.stats().
+
+        If response_cache is True (or cache.ResponseCache object),
+        JSON GET responses are cached according to per-endpoint policies
+        and write requests invalidate related entries (see habitica.cache).
+        Value True means default policies with disk tier in cache dir.
+
+        Failed requests are retried according to retry_policy (see RetryPolicy),
+        while remote host seems to be down, calls fail fast (see CircuitBreaker).
+        Both have counters available via .stats(); circuit_breakers (CircuitBreakers)
+        may be shared between several API objects.
+
+        Timings and stats of every actual request are passed to subscribers
+        of api.instrumentation (see Instrumentation, CallSpan).
+        Several API objects may share the same Instrumentation object.
+
+        If transport is specified, it is called with created HTTP session
+        and should return session-compatible object that will be used instead
+        (e.g. to record or replay traffic, see habitica.cassette).
         """
         self.base_url = base_url.rstrip('/')
         self.login = login
@@ -187,21 +1402,77 @@ class API(object):
               'x-client': USER_ID + '-habitica', # TODO take appName from package?
               'content-type': 'application/json',
               }
+        if not keep_alive:
+            self.headers['connection'] = 'close'
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.transport = transport
+        self._session = None
+        self._single_flight = self.SingleFlight(coalesce_window)
+        if conditional_cache is True:
+            conditional_cache = ConditionalCache()
+        elif conditional_cache is False:
+            conditional_cache = None
+        self.conditional_cache = conditional_cache
+        if response_cache is True: # pragma: no cover -- uses external FS cache.
+            response_cache = cache.ResponseCache(directory=self._response_cache_dir())
+        elif response_cache is False:
+            response_cache = None
+        self.response_cache = response_cache
+        self.instrumentation = instrumentation or Instrumentation()
+        self.retry_policy = retry_policy or self.RetryPolicy()
+        self.circuit_breakers = circuit_breakers or CircuitBreakers()
+        self.app_version = None
         self._response_hook = None
         self._inside_response_hook = False
-        if batch_mode:
-            # Third-party API tools should introduce delays between calls
-            # to reduce load on Habitica server.
-            # See https://habitica.fandom.com/wiki/Template:Third_Party_Tool_Rules?section=T-4
-            self._delay = self.Delay(1,
-                    get=3,
-                    post=10, put=10, delete=10,
+        # Third-party API tools should respect rate limit
+        # to reduce load on Habitica server.
+        # See https://habitica.fandom.com/wiki/Template:Third_Party_Tool_Rules?section=T-4
+        reserve = int(RateLimiter.LIMIT * self.BATCH_RESERVE) if batch_mode else 0
+        self._delay = self.Delay(reserve=reserve,
+                state_file=self._rate_limit_state_file(),
+                )
+
+    def _rate_limit_state_file(self): # pragma: no cover -- uses external FS cache.
+        return Path(config.get_cache_dir())/'ratelimit.{0}.json'.format(re.sub(r'[^\w-]', '_', self.login))
+    def _response_cache_dir(self): # pragma: no cover -- uses external FS cache.
+        return Path(config.get_cache_dir())/'responses.{0}'.format(re.sub(r'[^\w-]', '_', self.login))
+
+    def __enter__(self):
+        return self
+    def __exit__(self, *args):
+        self.close()
+    def close(self):
+        """ Closes HTTP session and releases all pooled connections.
+        API object is still usable after that: new session will be opened on the next call.
+        """
+        self._single_flight.forget()
+        if self.response_cache is not None:
+            self.response_cache.close()
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+    @property
+    def session(self):
+        """ Persistent HTTP session shared by all calls. """
+        if self._session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter( # No retries on transport level, see RetryPolicy.
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block,
                     )
-        else:
-            self._delay = self.Delay(0.5)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            self._session = self.transport(session) if self.transport else session
+        return self._session
 
-    def cached(self, cache_entry_name): # pragma: no cover -- TODO see Cached class above.
-        return API.Cached(self, cache_entry_name)
+    def cached(self, cache_entry_name, max_age=None):
+        """ Returns proxy that caches results of calls in file cache.
+        See API.Cached for details.
+        """
+        return self.Cached(self, cache_entry_name, max_age=max_age)
 
     @property
     def v4(self):
@@ -240,12 +1511,21 @@ class API(object):
         """
         uri = self.get_url(*path)
         return self.call('DELETE', uri, query=query)
-    def get(self, *path, _as_json=True, **query):
+    def get(self, *path, _as_json=True, _stream=False, **query):
         """ Convenience call for GET /specified/sub/path/
         Kwargs are passed as query params.
         See call() for details.
+
+        If _stream is True, returns iterator over elements of 'data' array of response,
+        which are decoded incrementally as response arrives (see JSONArrayParser),
+        so memory usage is bounded by a single element rather than by the whole response.
+        Other fields of response are passed to response hook after the last element.
+        Request is sent on the first iteration; close the iterator to release connection early.
+        Streamed requests are not coalesced or cached.
         """
         uri = self.get_url(*path)
+        if _stream:
+            return self._stream_call(uri, query)
         return self.call('GET', uri, query=query, as_json=_as_json)
     def call(self, method, uri, query=None, body=None, as_json=True):
         """ Performs actual call to URI using given method (GET/POST/PUT/DELETE etc).
@@ -253,49 +1533,157 @@ class API(object):
         Query is a dict and is passed as query params.
         Body is a dict and is passed as body params (JSON-encoded).
         May raise exceptions from requests.
-        May freeze for several seconds to ensure delay between requests
-        (see POST_AUTO_REQUEST_DELAY, GET_AUTO_REQUEST_DELAY)
+        May freeze for several seconds if rate limit budget is exhausted
+        (see RateLimiter).
+        Identical GET requests are coalesced (see SingleFlight),
+        so the same result object may be returned to several callers.
+        If response cache is enabled, GET requests may be served from cache
+        and other requests invalidate related cache entries.
         """
-        self._delay.wait_for(method)
-        return self._retry_call(method, uri, query=query, body=body, as_json=as_json)
-    def _retry_call(self, method, uri, query=None, body=None, as_json=True, tries=MAX_RETRY):
+        key = self._request_key(method, uri, query, as_json)
+        if method.upper() == 'GET':
+            fetch = functools.partial(self._single_flight.do, key,
+                    functools.partial(self._limited_call, method, uri, query=query, body=body, as_json=as_json),
+                    )
+            if self.response_cache is not None and as_json:
+                return dataview(self.response_cache.get(self._endpoint(uri), key, fetch))
+            return fetch()
+        self._single_flight.forget()
         try:
-            logger.debug('Sending {0} {1}'.format(method.upper(), uri))
-            logger.debug('Query: {0}'.format(query))
-            logger.debug('Body: {0}'.format(body))
-            return self._direct_call(method, uri, query=query, body=body, as_json=as_json)
-        except requests.exceptions.ReadTimeout as e:
-            if tries <= 0:
-                raise
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code not in [502]:
-                raise
-            if tries <= 0:
-                raise
-        except requests.exceptions.ConnectionError as e:
-            if tries <= 0:
-                raise
-        return self._retry_call(method, uri, query=query, body=body, as_json=as_json, tries=tries-1)
-    def _direct_call(self, method, uri, query=None, body=None, as_json=True):
-        """ Direct call without any retry/timeout checks. """
-        session = requests.Session()
-        retries = urllib3.util.retry.Retry(total=5, backoff_factor=0.1)
-        session.mount('https://', requests.adapters.HTTPAdapter(max_retries=retries))
-
-        if method.upper() in ['PUT', 'POST', 'DELETE']:
-            response = getattr(session, method.lower())(uri, headers=self.headers,
-                    params=query, data=json.dumps(body or {}), timeout=API.TIMEOUT)
-        else:
-            response = getattr(session, method.lower())(uri, headers=self.headers,
-                                            params=query, timeout=API.TIMEOUT)
-        self._delay.update()
-        logger.debug('Answered: {0} {1}'.format(response.status_code, response.reason))
+            return self._limited_call(method, uri, query=query, body=body, as_json=as_json)
+        finally:
+            self._single_flight.forget()
+            if self.response_cache is not None:
+                self.response_cache.invalidate(self._endpoint(uri))
+    def _endpoint(self, uri):
+        """ Returns path of endpoint relative to API root: .../api/v3/<path> """
+        path = uri[len(self.base_url):] if uri.startswith(self.base_url) else uri
+        return re.sub(r'^/*api/v\d+/', '', path).strip('/')
+    def _request_key(self, method, uri, query, as_json):
+        """ Key to identify identical requests.
+        Includes login, since responses are user-specific
+        and response cache may be shared between logins.
+        """
+        query = tuple(sorted((key, str(value)) for key, value in (query or {}).items() if value is not None))
+        return (self.login, method.upper(), uri, query, as_json)
+    def _stream_call(self, uri, query):
+        return self._iter_stream(uri, query)
+    def _iter_stream(self, uri, query):
+        """ Generator of streamed elements (see API.get).
+        Actual request is performed on the first iteration,
+        response is closed when generator is exhausted or closed.
+        """
+        response = self._limited_call('GET', uri, query=query, stream=True)
+        parser = JSONArrayParser('data')
+        try:
+            for chunk in response.iter_content(self.STREAM_CHUNK_SIZE):
+                yield from parser.feed(chunk)
+            yield from parser.close()
+        finally:
+            response.close()
+        self._track_app_version(parser.rest)
+        self._run_response_hook(parser.rest)
+    def _limited_call(self, method, uri, query=None, body=None, as_json=True, stream=False):
+        span = self.instrumentation.start(method, uri)
+        try:
+            with span.measure('queue'):
+                delay = self._delay.delay_for(method)
+            if delay > 0:
+                with span.measure('rate_limit'):
+                    time.sleep(delay)
+            return self._retry_call(method, uri, query=query, body=body, as_json=as_json, stream=stream, span=span)
+        except Exception as e:
+            span.failed(e)
+            raise
+        finally:
+            self.instrumentation.finish(span)
+    def _retry_call(self, method, uri, query=None, body=None, as_json=True, stream=False, span=Instrumentation.NULL_SPAN):
+        breaker = self.circuit_breakers.get(uri)
+        breaker.before_call()
+        started, attempt = time.monotonic(), 0
+        while True:
+            attempt += 1
+            try:
+                logger.debug('Sending %s %s', method.upper(), uri)
+                logger.debug('Query: %s', query)
+                logger.debug('Body: %s', body)
+                response = self._direct_call(method, uri, query=query, body=body, as_json=as_json, stream=stream, span=span)
+            except Exception as e:
+                delay = self.retry_policy.next_delay(attempt, e, time.monotonic() - started, method)
+                if delay is None:
+                    breaker.after_call(e)
+                    raise
+                logger.debug('Request failed (%s), retrying in %.1fs', e, delay)
+                if delay > 0:
+                    with span.measure('backoff'):
+                        time.sleep(delay)
+                continue
+            breaker.after_call()
+            return response
+    def _conditional_request(self, method, uri, query, as_json):
+        """ Returns (key, entry, headers) for conditional request.
+        Key is None if request should not be cached.
+        """
+        if self.conditional_cache is None or method.upper() != 'GET' or not as_json:
+            return None, None, self.headers
+        key = self._request_key(method, uri, query, as_json)
+        entry = self.conditional_cache.lookup(key)
+        headers = dict(self.headers, **self.conditional_cache.validators(entry))
+        return key, entry, headers
+    def _direct_call(self, method, uri, query=None, body=None, as_json=True, stream=False, span=Instrumentation.NULL_SPAN):
+        """ Direct call without any retry/timeout checks.
+        If stream is True, returns raw response with body not read yet.
+        """
+        session = self.session
+        cache_key, cache_entry, headers = self._conditional_request(method, uri, query, as_json and not stream)
+        with span.measure('network'):
+            if method.upper() in ['PUT', 'POST', 'DELETE']:
+                data = json.dumps(body or {})
+                span.sent(len(data), body)
+                response = getattr(session, method.lower())(uri, headers=headers,
+                        params=query, data=data, timeout=API.TIMEOUT)
+            elif stream:
+                span.sent(0)
+                response = getattr(session, method.lower())(uri, headers=headers,
+                                                params=query, timeout=API.TIMEOUT, stream=True)
+            else:
+                span.sent(0)
+                response = getattr(session, method.lower())(uri, headers=headers,
+                                                params=query, timeout=API.TIMEOUT)
+        self._delay.update(getattr(response, 'headers', None))
+        content = None if stream else response.content
+        content_size = len(content or b'')
+        span.received(response.status_code, response.reason, content_size)
+        logger.debug('Answered: %s %s', response.status_code, response.reason)
+        if response.status_code == requests.codes.not_modified and cache_entry is not None:
+            logger.debug('Not modified, using cached response.')
+            return dataview(self.conditional_cache.hit(cache_key, cache_entry))
         if response.status_code != requests.codes.ok:
-            logger.debug('Responded with error: {0}'.format(response.content))
+            logger.debug('Responded with error: %s', response.content)
             response.raise_for_status()
+        if stream:
+            return response
+        response_headers = getattr(response, 'headers', None)
         if as_json:
-            response = response.json()
-        logger.debug('Response: {0}'.format(json.dumps(response, indent=2, sort_keys=True)))
+            with span.measure('decode'):
+                response = response.json()
+        span.decoded(response)
+        logger.debug('Response: %s', LazyJSON(response))
+        with span.measure('hook'):
+            self._track_app_version(response)
+            self._run_response_hook(response)
+        if cache_key is not None:
+            self.conditional_cache.store(cache_key, response_headers, content)
+        return dataview(response)
+    def _track_app_version(self, response):
+        """ Remembers server version (appVersion field of every response). """
+        version = response.get('appVersion') if isinstance(response, dict) else None
+        if not version:
+            return
+        self.app_version = version
+        if self.response_cache is not None:
+            self.response_cache.set_version(version)
+    def _run_response_hook(self, response):
         if self._response_hook and not self._inside_response_hook: # pragma: no cover -- TODO
             try:
                 self._inside_response_hook = True
@@ -304,4 +1692,267 @@ class API(object):
                 logger.exception('Exception in custom API response hook!')
             finally:
                 self._inside_response_hook = False
-        return dotdict(response)
+
+ASYNC_CONNECTION_ERRORS = (OSError, aiohttp.ClientConnectionError) if aiohttp else (OSError,)
+# Connection to server was not established, so request was not sent at all.
+ASYNC_CONNECT_ERRORS = (ConnectionRefusedError, aiohttp.ClientConnectorError) if aiohttp else (ConnectionRefusedError,)
+
+class AsyncAPI(API):
+    """ Asyncio-native API facade.
+    Has the same interface as API (get/post/put/delete/call, v4, cached()),
+    but all calls are coroutines:
+    >>> data = await api.get('user')
+    Uses the same rate limiter as the sync API.
+    Requires aiohttp (extra 'async': pip install 'habitica[async]').
+
+    Network errors and HTTP errors are converted to corresponding exceptions
+    from requests, so API.Exceptions() and retry logic work the same way.
+    Rate limiter and response cache may block on file locks and disk I/O,
+    so they are called in default executor instead of the event loop.
+    """
+    SingleFlight = AsyncSingleFlight
+
+    class Cached(API.Cached):
+        async def _cached_request(self, method, *args, **kwargs):
+            if self.api.response_cache is not None:
+                return await getattr(self.api, method)(*args, **kwargs) # Response cache takes care of it.
+            logger.debug("Using cache entry '{0}'".format(self.name))
+            if self._is_usable():
+                return self._load()
+            logger.debug("Cache was invalid, making actual request...")
+            data = await getattr(self.api, method)(*args, **kwargs)
+            self._store(data)
+            return data
+        async def _lazy_request(self, load, write, path, field, params):
+            if self.api.response_cache is not None:
+                return (await self.api.get(*path, **params))[field]
+            logger.debug("Using lazy cache entry '{0}'".format(self.name))
+            if self._is_usable():
+                lazy_data = load(field)
+                if lazy_data is not None:
+                    return lazy_data
+                data = self._load()
+            else:
+                logger.debug("Cache was invalid, making actual request...")
+                data = await self.api.get(*path, **params)
+                self._store(data)
+            write(data[field], self.cache_file.stat())
+            return data[field]
+        async def get_sharded(self, *path, _field='data', **params):
+            return await self._lazy_request(self._load_shards, self._write_shards, path, _field, params)
+        async def get_mapped(self, *path, _field='data', **params):
+            return await self._lazy_request(self._load_pack, self._write_pack, path, _field, params)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._delay_lock = None
+        self._refresh_tasks = {}
+    def __enter__(self): # pragma: no cover
+        raise TypeError('Use "async with" for AsyncAPI')
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *args):
+        await self.close()
+    async def close(self):
+        """ Closes HTTP session and releases all pooled connections.
+        Waits for background refreshes of response cache.
+        """
+        if self._refresh_tasks:
+            await asyncio.gather(*self._refresh_tasks.values(), return_exceptions=True)
+        self._single_flight.forget()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+    def _create_session(self): # pragma: no cover -- requires real network.
+        if aiohttp is None:
+            raise RuntimeError("AsyncAPI requires aiohttp to be installed: pip install 'habitica[async]'")
+        connector = aiohttp.TCPConnector(
+                limit=self.pool_maxsize * self.pool_connections,
+                limit_per_host=self.pool_maxsize,
+                force_close='connection' in self.headers,
+                )
+        return aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.TIMEOUT),
+                )
+    @property
+    def session(self):
+        """ Persistent aiohttp session shared by all calls.
+        Should be accessed only from within running event loop.
+        """
+        if self._session is None:
+            self._session = self._create_session()
+        return self._session
+
+    async def call(self, method, uri, query=None, body=None, as_json=True):
+        """ Performs actual call to URI. See API.call() for details.
+        Concurrent calls take tokens from the same rate limiter
+        as sync API would do. Identical GET requests are coalesced.
+        Stale entries of response cache are refreshed in background tasks.
+        """
+        key = self._request_key(method, uri, query, as_json)
+        if method.upper() == 'GET':
+            fetch = functools.partial(self._single_flight.do, key,
+                    functools.partial(self._limited_call, method, uri, query=query, body=body, as_json=as_json),
+                    )
+            if self.response_cache is not None and as_json:
+                return dataview(await self._cached_call(self._endpoint(uri), key, fetch))
+            return await fetch()
+        self._single_flight.forget()
+        try:
+            return await self._limited_call(method, uri, query=query, body=body, as_json=as_json)
+        finally:
+            self._single_flight.forget()
+            if self.response_cache is not None:
+                await self._run_blocking(self.response_cache.invalidate, self._endpoint(uri))
+    @staticmethod
+    async def _run_blocking(func, *args):
+        """ Runs func(*args) in default executor, so event loop is not blocked. """
+        return await asyncio.get_running_loop().run_in_executor(None, functools.partial(func, *args))
+    async def _cached_call(self, path, key, fetch):
+        entry, state = await self._run_blocking(self.response_cache.lookup, path, key)
+        if entry is None:
+            body = await fetch()
+            await self._run_blocking(self.response_cache.store, path, key, body)
+            return body
+        if state == self.response_cache.STALE and key not in self._refresh_tasks:
+            self._refresh_tasks[key] = asyncio.ensure_future(self._refresh(path, key, fetch))
+        return entry.value()
+    async def _refresh(self, path, key, fetch):
+        try:
+            await self._run_blocking(self.response_cache.store, path, key, await fetch())
+        except Exception as e:
+            logger.debug('Failed to refresh cached response {0}: {1}'.format(path, e))
+        finally:
+            self._refresh_tasks.pop(key, None)
+    def _stream_call(self, uri, query):
+        return self._iter_stream(uri, query)
+    async def _iter_stream(self, uri, query):
+        """ Async generator of streamed elements (see API.get).
+        Actual request is performed on the first iteration.
+        """
+        request, response = await self._limited_call('GET', uri, query=query, stream=True)
+        parser = JSONArrayParser('data')
+        try:
+            async for chunk in response.content.iter_chunked(self.STREAM_CHUNK_SIZE):
+                for item in parser.feed(chunk):
+                    yield item
+            for item in parser.close():
+                yield item
+        finally:
+            await request.__aexit__(None, None, None)
+        self._track_app_version(parser.rest)
+        self._run_response_hook(parser.rest)
+    async def _limited_call(self, method, uri, query=None, body=None, as_json=True, stream=False):
+        if self._delay_lock is None:
+            self._delay_lock = asyncio.Lock()
+        span = self.instrumentation.start(method, uri)
+        try:
+            with span.measure('queue'):
+                await self._delay_lock.acquire()
+            try:
+                with span.measure('queue'):
+                    delay = await self._run_blocking(self._delay.delay_for, method)
+                if delay > 0:
+                    with span.measure('rate_limit'):
+                        await asyncio.sleep(delay)
+            finally:
+                self._delay_lock.release()
+            return await self._retry_call(method, uri, query=query, body=body, as_json=as_json, stream=stream, span=span)
+        except Exception as e:
+            span.failed(e)
+            raise
+        finally:
+            self.instrumentation.finish(span)
+    async def _retry_call(self, method, uri, query=None, body=None, as_json=True, stream=False, span=Instrumentation.NULL_SPAN):
+        breaker = self.circuit_breakers.get(uri)
+        breaker.before_call()
+        started, attempt = time.monotonic(), 0
+        while True:
+            attempt += 1
+            try:
+                logger.debug('Sending %s %s', method.upper(), uri)
+                logger.debug('Query: %s', query)
+                logger.debug('Body: %s', body)
+                response = await self._direct_call(method, uri, query=query, body=body, as_json=as_json, stream=stream, span=span)
+            except Exception as e:
+                delay = self.retry_policy.next_delay(attempt, e, time.monotonic() - started, method)
+                if delay is None:
+                    breaker.after_call(e)
+                    raise
+                logger.debug('Request failed (%s), retrying in %.1fs', e, delay)
+                if delay > 0:
+                    with span.measure('backoff'):
+                        await asyncio.sleep(delay)
+                continue
+            breaker.after_call()
+            return response
+    @staticmethod
+    def _prepare_query(query):
+        """ Converts query params the same way requests does:
+        None values are skipped, everything else is turned to strings.
+        """
+        if not query:
+            return None
+        return {key:str(value) for key, value in query.items() if value is not None}
+    async def _direct_call(self, method, uri, query=None, body=None, as_json=True, stream=False, span=Instrumentation.NULL_SPAN):
+        """ Direct call without any retry/timeout checks.
+        If stream is True, returns pair (request context, response) with body not read yet,
+        request context should be exited after reading the body.
+        """
+        kwargs = {}
+        if method.upper() in ['PUT', 'POST', 'DELETE']:
+            kwargs['data'] = json.dumps(body or {})
+        span.sent(len(kwargs.get('data', '')), body)
+        cache_key, cache_entry, headers = self._conditional_request(method, uri, query, as_json and not stream)
+        try:
+            with span.measure('network'):
+                request = self.session.request(method.upper(), uri,
+                        headers=headers, params=self._prepare_query(query),
+                        **kwargs)
+                response = await request.__aenter__()
+                keep_open = False
+                try:
+                    await self._run_blocking(self._delay.update, response.headers)
+                    status, reason = response.status, response.reason
+                    response_headers = response.headers
+                    keep_open = stream and status == requests.codes.ok
+                    if not keep_open:
+                        content = await response.read()
+                finally:
+                    if not keep_open:
+                        await request.__aexit__(None, None, None)
+        except asyncio.TimeoutError as e:
+            raise requests.exceptions.ReadTimeout(str(e))
+        except ASYNC_CONNECT_ERRORS as e:
+            raise requests.exceptions.ConnectionError(urllib3.exceptions.NewConnectionError(None, str(e)))
+        except ASYNC_CONNECTION_ERRORS as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        span.received(status, reason, 0 if keep_open else len(content or b''))
+        logger.debug('Answered: %s %s', status, reason)
+        if keep_open:
+            return request, response
+        if status == requests.codes.not_modified and cache_entry is not None:
+            logger.debug('Not modified, using cached response.')
+            return dataview(self.conditional_cache.hit(cache_key, cache_entry))
+        if status != requests.codes.ok:
+            logger.debug('Responded with error: %s', content)
+            error = requests.Response()
+            error.status_code = status
+            error.reason = reason
+            error.url = uri
+            error.headers.update(response_headers or {})
+            error._content = content
+            raise requests.exceptions.HTTPError('{0} {1} for url: {2}'.format(status, reason, uri), response=error)
+        if not as_json:
+            return content.decode('utf-8', 'replace')
+        with span.measure('decode'):
+            response = json.loads(content)
+        span.decoded(response)
+        logger.debug('Response: %s', LazyJSON(response))
+        with span.measure('hook'):
+            self._track_app_version(response)
+            self._run_response_hook(response)
+        if cache_key is not None:
+            self.conditional_cache.store(cache_key, response_headers, content)
+        return dataview(response)
@@ -0,0 +1,336 @@
+""" Tiered cache for API responses.
+
+Responses are kept in memory (LRU, bounded by number of entries and total size)
+and optionally on disk (shared between processes).
+What is cached and for how long is defined by per-endpoint policies,
+writes to the server invalidate related entries according to invalidation rules:
+	cache = ResponseCache(directory=Path(config.get_cache_dir())/'responses.<login>')
+	api = API(url, login, password, response_cache=cache)
+
+Endpoints are matched by path relative to API root (e.g. 'tasks/user', 'members/<id>'),
+'*' in patterns matches single path component.
+"""
+import os, re
+import json
+import time
+import hashlib
+import threading
+import collections
+import concurrent.futures
+import urllib.parse
+from pathlib import Path
+import logging
+logger = logging.getLogger('habitica')
+from . import config
+
+def _compile_pattern(pattern, prefix=False):
+	""" Converts endpoint pattern to regex.
+	If prefix is True, pattern also matches any sub-path.
+	"""
+	regex = '/'.join('[^/]+' if part == '*' else re.escape(part) for part in pattern.strip('/').split('/'))
+	return re.compile('^' + regex + ('(/.*)?' if prefix else '') + '$')
+
+class Policy:
+	""" Caching policy for endpoints that match pattern.
+	Entry is fresh for <ttl> seconds (None means forever), after that for <stale> seconds
+	cached value is still returned, but is refreshed in background (stale-while-revalidate).
+	If versioned is True, entry is valid until server version (appVersion) changes;
+	ttl is used only as a fallback when either version is unknown.
+	"""
+	def __init__(self, pattern, ttl=None, stale=0, versioned=False):
+		self.pattern = pattern
+		self.ttl = ttl
+		self.stale = stale
+		self.versioned = versioned
+		self._regex = _compile_pattern(pattern)
+	def matches(self, path):
+		return bool(self._regex.match(path))
+	def __repr__(self): # pragma: no cover
+		return 'Policy({0}, ttl={1}, stale={2}, versioned={3})'.format(repr(self.pattern), self.ttl, self.stale, self.versioned)
+
+class Invalidation:
+	""" Rule to drop cached entries when there was a write request (POST/PUT/DELETE)
+	to endpoint that starts with given pattern, e.g.:
+		Invalidation('tasks/*/score', 'tasks/user', 'user')
+	"""
+	def __init__(self, pattern, *targets):
+		self.pattern = pattern
+		self.targets = [_compile_pattern(target) for target in targets]
+		self._regex = _compile_pattern(pattern, prefix=True)
+	def matches(self, path):
+		return bool(self._regex.match(path))
+	def affects(self, path):
+		return any(target.match(path) for target in self.targets)
+
+DEFAULT_POLICIES = [
+		Policy('content', ttl=24*60*60, versioned=True),
+		Policy('user', ttl=30, stale=30),
+		Policy('tasks/user', ttl=30, stale=30),
+		Policy('groups', ttl=60, stale=60),
+		Policy('groups/*', ttl=60, stale=60),
+		Policy('groups/*/members', ttl=10*60),
+		Policy('members/*', ttl=10*60, stale=10*60),
+		Policy('tags', ttl=60),
+		]
+
+DEFAULT_INVALIDATIONS = [
+		Invalidation('tasks/*/score', 'tasks/user', 'tasks/*', 'user'),
+		Invalidation('tasks', 'tasks/user', 'tasks/*', 'user'),
+		Invalidation('user', 'user', 'tasks/user'),
+		Invalidation('cron', 'user', 'tasks/user'),
+		Invalidation('groups', 'groups', 'groups/*', 'groups/*/members', 'user'),
+		Invalidation('challenges', 'groups/*', 'tasks/user', 'user'),
+		Invalidation('members', 'members/*', 'user'),
+		Invalidation('tags', 'tags', 'tasks/user', 'user'),
+		Invalidation('notifications', 'user'),
+		]
+
+class Entry(collections.namedtuple('Entry', 'path body stored version size')):
+	""" Cached response. Body is kept serialized (JSON text),
+	so every hit gets its own copy of the value.
+	"""
+	__slots__ = ()
+	def value(self):
+		return json.loads(self.body)
+
+class MemoryTier:
+	""" LRU storage bounded by number of entries and total size (in bytes of JSON). """
+	def __init__(self, max_entries, max_bytes):
+		self.max_entries = max_entries
+		self.max_bytes = max_bytes
+		self.total_bytes = 0
+		self._entries = collections.OrderedDict()
+	def __len__(self):
+		return len(self._entries)
+	def keys(self):
+		return list(self._entries.keys())
+	def get(self, key):
+		entry = self._entries.get(key)
+		if entry is not None:
+			self._entries.move_to_end(key)
+		return entry
+	def put(self, key, entry):
+		self.remove(key)
+		if entry.size > self.max_bytes:
+			return
+		self._entries[key] = entry
+		self.total_bytes += entry.size
+		while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+			_, dropped = self._entries.popitem(last=False)
+			self.total_bytes -= dropped.size
+	def remove(self, key):
+		entry = self._entries.pop(key, None)
+		if entry is not None:
+			self.total_bytes -= entry.size
+	def clear(self):
+		self._entries.clear()
+		self.total_bytes = 0
+
+class DiskTier:
+	""" Storage in directory, one JSON file per entry.
+	File names start with quoted endpoint path, so entries can be invalidated without reading them.
+	Bounded by number of entries (the oldest files are removed).
+	"""
+	SUFFIX = '.response.json'
+	def __init__(self, directory, max_entries):
+		self.directory = Path(directory)
+		self.max_entries = max_entries
+		self.directory.mkdir(parents=True, exist_ok=True)
+	def _filename(self, path, key):
+		digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:16]
+		return self.directory/'{0}.{1}{2}'.format(urllib.parse.quote(path, safe='')[:128], digest, self.SUFFIX)
+	def _files(self):
+		return list(self.directory.glob('*' + self.SUFFIX))
+	@classmethod
+	def _path_of(cls, filename):
+		return urllib.parse.unquote(filename.name[:-len(cls.SUFFIX)].rsplit('.', 1)[0])
+	def get(self, path, key):
+		filename = self._filename(path, key)
+		try:
+			data = json.loads(filename.read_text())
+			if data['key'] != json.loads(json.dumps(key)):
+				return None
+			return Entry(path, json.dumps(data['body']), data['stored'], data['version'], filename.stat().st_size)
+		except FileNotFoundError:
+			return None
+		except (ValueError, KeyError) as e:
+			logger.debug('Failed to load cached response {0}: {1}'.format(filename, e))
+			return None
+	def put(self, key, entry):
+		filename = self._filename(entry.path, key)
+		tmp_filename = filename.with_name(filename.name + '.{0}.tmp'.format(os.getpid()))
+		tmp_filename.write_text('{{"key": {0}, "stored": {1}, "version": {2}, "body": {3}}}'.format(
+			json.dumps(key), json.dumps(entry.stored), json.dumps(entry.version), entry.body,
+			))
+		os.replace(str(tmp_filename), str(filename))
+		files = self._files()
+		if len(files) > self.max_entries:
+			files.sort(key=lambda f: f.stat().st_mtime)
+			for old_file in files[:len(files) - self.max_entries]:
+				self._unlink(old_file)
+	def remove_paths(self, predicate):
+		for filename in self._files():
+			if predicate(self._path_of(filename)):
+				self._unlink(filename)
+	def clear(self):
+		for filename in self._files():
+			self._unlink(filename)
+	@staticmethod
+	def _unlink(filename):
+		try:
+			filename.unlink()
+		except FileNotFoundError: # pragma: no cover -- removed by other process.
+			pass
+
+class ResponseCache:
+	""" Two-tier (memory + optional disk) cache for responses of GET requests.
+	See module docstring for details.
+	Counts hits (fresh or stale entry was returned), misses and background refreshes.
+	Bodies are stored serialized, so every hit returns a new copy that can be modified freely.
+	Thread-safe.
+	"""
+	FRESH, STALE, EXPIRED = 'fresh', 'stale', 'expired'
+	MAX_ENTRIES = 256
+	MAX_BYTES = 32 * 1024 * 1024
+	def __init__(self, policies=None, invalidations=None,
+			max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES,
+			directory=None, max_disk_entries=MAX_ENTRIES):
+		""" If directory is specified, entries are also stored on disk. """
+		self.policies = DEFAULT_POLICIES if policies is None else policies
+		self.invalidations = DEFAULT_INVALIDATIONS if invalidations is None else invalidations
+		self.memory = MemoryTier(max_entries, max_bytes)
+		self.disk = DiskTier(directory, max_disk_entries) if directory else None
+		self.version = None
+		self.hits = 0
+		self.misses = 0
+		self.refreshes = 0
+		self._lock = threading.RLock()
+		self._refreshing = set()
+		self._executor = None
+	def policy(self, path):
+		""" Returns first policy that matches path or None if path should not be cached. """
+		for policy in self.policies:
+			if policy.matches(path):
+				return policy
+		return None
+	def set_version(self, version):
+		""" Sets current server version (used by versioned policies). """
+		if version and version != self.version:
+			logger.debug('Server version: {0}'.format(version))
+			self.version = version
+	def state(self, policy, entry, now=None):
+		""" Returns FRESH, STALE or EXPIRED for the entry. """
+		now = time.time() if now is None else now
+		if policy.versioned and self.version and entry.version:
+			return self.FRESH if entry.version == self.version else self.EXPIRED
+		if policy.ttl is None:
+			return self.FRESH
+		age = now - entry.stored
+		if age <= policy.ttl:
+			return self.FRESH
+		if age <= policy.ttl + policy.stale:
+			return self.STALE
+		return self.EXPIRED
+	def lookup(self, path, key):
+		""" Returns (entry, state) or (None, EXPIRED) if there is no valid entry. """
+		policy = self.policy(path)
+		if policy is None:
+			return None, self.EXPIRED
+		with self._lock:
+			entry = self.memory.get(key)
+			if entry is None and self.disk is not None:
+				entry = self.disk.get(path, key)
+				if entry is not None:
+					self.memory.put(key, entry)
+			if entry is None:
+				self.misses += 1
+				return None, self.EXPIRED
+			state = self.state(policy, entry)
+			if state == self.EXPIRED:
+				self.misses += 1
+				self.memory.remove(key)
+				return None, state
+			self.hits += 1
+			return entry, state
+	def store(self, path, key, body):
+		""" Stores response body if path is cacheable. """
+		if self.policy(path) is None:
+			return
+		serialized_body = json.dumps(body)
+		entry = Entry(path, serialized_body, time.time(), self.version, len(serialized_body))
+		with self._lock:
+			self.memory.put(key, entry)
+			if self.disk is not None:
+				with config.file_lock(self.disk.directory/'responses'):
+					self.disk.put(key, entry)
+	def get(self, path, key, fetch):
+		""" Returns cached body for the request or calls fetch() to get actual one.
+		Stale entries are returned immediately and refreshed in background thread.
+		"""
+		entry, state = self.lookup(path, key)
+		if entry is None:
+			body = fetch()
+			self.store(path, key, body)
+			return body
+		if state == self.STALE:
+			self.refresh(path, key, fetch)
+		return entry.value()
+	def refresh(self, path, key, fetch):
+		""" Schedules background refresh for the entry (only one at a time per key).
+		Returns Future or None if refresh is already in progress.
+		"""
+		with self._lock:
+			if key in self._refreshing:
+				return None
+			self._refreshing.add(key)
+			if self._executor is None:
+				self._executor = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix='habitica-cache')
+		def _refresh():
+			try:
+				self.store(path, key, fetch())
+				with self._lock:
+					self.refreshes += 1
+			except Exception as e:
+				logger.debug('Failed to refresh cached response {0}: {1}'.format(path, e))
+			finally:
+				with self._lock:
+					self._refreshing.discard(key)
+		return self._executor.submit(_refresh)
+	def invalidate(self, path):
+		""" Drops entries affected by write request to the path.
+		If there are no rules for the path, drops everything.
+		"""
+		rules = [rule for rule in self.invalidations if rule.matches(path)]
+		if not rules:
+			logger.debug('No invalidation rules for {0}, clearing cache.'.format(path))
+			self.clear()
+			return
+		affected = lambda entry_path: any(rule.affects(entry_path) for rule in rules)
+		with self._lock:
+			for key in self.memory.keys():
+				if affected(self.memory._entries[key].path):
+					self.memory.remove(key)
+			if self.disk is not None:
+				with config.file_lock(self.disk.directory/'responses'):
+					self.disk.remove_paths(affected)
+	def clear(self):
+		with self._lock:
+			self.memory.clear()
+			if self.disk is not None:
+				with config.file_lock(self.disk.directory/'responses'):
+					self.disk.clear()
+	def close(self):
+		""" Waits for background refreshes to finish. """
+		if self._executor is not None:
+			self._executor.shutdown(wait=True)
+			self._executor = None
+	def stats(self):
+		""" Returns dict with counters: hits, misses, refreshes, entries, bytes (in memory). """
+		with self._lock:
+			return {
+					'hits': self.hits,
+					'misses': self.misses,
+					'refreshes': self.refreshes,
+					'entries': len(self.memory),
+					'bytes': self.memory.total_bytes,
+					}
@@ -0,0 +1,171 @@
+""" Record/replay transport for API.
+
+Recorder captures real request/response pairs into cassette file,
+Player serves them back without network:
+	with API(url, login, password, transport=cassette.Recorder('session.jsonl.gz')) as api:
+		...
+	with API(url, login, password, transport=cassette.Player('session.jsonl.gz')) as api:
+		...
+
+Cassette is a gzipped JSON Lines file (one interaction per line),
+interactions are appended as soon as they are performed.
+Credentials are never stored: request headers are not recorded at all,
+API key (as well as known secret fields like apiToken) is redacted
+from everything that is recorded. User ID is public and is kept as-is.
+
+Requests are matched by method, URL path (without host, so cassette can be
+replayed against any server), query and body. Repeated identical requests
+are served with recorded responses in the same order, the last one is repeated
+after that. Player does not simulate rate limits (X-RateLimit headers are dropped)
+unless asked for.
+"""
+import time
+import json
+import gzip
+import threading
+import urllib.parse
+from pathlib import Path
+import requests
+
+REDACTED = 'REDACTED'
+SECRET_HEADERS = {'x-api-key', 'authorization', 'cookie', 'set-cookie'}
+SECRET_FIELDS = {'apiToken', 'password', 'hashed_password', 'salt', 'passwordResetCode'}
+
+class CassetteError(Exception):
+	""" Request is not found in cassette. """
+
+def _request_key(method, url, params, data):
+	path = urllib.parse.urlsplit(url).path
+	params = sorted((str(key), str(value)) for key, value in (params or {}).items() if value is not None)
+	if isinstance(data, bytes):
+		data = data.decode('utf-8')
+	return (method.upper(), path, json.dumps(params), data or '')
+
+def _redact(value, secrets):
+	""" Returns copy of JSON-like value with secret fields and values replaced. """
+	if isinstance(value, dict):
+		return {key:(REDACTED if key in SECRET_FIELDS else _redact(item, secrets)) for key, item in value.items()}
+	if isinstance(value, list):
+		return [_redact(item, secrets) for item in value]
+	if isinstance(value, str):
+		for secret in secrets:
+			value = value.replace(secret, REDACTED)
+	return value
+
+class Cassette:
+	""" Storage of recorded interactions. """
+	def __init__(self, filename):
+		self.filename = Path(filename)
+	def load(self):
+		""" Returns list of all recorded interactions. """
+		with gzip.open(str(self.filename), 'rt', encoding='utf-8') as f:
+			return [json.loads(line) for line in f if line.strip()]
+	def append(self, interaction):
+		""" Appends interaction to the end of cassette.
+		Every call adds separate gzip member, so cassette is always readable.
+		"""
+		with gzip.open(str(self.filename), 'at', encoding='utf-8') as f:
+			f.write(json.dumps(interaction, sort_keys=True) + '\n')
+
+class Response:
+	""" Minimal requests.Response replacement for replayed interactions. """
+	def __init__(self, interaction, url):
+		self.url = url
+		self.status_code = interaction['status']
+		self.reason = interaction['reason']
+		self.headers = requests.structures.CaseInsensitiveDict(interaction['headers'])
+		self.content = interaction['content'].encode('utf-8')
+	def json(self):
+		return json.loads(self.content.decode('utf-8'))
+	def raise_for_status(self):
+		if 400 <= self.status_code:
+			raise requests.exceptions.HTTPError('{0} Error: {1} for url: {2}'.format(self.status_code, self.reason, self.url), response=self)
+	def iter_content(self, chunk_size):
+		for start in range(0, len(self.content), chunk_size):
+			yield self.content[start:start + chunk_size]
+	def close(self):
+		pass
+
+class _Transport:
+	""" Base class for session-compatible transports. """
+	def __call__(self, session):
+		""" Makes transport usable as API(transport=...) """
+		self.session = session
+		return self
+	def get(self, url, **kwargs):
+		return self.request('GET', url, **kwargs)
+	def post(self, url, **kwargs):
+		return self.request('POST', url, **kwargs)
+	def put(self, url, **kwargs):
+		return self.request('PUT', url, **kwargs)
+	def delete(self, url, **kwargs):
+		return self.request('DELETE', url, **kwargs)
+	def close(self):
+		if getattr(self, 'session', None) is not None:
+			self.session.close()
+
+class Recorder(_Transport):
+	""" Performs requests via real session and records them to cassette. """
+	def __init__(self, filename):
+		self.cassette = Cassette(filename)
+		self.session = None
+		self._lock = threading.Lock()
+	def request(self, method, url, headers=None, params=None, data=None, **kwargs):
+		headers = headers or {}
+		secrets = [value for key, value in headers.items() if key.lower() in SECRET_HEADERS and value]
+		start = time.perf_counter()
+		response = getattr(self.session, method.lower())(url, headers=headers, params=params, data=data, **kwargs)
+		content = response.content # Reads streamed response as well.
+		elapsed = time.perf_counter() - start
+		_, path, query, body = _request_key(method, url, params, data)
+		interaction = _redact({
+			'method' : method.upper(),
+			'path' : path,
+			'query' : json.loads(query),
+			'body' : body,
+			'status' : response.status_code,
+			'reason' : response.reason,
+			'headers' : {key:value for key, value in response.headers.items() if key.lower() not in SECRET_HEADERS},
+			'content' : (content or b'').decode('utf-8', 'replace'),
+			'elapsed' : round(elapsed, 6),
+			}, secrets)
+		with self._lock:
+			self.cassette.append(interaction)
+		return response
+
+class Player(_Transport):
+	""" Serves recorded responses from cassette without network.
+	Latency could be simulated: None (default) - no delay,
+	'recorded' - the same delay as during recording, number - fixed delay in seconds.
+	If rate_limits is False (default), X-RateLimit-* headers are not replayed,
+	so API rate limiter is not affected by recorded server state.
+	"""
+	def __init__(self, filename, latency=None, rate_limits=False):
+		self.cassette = Cassette(filename)
+		self.latency = latency
+		self.session = None
+		self._lock = threading.Lock()
+		self._index = {}
+		for interaction in self.cassette.load():
+			if not rate_limits:
+				interaction['headers'] = {key:value for key, value in interaction['headers'].items() if not key.lower().startswith('x-ratelimit-')}
+			key = (interaction['method'], interaction['path'], json.dumps(interaction['query']), interaction['body'])
+			self._index.setdefault(key, []).append(interaction)
+		self._served = {}
+	def __call__(self, session):
+		""" Real session is not needed for replay. """
+		session.close()
+		return self
+	def request(self, method, url, headers=None, params=None, data=None, **kwargs):
+		key = _request_key(method, url, params, data)
+		interactions = self._index.get(key)
+		if not interactions:
+			raise CassetteError('Request is not found in cassette {0}: {1} {2} query={3} body={4}'.format(self.cassette.filename, *key))
+		with self._lock:
+			served = self._served.get(key, 0)
+			self._served[key] = served + 1
+		interaction = interactions[min(served, len(interactions) - 1)]
+		delay = interaction['elapsed'] if self.latency == 'recorded' else self.latency
+		if delay:
+			time.sleep(delay)
+		return Response(interaction, url)
@@ -17,7 +17,9 @@ import re
 import argparse
 import functools, itertools
 import operator
+import concurrent.futures
 from webbrowser import open_new_tab
+import collections
 from collections import namedtuple
 from pathlib import Path
 
@@ -143,6 +145,68 @@ def filter_tasks(tasks, patterns):
 		raise RuntimeError("couldn't find task that includes {0}".format(', '.join(map(repr, unprocessed))))
 	return result
 
+BulkResult = namedtuple('BulkResult', 'item value error')
+
+class BulkExecutor:
+	""" Performs the same action for many items (e.g. completes several tasks)
+	concurrently instead of one blocking request after another.
+	Number of simultaneous requests is bounded, actual pace is controlled
+	by API rate limiter, so budget is never exceeded.
+	Items that share the same key (see key_func) are processed sequentially
+	in original order (e.g. checklist items and their parent task).
+	"""
+	MAX_WORKERS = 4
+	def __init__(self, max_workers=MAX_WORKERS, key_func=None):
+		self.max_workers = max_workers
+		self.key_func = key_func or self.task_key
+	@staticmethod
+	def task_key(item):
+		""" Default key: sub-items are chained with their parent task. """
+		parent = getattr(item, 'parent', None)
+		return (parent or item).id
+	def run(self, action, items):
+		""" Calls action(item) for every item.
+		Yields BulkResult(item, value, error) in the original order of items
+		as soon as each result is ready, so progress can be reported immediately.
+		Exceptions are not raised but are collected as .error of corresponding result.
+		"""
+		items = list(items)
+		futures = [concurrent.futures.Future() for _ in items]
+		chains = collections.OrderedDict()
+		for item, future in zip(items, futures):
+			chains.setdefault(self.key_func(item), []).append((item, future))
+		def process(chain):
+			for item, future in chain:
+				try:
+					future.set_result(action(item))
+				except Exception as e:
+					future.set_exception(e)
+		with concurrent.futures.ThreadPoolExecutor(self.max_workers, thread_name_prefix='habitica-bulk') as executor:
+			for chain in chains.values():
+				executor.submit(process, chain)
+			for item, future in zip(items, futures):
+				try:
+					yield BulkResult(item, future.result(), None)
+				except Exception as e:
+					yield BulkResult(item, None, e)
+
+def run_bulk(action, items, message):
+	""" Runs action for all items (see BulkExecutor) and reports each result:
+	message is formatted with item title (prefixed with parent's title for sub-items).
+	Returns number of failed items.
+	"""
+	errors = 0
+	for result in BulkExecutor().run(action, items):
+		if result.error is not None:
+			logger.error(result.error)
+			errors += 1
+			continue
+		title = result.item.text
+		if hasattr(result.item, 'parent'):
+			title = result.item.parent.text + ' : ' + title
+		logger.print(message.format(title))
+	return errors
+
 def print_task_list(tasks, hide_completed=False, timezoneOffset=0, with_notes=False, time_now=None, printer=None):
 	printer = printer or logger.print
 	time_now = time_now or datetime.datetime.now()
@@ -190,11 +254,12 @@ class PrintEventHandler(core.base.EventHandler): # pragma: no cover
 @click.option('-v', '--verbose', is_flag=True, help='Show some logging information')
 @click.option('-d', '--debug', is_flag=True, help='Show all logging information')
 @click.option('--notifications/--no-notifications', default=True, help='Display notifications from Habitica (prints to stderr). By default is enabled.')
+@click.option('--journal/--no-journal', 'use_journal', default=True, help='Save scoring to offline journal when server is unavailable (see `journal` command). By default is enabled.')
 @click.pass_context
-def cli(ctx, quiet=False, verbose=False, debug=False, notifications=False): # pragma: no cover
+def cli(ctx, quiet=False, verbose=False, debug=False, notifications=False, use_journal=True): # pragma: no cover
 	""" Habitica command-line interface. """
 	# Click's context object is authenticated Habitica endpoint.
-	ctx.obj = Habitica(auth=config.load_auth(), event_handler=PrintEventHandler())
+	ctx.obj = Habitica(auth=config.load_auth(), event_handler=PrintEventHandler(), journal=use_journal)
 	if not notifications or quiet:
 		ctx.obj.events.printing_enabled(False)
 
@@ -318,14 +383,10 @@ def habits_up(habitica, tasks, full=False): # pragma: no cover
 	You can pass one or more <task-id> parameters, using either comma-separated lists or ranges or both. For example, `todos done 1,3,6-9,11`.
 	"""
 	habits = habitica.user.habits()
-	for habit in filter_tasks(habits, tasks):
-		try:
-			habit.up()
-			logger.print('incremented task \'%s\'' % habit.text)
-		except CannotScoreUp as e:
-			logger.error(e)
-			continue
+	errors = run_bulk(lambda habit: habit.up(), filter_tasks(habits, tasks), "incremented task '{0}'")
 	print_habits(habits, full=full)
+	if errors:
+		sys.exit(1)
 
 @habits.command('down')
 @click.argument('tasks', nargs=-1, required=True)
@@ -337,14 +398,10 @@ def habits_down(habitica, tasks, full=False): # pragma: no cover
 	You can pass one or more <task-id> parameters, using either comma-separated lists or ranges or both. For example, `todos done 1,3,6-9,11`.
 	"""
 	habits = habitica.user.habits()
-	for habit in filter_tasks(habits, tasks):
-		try:
-			habit.down()
-			logger.print('decremented task \'%s\'' % habit.text)
-		except CannotScoreDown as e:
-			logger.error(e)
-			continue
+	errors = run_bulk(lambda habit: habit.down(), filter_tasks(habits, tasks), "decremented task '{0}'")
 	print_habits(habits, full=full)
+	if errors:
+		sys.exit(1)
 
 @cli.group(cls=click_default_group.DefaultGroup, default='list', default_if_no_args=True)
 @click.pass_obj
@@ -375,13 +432,10 @@ def dailies_done(habitica, tasks, full=False, list_all=False): # pragma: no cove
 	user = habitica.user()
 	timezoneOffset = user.preferences.timezoneOffset
 	dailies = user.dailies()
-	for task in filter_tasks(dailies, tasks):
-		title = task.text
-		if hasattr(task, 'parent'):
-			title = task.parent.text + ' : ' + title
-		task.complete()
-		logger.print('marked daily \'%s\' completed' % title)
+	errors = run_bulk(lambda task: task.complete(), filter_tasks(dailies, tasks), "marked daily '{0}' completed")
 	print_task_list(dailies, hide_completed=not list_all, timezoneOffset=timezoneOffset, with_notes=full)
+	if errors:
+		sys.exit(1)
 
 @dailies.command('undo')
 @click.argument('tasks', nargs=-1, required=True)
@@ -396,13 +450,10 @@ def dailies_undo(habitica, tasks, full=False, list_all=False): # pragma: no cove
 	user = habitica.user()
 	timezoneOffset = user.preferences.timezoneOffset
 	dailies = user.dailies()
-	for task in filter_tasks(dailies, tasks):
-		title = task.text
-		if hasattr(task, 'parent'):
-			title = task.parent.text + ' : ' + title
-		task.undo()
-		logger.print('marked daily \'%s\' incomplete' % title)
+	errors = run_bulk(lambda task: task.undo(), filter_tasks(dailies, tasks), "marked daily '{0}' incomplete")
 	print_task_list(dailies, hide_completed=not list_all, timezoneOffset=timezoneOffset, with_notes=full)
+	if errors:
+		sys.exit(1)
 
 @cli.group(cls=click_default_group.DefaultGroup, default='list', default_if_no_args=True)
 @click.pass_obj
@@ -422,20 +473,17 @@ def todos_list(habitica, full=False): # pragma: no cover
 @click.argument('tasks', nargs=-1, required=True)
 @click.option('--full', is_flag=True, help='Print tasks details along with the title.')
 @click.pass_obj
-def todos_done(habitica, tasks, full=False): # pragma: no cover
+def todos_done(habitica, tasks, full=False):
 	""" Mark one or more todo completed
 
 	You can pass one or more <task-id> parameters, using either comma-separated lists or ranges or both. For example, `todos done 1,3,6-9,11`.
 	"""
 	todos = [e for e in habitica.user.todos() if not e.is_completed]
-	for task in filter_tasks(todos, tasks):
-		title = task.text
-		if hasattr(task, 'parent'):
-			title = task.parent.text + ' : ' + title
-		task.complete()
-		logger.print('marked todo \'%s\' completed' % title)
+	errors = run_bulk(lambda task: task.complete(), filter_tasks(todos, tasks), "marked todo '{0}' completed")
 	with_notes = full
 	print_task_list(todos, with_notes=full, hide_completed=True)
+	if errors:
+		sys.exit(1)
 
 @todos.command('add')
 @click.option('--difficulty', type=click.Choice(['easy', 'medium', 'hard']), default='easy')
@@ -496,11 +544,19 @@ def spells(habitica, cast=None, habits=None, todos=None): # pragma: no cover
 	elif todos:
 		targets.extend(filter_tasks(user.todos(), todos))
 	if targets:
-		for target in targets:
-			if user.cast(spell, target):
-				logger.print('Casted spell "{0}"'.format(spell.text))
+		def cast_on(target):
+			if not user.cast(spell, target):
+				raise RuntimeError('Failed to cast spell "{0}" on \'{1}\''.format(spell.text, target.text))
+		# Spells change user stats (mana), so casts are chained.
+		errors = 0
+		for result in BulkExecutor(key_func=lambda target: user.id).run(cast_on, targets):
+			if result.error is not None:
+				logger.error(result.error)
+				errors += 1
 			else:
-				sys.exit(1)
+				logger.print('Casted spell "{0}" on \'{1}\''.format(spell.text, result.item.text))
+		if errors:
+			sys.exit(1)
 	else:
 		user.cast(spell)
 		logger.print('Casted spell "{0}"'.format(spell.text))
@@ -600,5 +656,42 @@ def tavern(habitica, go_in=False, go_out=False, toggle=False): # pragma: no cove
 	else:
 		logger.print('Out of tavern.')
 
+@cli.group(cls=click_default_group.DefaultGroup, default='list', default_if_no_args=True)
+@click.pass_obj
+def journal(habitica): # pragma: no cover
+	""" Offline journal of scoring requests. """
+	if habitica.api.journal is None:
+		logger.error('Offline journal is disabled.')
+		sys.exit(1)
+
+@journal.command('list')
+@click.option('--all', 'show_all', is_flag=True, help='Show also failed requests. By default only pending ones are shown.')
+@click.pass_obj
+def journal_list(habitica, show_all=False): # pragma: no cover
+	""" List requests saved to offline journal """
+	entries = habitica.api.journal.entries() if show_all else habitica.api.journal.pending()
+	for entry in entries:
+		timestamp = datetime.datetime.fromtimestamp(entry.time).strftime('%Y-%m-%d %H:%M:%S') if entry.time else '-'
+		logger.print('{0} {1} {2:<9} {3}{4}'.format(entry.key, timestamp, entry.state, entry,
+			' ({0})'.format(entry.error) if entry.error else '',
+			))
+
+@journal.command('flush')
+@click.option('--retry-uncertain', is_flag=True, help='Resend also requests that were sent before but were not acknowledged by server (may score twice).')
+@click.pass_obj
+def journal_flush(habitica, retry_uncertain=False): # pragma: no cover
+	""" Send requests saved to offline journal """
+	stats = habitica.replay_journal(retry_uncertain=retry_uncertain)
+	logger.print('Sent: {sent}, failed: {failed}, skipped as uncertain: {skipped}, still pending: {pending}'.format(**stats))
+	if stats['pending']:
+		sys.exit(1)
+
+@journal.command('drop')
+@click.argument('keys', nargs=-1, required=True)
+@click.pass_obj
+def journal_drop(habitica, keys): # pragma: no cover
+	""" Drop requests from offline journal without sending them """
+	habitica.api.journal.drop(*keys)
+
 if __name__ == '__main__': # pragma: no cover
 	cli()
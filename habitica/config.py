@@ -1,8 +1,13 @@
 import os
+import contextlib
 try:
     import ConfigParser as configparser
 except:
     import configparser
+try:
+	import fcntl
+except ImportError: # pragma: no cover -- Windows.
+	fcntl = None
 import logging
 logger = logging.getLogger('habitica')
 
@@ -38,6 +43,21 @@ def get_cache_dir(*args): # pragma: no cover
 	os.makedirs(app_cache_dir, exist_ok=True)
 	return app_cache_dir
 
+@contextlib.contextmanager
+def file_lock(filename):
+	""" Exclusive inter-process lock, uses separate '<filename>.lock' file.
+	Guards the whole with-block, so file could be safely read, modified and written back.
+	On systems without fcntl lock does nothing.
+	"""
+	with open(str(filename) + '.lock', 'a') as lock:
+		if fcntl:
+			fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+		try:
+			yield
+		finally:
+			if fcntl:
+				fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
 AUTH_CONF = os.path.join(get_config_local_dir(), "auth.cfg")
 if not os.path.exists(AUTH_CONF): # pragma: no cover
 	AUTH_CONF = os.path.join(get_data_dir(), "auth.cfg")
@@ -1,6 +1,7 @@
 from .. import api
-from ..api import dotdict
-from . import base, content, tasks, groups, user, quests, tags
+from ..journal import Journal
+from ..api import dotdict, dataview
+from . import base, content, tasks, groups, user, quests, tags, writes
 from .content import *
 from .groups import *
 from .tasks import *
@@ -8,10 +9,12 @@ from .user import *
 from .tags import *
 from .quests import *
 from .user import UserProxy
+from .aio import AsyncHabitica
 
 # TODO the whole /debug/ route for development
 
 class Coupon(base.ApiObject, base.Marketable):
+	__slots__ = ()
 	# TODO get/ and generate/ - require sudo permissions.
 	@property
 	def code(self):
@@ -22,11 +25,13 @@ class Coupon(base.ApiObject, base.Marketable):
 		return self.api.post('coupons', 'enter', self._data)
 
 class Message(base.ApiObject):
+	__slots__ = ()
 	def delete(self): # pragma: no cover -- TODO
 		# TODO apparently returns user.inbox.messages
 		return self.api.delete('user', 'messages', self.id).data
 
 class NewsPost(base.ApiObject):
+	__slots__ = ()
 	@property
 	def title(self):
 		return self._data['title']
@@ -47,6 +52,7 @@ class NewsPost(base.ApiObject):
 		return self._data['published']
 
 class News(base.ApiObject):
+	__slots__ = ()
 	# TODO create a new news post (POST /news/)
 	# TODO delete a news post (DELETE /news/)
 	# TODO update a news post (PUT /news/)
@@ -59,6 +65,7 @@ class News(base.ApiObject):
 		self.api.post('news', 'tell-me-later')
 
 class StableKey(base.ApiInterface, base.MarketableForGems):
+	__slots__ = ('_data', '_method')
 	def __init__(self, *args, _method=None, _value=None, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._method = _method
@@ -69,6 +76,7 @@ class StableKey(base.ApiInterface, base.MarketableForGems):
 		return self.api.post('user', self._method)
 
 class FortifyPotion(base.ApiInterface, base.MarketableForGems):
+	__slots__ = ('_data',)
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._data = {
@@ -78,6 +86,7 @@ class FortifyPotion(base.ApiInterface, base.MarketableForGems):
 		return self.api.post('user', 'reroll')
 
 class OrbOfRebirth(base.ApiInterface, base.MarketableForGems):
+	__slots__ = ('_data',)
 	def __init__(self, *args, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._data = {
@@ -87,6 +96,7 @@ class OrbOfRebirth(base.ApiInterface, base.MarketableForGems):
 		return self.api.post('user', 'rebirth')
 
 class Market(base.ApiObject):
+	__slots__ = ()
 	def gear(self):
 		if 'gear' not in self._data:
 			self._data['gear'] = self.children(content.Gear, self.api.get('user', 'inventory', 'buy').data)
@@ -128,6 +138,7 @@ class CollectEventHandler(base.EventHandler): # pragma: no cover -- TODO move to
 		return result
 
 class Notification(base.Entity):
+	__slots__ = ()
 	@property
 	def id(self): # pragma: no cover -- TODO really unused in CLI version.
 		return self._data['id']
@@ -139,7 +150,7 @@ class Notification(base.Entity):
 		return self._data['type']
 	@property
 	def data(self):
-		return dotdict(self._data['data'])
+		return dataview.item(self._data, 'data')
 	def __str__(self):
 		if self.type == 'CRON':
 			stats = []
@@ -173,6 +184,7 @@ class Notification(base.Entity):
 		self._data['seen'] = True
 
 class Notifications(base.ApiObject):
+	__slots__ = ()
 	def add(self, notification):
 		self._data.append(notification._data)
 	def __contains__(self, other):
@@ -195,7 +207,11 @@ class Notifications(base.ApiObject):
 				logger.error(e)
 
 class Habitica(base.ApiInterface):
-	""" Main Habitica entry point. """
+	""" Main Habitica entry point.
+	May hold session-wide identity map: entity (task, group, member etc)
+	with the same type and ID is represented by the single live object,
+	newer data received for it is merged into that object (see base.ApiInterface.child()).
+	"""
 	# TODO /hall/{heroes,patrons}
 	# TODO /user/block
 	# TODO DELETE /user
@@ -208,12 +224,26 @@ class Habitica(base.ApiInterface):
 	# TODO PUT /user/auth/update-password
 	# TODO PUT /user/auth/update-username
 	# TODO webhooks
-	def __init__(self, auth=None, event_handler=None, _api=None):
+	def __init__(self, auth=None, event_handler=None, _api=None, response_cache=None, mapped_content=False, journal=None, identity_map=False):
+		""" If response_cache is specified (True or habitica.cache.ResponseCache),
+		API responses are cached transparently for all objects (see API for details).
+		If mapped_content is True, content is mapped into memory from cache file
+		instead of being loaded, so several worker processes share the same copy.
+		If journal is specified (True or habitica.journal.Journal), scoring requests
+		that fail while server is unavailable are saved to be replayed later
+		(see replay_journal()).
+		If identity_map is True, entities are unique per session (see base.IdentityMap).
+		It costs a weak reference per entity, so it is disabled by default.
+		"""
 		# TODO POST /user/auth/local/login
-		self.api = _api or api.API(auth['url'], auth['x-api-user'], auth['x-api-key'])
+		if journal is True:
+			journal = Journal()
+		self.api = writes.WriteQueue(_api or api.API(auth['url'], auth['x-api-user'], auth['x-api-key'], response_cache=response_cache), journal=journal)
 		self.events = event_handler or CollectEventHandler()
+		self._identities = base.IdentityMap() if identity_map else None
 		self.api.set_response_hook(self._api_notifications_hook)
 		self._content = None
+		self._mapped_content = mapped_content
 		self._reported_notifications = self.child(Notifications, [])
 	def _api_notifications_hook(self, response):
 		if not isinstance(response, dict):
@@ -229,6 +259,20 @@ class Habitica(base.ApiInterface):
 				continue
 			self._reported_notifications.add(notification)
 			self.events.add(str(notification))
+	def write_queue(self):
+		""" Returns write queue (see habitica.core.writes) as context manager.
+		Within it redundant writes of all objects are folded
+		and sent at the end of the block:
+			with habitica.write_queue() as queue:
+				...
+			print(queue.stats())
+		"""
+		return self.api
+	def replay_journal(self, retry_uncertain=False):
+		""" Sends writes saved to offline journal (see habitica.journal).
+		Returns stats: {'sent', 'failed', 'skipped', 'pending'}
+		"""
+		return self.api.replay_journal(retry_uncertain=retry_uncertain)
 	def mark_all_notifications_as_seen(self):
 		self._reported_notifications.mark_as_seen()
 	def home_url(self):
@@ -241,7 +285,7 @@ class Habitica(base.ApiInterface):
 	@property
 	def content(self):
 		if self._content is None:
-			self._content = Content(_api=self.api)
+			self._content = Content(_api=self.api, _mapped=self._mapped_content)
 		return self._content
 	def coupon(self, code):
 		return self.child(Coupon, code)
@@ -0,0 +1,238 @@
+""" Asyncio facade for Habitica object model.
+
+Object model itself stays synchronous: every coroutine call is executed
+in a worker thread, while actual requests are performed by api.AsyncAPI
+within the event loop. So independent calls can be run concurrently:
+	habitica = await AsyncHabitica(auth).connect()
+	user = await habitica.user()
+	todos = await user.todos()
+	async for member in group.members():
+		...
+	chats = await asyncio.gather(*(group.chat() for group in groups))
+
+Methods of proxied objects return awaitables, data properties are accessed directly:
+	group.name
+	user.stats.hp
+Properties that require remote requests (like habitica.content) cannot be accessed
+directly from the event loop, use proxy.fetch('name') instead:
+	content = await habitica.fetch('content')
+"""
+import asyncio
+import functools
+import types
+from concurrent.futures import ThreadPoolExecutor
+from .. import api
+from . import base
+
+class _Runner:
+	""" Runs sync object model in worker threads
+	and forwards requests from worker threads to event loop.
+	"""
+	def __init__(self, max_workers):
+		self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix='habitica')
+		self.loop = None
+	def run_coroutine(self, coro):
+		""" Runs coroutine within event loop and waits for the result.
+		Should be called only from worker threads.
+		"""
+		try:
+			running_loop = asyncio.get_running_loop()
+		except RuntimeError:
+			running_loop = None
+		if self.loop is None or running_loop is self.loop:
+			coro.close()
+			raise RuntimeError('Blocking Habitica request from within event loop. Use "await obj.fetch(attr_name)" for properties that perform remote requests.')
+		return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+	async def run(self, func, *args, _materialize=True, **kwargs):
+		""" Runs function in worker thread.
+		If _materialize is True, generators and lazy sequences are collected into a list
+		and result is wrapped into async proxies.
+		"""
+		self.loop = asyncio.get_running_loop()
+		call = functools.partial(self._call, func, args, kwargs, _materialize)
+		result = await self.loop.run_in_executor(self.executor, call)
+		return self.wrap(result) if _materialize else result
+	@staticmethod
+	def _call(func, args, kwargs, materialize):
+		result = func(*args, **kwargs)
+		if materialize and isinstance(result, (types.GeneratorType, base.ChildSequence)):
+			result = list(result)
+		return result
+	def wrap(self, value):
+		""" Wraps ApiInterface objects (or lists of them) into async proxies. """
+		if isinstance(value, base.ApiInterface):
+			return AsyncProxy(value, self)
+		if type(value) in (list, tuple):
+			return type(value)(self.wrap(item) for item in value)
+		return value
+
+class _SyncAPIBridge:
+	""" Sync API interface for object model that is run in worker threads.
+	All actual calls are forwarded to async API within event loop.
+	"""
+	def __init__(self, async_api, runner):
+		self._api = async_api
+		self._runner = runner
+	def _call(self, method, *args, **kwargs):
+		return self._runner.run_coroutine(getattr(self._api, method)(*args, **kwargs))
+	def get(self, *args, _stream=False, **kwargs):
+		if _stream:
+			return self._iter(self._api.get(*args, _stream=True, **kwargs))
+		return self._call('get', *args, **kwargs)
+	def _iter(self, async_iterator):
+		""" Iterates over async generator of streamed response from worker thread. """
+		finished = object()
+		async def next_item():
+			try:
+				return await async_iterator.__anext__()
+			except StopAsyncIteration:
+				return finished
+		try:
+			while True:
+				item = self._runner.run_coroutine(next_item())
+				if item is finished:
+					break
+				yield item
+		finally:
+			self._runner.run_coroutine(async_iterator.aclose())
+	def post(self, *args, **kwargs):
+		return self._call('post', *args, **kwargs)
+	def put(self, *args, **kwargs):
+		return self._call('put', *args, **kwargs)
+	def delete(self, *args, **kwargs):
+		return self._call('delete', *args, **kwargs)
+	def call(self, *args, **kwargs): # pragma: no cover -- not used by object model directly.
+		return self._call('call', *args, **kwargs)
+	@property
+	def v4(self):
+		return _SyncAPIBridge(self._api.v4, self._runner)
+	def cached(self, cache_entry_name, **kwargs):
+		return _SyncAPIBridge(self._api.cached(cache_entry_name, **kwargs), self._runner)
+	def get_sharded(self, *args, **kwargs):
+		return self._call('get_sharded', *args, **kwargs)
+	def get_mapped(self, *args, **kwargs):
+		return self._call('get_mapped', *args, **kwargs)
+	def __getattr__(self, attr):
+		return getattr(self._api, attr)
+
+class AsyncCall:
+	""" Pending call of a method of proxied object.
+	Can be awaited (generators are collected into lists):
+		result = await obj.method()
+	or iterated asynchronously (items are produced in worker thread one by one):
+		async for item in obj.method():
+	"""
+	def __init__(self, runner, func, args, kwargs):
+		self._runner = runner
+		self._func = func
+		self._args = args
+		self._kwargs = kwargs
+	def __await__(self):
+		return self._runner.run(self._func, *self._args, **self._kwargs).__await__()
+	async def __aiter__(self):
+		iterator = await self._runner.run(self._iter, _materialize=False)
+		finished = object()
+		while True:
+			item = await self._runner.run(next, iterator, finished, _materialize=False)
+			if item is finished:
+				break
+			yield self._runner.wrap(item)
+	def _iter(self):
+		return iter(self._func(*self._args, **self._kwargs))
+
+class AsyncMethod:
+	""" Method of proxied object. Calling it produces AsyncCall. """
+	def __init__(self, runner, func):
+		self._runner = runner
+		self._func = func
+	def __call__(self, *args, **kwargs):
+		return AsyncCall(self._runner, self._func, args, kwargs)
+
+class AsyncProxy:
+	""" Async wrapper for any ApiInterface object.
+	Methods return awaitables (see AsyncCall),
+	nested ApiInterface objects are wrapped as well,
+	other values are returned as-is.
+	"""
+	def __init__(self, obj, runner):
+		self._obj = obj
+		self._runner = runner
+	def __getattr__(self, attr):
+		value = getattr(self._obj, attr)
+		if isinstance(value, base.ApiInterface):
+			return AsyncProxy(value, self._runner)
+		if callable(value):
+			return AsyncMethod(self._runner, value)
+		return self._runner.wrap(value)
+	def fetch(self, attr):
+		""" Evaluates attribute (property) in worker thread.
+		Should be used for properties that perform remote requests.
+		"""
+		return AsyncCall(self._runner, getattr, (self._obj, attr), {})
+	def __call__(self, *args, **kwargs):
+		return AsyncCall(self._runner, self._obj, args, kwargs)
+	def __str__(self):
+		return str(self._obj)
+	def __repr__(self): # pragma: no cover
+		return 'AsyncProxy({0})'.format(repr(self._obj))
+	def __bool__(self):
+		return bool(self._obj)
+	def __len__(self):
+		return len(self._obj)
+	def __iter__(self):
+		return (self._runner.wrap(item) for item in self._obj)
+	def __getitem__(self, key):
+		return self._runner.wrap(self._obj[key])
+	def __eq__(self, other):
+		if isinstance(other, AsyncProxy):
+			other = other._obj
+		return self._obj == other
+	def __hash__(self):
+		return hash(self._obj)
+
+class AsyncHabitica(AsyncProxy):
+	""" Async variant of main Habitica entry point.
+	See module docstring for details.
+	Habitica object model loads content on creation, so it should be connected
+	before use and closed afterwards (or just used as async context manager):
+		async with AsyncHabitica(auth) as habitica:
+			...
+		habitica = await AsyncHabitica(auth).connect()
+		...
+		await habitica.close()
+	"""
+	def __init__(self, auth=None, event_handler=None, _api=None, max_workers=8, response_cache=None, mapped_content=False, identity_map=False):
+		""" Max workers is the number of object model calls that can run concurrently.
+		See Habitica for response_cache, mapped_content and identity_map.
+		"""
+		async_api = _api or api.AsyncAPI(auth['url'], auth['x-api-user'], auth['x-api-key'], response_cache=response_cache)
+		runner = _Runner(max_workers)
+		super().__init__(None, runner)
+		self.api = async_api
+		self._event_handler = event_handler
+		self._mapped_content = mapped_content
+		self._identity_map = identity_map
+	def __getattr__(self, attr):
+		if self._obj is None:
+			raise RuntimeError('AsyncHabitica is not connected, use "await habitica.connect()" or "async with habitica"')
+		return super().__getattr__(attr)
+	async def connect(self):
+		""" Creates actual Habitica object. Returns self. """
+		from . import Habitica
+		if self._obj is None:
+			self._obj = await self._runner.run(Habitica,
+					event_handler=self._event_handler,
+					_api=_SyncAPIBridge(self.api, self._runner),
+					mapped_content=self._mapped_content,
+					identity_map=self._identity_map,
+					_materialize=False,
+					)
+		return self
+	async def __aenter__(self):
+		return await self.connect()
+	async def __aexit__(self, *args):
+		await self.close()
+	async def close(self):
+		""" Closes async API session and stops worker threads. """
+		await self.api.close()
+		self._runner.executor.shutdown(wait=False)
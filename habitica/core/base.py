@@ -1,9 +1,13 @@
 """ Base definitions for other modules.
 Mostly non-functional.
 """
+import weakref
 import functools
+import collections, collections.abc
 import vintage
 import logging
+from ..api import unwrap
+from . import writes
 logger = logging.getLogger('habitica')
 
 def textsign(value):
@@ -32,18 +36,177 @@ def update_dict_deep(original, new_values):
 			original[key] = new_values[key]
 	return original
 
+class _Missing:
+	""" Marks absent value in Change: added key (.old) or removed key (.new). """
+	def __repr__(self):
+		return 'MISSING'
+MISSING = _Missing()
+
+# Single change in document: path is a tuple of keys, old and new are values at that path.
+Change = collections.namedtuple('Change', 'path old new')
+
+def diff_dict_deep(original, new_values, removed=False, _path=()):
+	""" Returns list of changes (see Change) between original and new dict.
+	By default works like update_dict_deep() does, i.e. only keys from new_values
+	are considered (partial update), absent keys are not changes.
+	If removed is True, new_values is treated as a full new version of the document,
+	so keys that are missing in new_values are reported as removed (new=MISSING).
+	Nested dicts are compared recursively, any other values (including lists)
+	are compared as a whole.
+	"""
+	changes = []
+	for key, value in new_values.items():
+		if key not in original:
+			changes.append(Change(_path + (key,), MISSING, value))
+			continue
+		old = original[key]
+		if isinstance(old, dict) and isinstance(value, dict):
+			changes.extend(diff_dict_deep(old, value, removed=removed, _path=_path + (key,)))
+		elif old != value:
+			changes.append(Change(_path + (key,), old, value))
+	if removed:
+		for key in original:
+			if key not in new_values:
+				changes.append(Change(_path + (key,), original[key], MISSING))
+	return changes
+
+def patch_dict(original, changes):
+	""" Applies changes (see diff_dict_deep()) to dict *in-place*.
+	Returns updated dict.
+	"""
+	for change in changes:
+		target = original
+		for key in change.path[:-1]:
+			target = target.setdefault(key, {})
+		if change.new is MISSING:
+			target.pop(change.path[-1], None)
+		else:
+			target[change.path[-1]] = change.new
+	return original
+
+class _MappingValues:
+	""" Indexable view of values of a mapping (in order of keys).
+	Values are taken from mapping only when accessed,
+	so lazy mappings (like api.MappedData) are not loaded entirely.
+	"""
+	def __init__(self, mapping, keys):
+		self._mapping = mapping
+		self._keys = keys
+	def __len__(self):
+		return len(self._keys)
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return _MappingValues(self._mapping, self._keys[index])
+		return self._mapping[self._keys[index]]
+
+class ChildSequence(collections.abc.Sequence):
+	""" Read-only sequence of ApiObjects that are created on demand
+	from corresponding data entries (see ApiInterface.children()).
+	Supports len(), indexing, slicing and iteration;
+	can be compared to and concatenated with lists.
+	Sequence holds a snapshot of entries list (but not of entries themselves),
+	so changes of original list after creation are not reflected.
+	If weak_cache is True (default), created objects are cached weakly:
+	the same object is returned for the same index while it is still in use somewhere.
+	"""
+	def __init__(self, factory, entries, weak_cache=True):
+		""" Factory is a callable that creates object from a single data entry. """
+		self._factory = factory
+		if isinstance(entries, collections.abc.ValuesView) and hasattr(entries, '_mapping'):
+			self._entries = _MappingValues(entries._mapping, list(entries._mapping))
+		else:
+			self._entries = list(entries)
+		self._weak_cache = weak_cache
+		self._refs = None # Weak references to created objects, by index.
+	def __len__(self):
+		return len(self._entries)
+	def _get(self, index):
+		if not self._weak_cache:
+			return self._factory(self._entries[index])
+		if self._refs is None:
+			self._refs = [None] * len(self._entries)
+		ref = self._refs[index]
+		obj = ref() if ref is not None else None
+		if obj is None:
+			obj = self._factory(self._entries[index])
+			self._refs[index] = weakref.ref(obj)
+		return obj
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			result = ChildSequence(self._factory, (), weak_cache=self._weak_cache)
+			result._entries = self._entries[index]
+			return result
+		if index < 0:
+			index += len(self._entries)
+		if not 0 <= index < len(self._entries):
+			raise IndexError('ChildSequence index out of range: {0}'.format(index))
+		return self._get(index)
+	def __iter__(self):
+		for index in range(len(self._entries)):
+			yield self._get(index)
+	def __eq__(self, other):
+		if isinstance(other, (ChildSequence, list, tuple)):
+			return list(self) == list(other)
+		return NotImplemented
+	__hash__ = None
+	def __add__(self, other):
+		return list(self) + list(other)
+	def __radd__(self, other):
+		return list(other) + list(self)
+	def __repr__(self):
+		return 'ChildSequence({0})'.format(list(self))
+
+class IdentityMap:
+	""" Session-wide map of canonical entities: {(type, ID): live object} (see ApiInterface.child()).
+	Objects are referenced weakly, entries are removed as soon as objects are garbage collected.
+	Every mapped object costs a weak reference (about 90 bytes).
+	"""
+	def __init__(self):
+		self._by_type = {}
+		self._callbacks = {}
+	def __len__(self):
+		return sum(map(len, self._by_type.values()))
+	def get(self, obj_type, entity_id):
+		""" Returns live object or None. """
+		by_id = self._by_type.get(obj_type)
+		ref = by_id.get(entity_id) if by_id is not None else None
+		return ref() if ref is not None else None
+	def add(self, obj_type, entity_id, obj):
+		by_id = self._by_type.get(obj_type)
+		if by_id is None:
+			by_id = self._by_type[obj_type] = {}
+			def _remove(ref, by_id=by_id):
+				if by_id.get(ref.key) is ref:
+					del by_id[ref.key]
+			self._callbacks[obj_type] = _remove
+		by_id[entity_id] = weakref.KeyedRef(obj, self._callbacks[obj_type], entity_id)
+
 class ApiInterface:
 	""" Base class for all objects that:
 	- has immediate parent (._parent);
 	- has access to main Habitica's Content() object (.content);
 	- can communicate with server via API (.api).
 	I.e. just interface to API without real data.
+
+	If root object of parent chain holds identity map (._identities, see IdentityMap),
+	entities created via child() are unique per session (see child()).
 	"""
+	__slots__ = ('api', 'content', '_parent', 'events', '__weakref__')
 	def __init__(self, _api=None, _events=None, _content=None, _parent=None):
 		self.api = _api
 		self.content = _content
 		self._parent = _parent
 		self.events = _events
+	def _identity_map(self):
+		""" Returns identity map of the root object (see Habitica) or None.
+		It is not stored in every object to keep them compact.
+		"""
+		obj = self
+		while True:
+			parent = getattr(obj, '_parent', None)
+			if parent is None:
+				return getattr(obj, '_identities', None)
+			obj = parent
 	def child_interface(self, obj_type, _parent=None, **params):
 		""" Creates ApiInterface (without data)
 		and passes through API, Content and parent (self).
@@ -56,15 +219,39 @@ class ApiInterface:
 		""" Creates ApiObject from given data
 		and passes through API, Content and parent (self).
 		If _parent is specified, it overrides value of 'self'.
+
+		Canonical entities with ID (see Entity.CANONICAL) are looked up in identity map first (if there is one):
+		if live object of the same type and ID already exists,
+		given data is merged into it, it is re-attached to the new parent
+		and that object is returned instead of a new one.
 		"""
 		if obj_type is not ApiObject and not issubclass(obj_type, ApiObject):
 			raise ValueError('Expected subclass of base.ApiObject, got instead: {0}'.format(obj_type))
-		return obj_type(_data=data, _api=self.api, _content=self.content, _events=self.events, _parent=(_parent or self), **params)
+		data = unwrap(data)
+		identities, entity_id = None, None
+		if not params and isinstance(data, dict) and getattr(obj_type, 'CANONICAL', False):
+			identities = (_parent or self)._identity_map()
+			if identities is not None:
+				entity_id = data.get('_id') or data.get('id')
+		if not entity_id:
+			return obj_type(_data=data, _api=self.api, _content=self.content, _events=self.events, _parent=(_parent or self), **params)
+		obj = identities.get(obj_type, entity_id)
+		if obj is not None:
+			obj._parent = _parent or self
+			if obj._data is not data:
+				obj._update(data)
+			return obj
+		obj = obj_type(_data=data, _api=self.api, _content=self.content, _events=self.events, _parent=(_parent or self))
+		identities.add(obj_type, entity_id, obj)
+		return obj
 	def children(self, obj_type, data_entries, _parent=None, **params):
-		""" Returns list of ApiObjects from given sequence of data (each entry for each object)
+		""" Returns sequence of ApiObjects from given sequence of data (each entry for each object)
 		and passes through API, Content and parent (self).
+		Objects are created lazily on access (see ChildSequence).
 		"""
-		return [self.child(obj_type, entry, _parent=_parent, **params) for entry in data_entries]
+		if obj_type is not ApiObject and not issubclass(obj_type, ApiObject):
+			raise ValueError('Expected subclass of base.ApiObject, got instead: {0}'.format(obj_type))
+		return ChildSequence(functools.partial(self.child, obj_type, _parent=_parent, **params), data_entries)
 	def _add_event(self, event_class, *data_path, data=None):
 		if data is None: # pragma: no cover -- TODO
 			data = self._data
@@ -89,13 +276,69 @@ class ApiObject(ApiInterface):
 	- are PureApiObject;
 	- holds data (._data);
 	I.e. any kind of Habitica data entity.
+	Data is kept as original plain dict (views of response fields are unwrapped, see api.nestedview).
+	Children that are derived from object's data can be memoized (see cached_child).
+	Changes of user stats in object's data are reported as stat events
+	only if TRACKS_STATS is True (i.e. object is the current user, see EventHandler.data_changed()).
 	"""
+	__slots__ = ('_data', '_cached_children')
+	TRACKS_STATS = False
 	def __init__(self, _api=None, _data=None, _events=None, _content=None, _parent=None):
 		super().__init__(_api=_api, _content=_content, _events=_events, _parent=_parent)
-		self._data = _data
+		self._data = unwrap(_data)
+		self._cached_children = None
 	def _update(self, new_values):
-		""" Updates internal object data recursively with new values. """
-		update_dict_deep(self._data, new_values)
+		""" Updates internal object data recursively with new values.
+		Only changed values are written, change set is reported to event handler
+		(see EventHandler.data_changed()).
+		Drops memoized children. Returns list of changes (see diff_dict_deep()).
+		"""
+		self._cached_children = None
+		changes = diff_dict_deep(self._data, new_values)
+		patch_dict(self._data, changes)
+		if changes and self.events is not None:
+			self.events.data_changed(self, changes)
+		return changes
+	@staticmethod
+	def _written(response, optimistic):
+		""" Returns data of write request response.
+		If request was postponed by write queue (see writes.WriteQueue),
+		returns result of optimistic() instead, i.e. expected data.
+		"""
+		if isinstance(response, writes.Queued):
+			return optimistic()
+		return response.data
+
+class cached_child:
+	""" Property of ApiObject that memoizes derived child object (or list of children):
+		@cached_child
+		def stats(self):
+			return self.child(UserStats, self._data['stats'])
+
+	Memoized values are dropped when object data is replaced (._data = ...)
+	or updated via ._update().
+	Changes that are made in-place in nested data are visible to children anyway,
+	as they share the same data.
+	"""
+	def __init__(self, func):
+		self.func = func
+		self.name = func.__name__
+		self.__doc__ = func.__doc__
+	def __get__(self, obj, owner=None):
+		if obj is None:
+			return self
+		try:
+			cache = obj._cached_children
+		except AttributeError:
+			cache = None
+		if cache is None or cache[0] is not obj._data:
+			cache = obj._cached_children = (obj._data, {})
+		values = cache[1]
+		try:
+			return values[self.name]
+		except KeyError:
+			value = values[self.name] = self.func(obj)
+			return value
 
 class Event:
 	pass
@@ -117,16 +360,36 @@ class NumericStatChange(Event):
 		return "{0}: {1}".format(self.name.title(), signed(self.current - self.previous))
 
 class EventHandler:
+	TRACKED_STATS = ('class', 'gp')
+
 	def __init__(self):
 		self.stats = {}
 	def track_stat(self, name, value): # pragma: no cover
 		if name in self.stats:
 			if value != self.stats[name]:
-				if isinstance(value, str):
-					self.add(TextStatChange(name, self.stats[name], value))
-				else:
-					self.add(NumericStatChange(name, self.stats[name], value))
+				self._stat_changed(name, self.stats[name], value)
 		self.stats[name] = value
+	def data_changed(self, obj, changes):
+		""" Called when data of API object is updated, with the list of changes (see diff_dict_deep()).
+		Reports changes of tracked stats (see TRACKED_STATS) of the current user
+		(i.e. fields 'stats.<name>' of object with TRACKS_STATS) as stat change events.
+		"""
+		if not obj.TRACKS_STATS:
+			return
+		for change in changes:
+			if len(change.path) != 2 or change.path[0] != 'stats':
+				continue
+			name = change.path[1]
+			if name not in self.TRACKED_STATS or change.new is MISSING:
+				continue
+			if change.old is not MISSING:
+				self._stat_changed(name, change.old, change.new)
+			self.stats[name] = change.new
+	def _stat_changed(self, name, previous, current):
+		if isinstance(current, str):
+			self.add(TextStatChange(name, previous, current))
+		else:
+			self.add(NumericStatChange(name, previous, current))
 	def add(self, event): # pragma: no cover
 		raise NotImplementedError
 
@@ -134,13 +397,34 @@ class Entity(ApiObject):
 	""" Base class for all API objects that have ID.
 	Supports property .id
 	Recognizes both data fields 'id' and '_id'.
+	Entities are equal (and have the same hash) if they have the same type and ID.
+	Entities without ID (e.g. new tasks that are not created on server yet)
+	are compared by identity.
+
+	Only canonical (top-level) entities are put into identity map (see ApiInterface.child()).
+	Records that are embedded into parent's data (e.g. task's group info)
+	are different for each parent even if they have the same ID, so they should not be canonical.
 	"""
+	__slots__ = ()
+	CANONICAL = False
 	@property
 	def id(self):
 		result = self._data.get('_id')
 		if result:
 			return result
 		return self._data.get('id', None)
+	def __eq__(self, other):
+		if not isinstance(other, Entity):
+			return NotImplemented
+		entity_id = self.id
+		if entity_id is None:
+			return self is other
+		return type(self) is type(other) and entity_id == other.id
+	def __hash__(self):
+		entity_id = self.id
+		if entity_id is None:
+			return object.__hash__(self)
+		return hash((type(self), entity_id))
 
 @functools.total_ordering
 class ValueBar:
@@ -276,6 +560,7 @@ class Marketable:
 
 	Supports method buy(<user>), which allows user object to .buy(item).
 	"""
+	__slots__ = ()
 	CURRENCY = NotImplemented
 	@property
 	def cost(self):
@@ -304,24 +589,25 @@ class Marketable:
 		"""
 		# TODO gold check?
 		response = self._buy(user)
-		import json
-		logger.debug('Bought {0}: {1}'.format(self, json.dumps(response, indent=2)))
 		if response:
-			update_dict_deep(user._data, response.data)
-			logger.debug('Updated user: {1}'.format(self, json.dumps(user._data, indent=2)))
+			changes = user._update(response.data)
+			logger.debug('Bought %s, user changes: %s', self, changes)
 	def _buy(self, user): # pragma: no cover
 		raise NotImplementedError
 
 class MarketableForGold(Marketable):
+	__slots__ = ()
 	CURRENCY = 'gold'
 
 class MarketableForGems(Marketable):
+	__slots__ = ()
 	CURRENCY = 'gems'
 
 class Sellable:
 	""" Mixin for objects that can be sold at market for gold (potions, eggs, food).
 	Supports method sell(user[, amount]) which allows user object to .buy(item[, amount])
 	"""
+	__slots__ = ()
 	def sell(self, user, amount=None):
 		""" Allows User object to sell items via user.sell(...)
 		May alter User's data upon selling.
@@ -332,6 +618,6 @@ class Sellable:
 		# TODO gold check?
 		response = self._sell(user, amount=amount)
 		if response:
-			update_dict_deep(user._data, response.data)
+			user._update(response.data)
 	def _sell(self, user, amount=None): # pragma: no cover
 		raise NotImplementedError
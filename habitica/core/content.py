@@ -22,9 +22,18 @@ class Content(base.ApiInterface):
 	# TODO bundles (purchaseable quests)
 	# TODO questsByLevel
 	# TODO appearances
-	def __init__(self, _api=None):
+	def __init__(self, _api=None, _mapped=False):
+		""" Content collections (gear, spells, quests etc) are loaded lazily
+		on the first access to each of them.
+		If _mapped is True, content is mapped into memory read-only
+		and is shared between all processes that use it (see api.MappedData).
+		"""
 		super().__init__(_api=_api, _content=self)
-		self._data = self.api.cached('content').get('content').data
+		cached = self.api.cached('content')
+		if _mapped:
+			self._data = cached.get_mapped('content')
+		else:
+			self._data = cached.get_sharded('content')
 	def _get_collection_entry(self, entry_type, collection_name, key=None):
 		""" Returns list of all entries from collection.
 		If key is specified, returns only that entry.
@@ -204,6 +213,7 @@ class Content(base.ApiInterface):
 @functools.total_ordering
 class ContentEntry(base.ApiObject):
 	""" Base class for all content entries. """
+	__slots__ = ()
 	def __repr__(self): # pragma: no cover
 		return '{0}({1})'.format(type(self).__name__, repr(self.key))
 	def __str__(self):
@@ -227,6 +237,7 @@ class ContentEntry(base.ApiObject):
 
 class BaseStats:
 	""" Base character stats. """
+	__slots__ = ()
 	@property
 	def int(self):
 		return self._data['int']
@@ -253,6 +264,7 @@ class BaseStats:
 		return self.con
 
 class Gems(base.ApiObject, MarketableForGold):
+	__slots__ = ()
 	@property
 	def quantity(self):
 		return self._data['quantity']
@@ -260,6 +272,7 @@ class Gems(base.ApiObject, MarketableForGold):
 		return self.api.post('user', 'purchase', 'gems', 'gem', _body={'quantity':self.quantity})
 
 class Armoire(ContentEntry, MarketableForGold):
+	__slots__ = ()
 	@property
 	def type(self):
 		return self._data['type']
@@ -268,6 +281,7 @@ class Armoire(ContentEntry, MarketableForGold):
 		return self.api.post('user', 'buy-armoire')
 
 class Egg(ContentEntry, MarketableForGems, base.Sellable):
+	__slots__ = ()
 	@property
 	def mountText(self):
 		return self._data['mountText']
@@ -282,6 +296,7 @@ class Egg(ContentEntry, MarketableForGems, base.Sellable):
 		return self.api.post('user', 'sell', 'eggs', self.key)
 
 class HatchingPotion(ContentEntry, MarketableForGems, base.Sellable):
+	__slots__ = ()
 	@property
 	def _addlNotes(self):
 		return self._data.get('_addlNotes', '')
@@ -307,10 +322,12 @@ class HatchingPotion(ContentEntry, MarketableForGems, base.Sellable):
 		return self.api.post('user', 'sell', 'hatchingPotions', self.key)
 
 class PremiumHatchingPotion(HatchingPotion):
+	__slots__ = ()
 	def _buy(self, user):
 		return self.api.post('user', 'purchase', 'premiumHatchingPotions', self.key)
 
 class Food(ContentEntry, MarketableForGems, base.Sellable):
+	__slots__ = ()
 	@property
 	def textThe(self):
 		return self._data['textThe']
@@ -331,6 +348,7 @@ class Food(ContentEntry, MarketableForGems, base.Sellable):
 		return self.api.post('user', 'sell', 'food', self.key)
 
 class Background(ContentEntry, MarketableForGems):
+	__slots__ = ()
 	@property
 	def set_name(self):
 		return self._data['set']
@@ -338,6 +356,7 @@ class Background(ContentEntry, MarketableForGems):
 		return self.api.post('user', 'unlock', path='background.{0}'.format(self.key))
 
 class BackgroundSet(ContentEntry, MarketableForGems):
+	__slots__ = ()
 	@property
 	def items(self):
 		return self._data['items']
@@ -354,6 +373,7 @@ class HealthOverflowError(Exception):
 
 class HealthPotion(ContentEntry, MarketableForGold):
 	""" Health potion (+15 hp). """
+	__slots__ = ('overflow_check',)
 	VALUE = 15.0
 	def __init__(self, overflow_check=True, **kwargs):
 		""" If overflow_check is True and there is less than 15 hp damage,
@@ -372,6 +392,7 @@ class HealthPotion(ContentEntry, MarketableForGold):
 
 class StableCreature(ContentEntry):
 	""" Base class for Pets and Mounts. """
+	__slots__ = ('_special',)
 	def __init__(self, _special=None, **kwargs):
 		super().__init__(**kwargs)
 		self._special = _special
@@ -392,6 +413,7 @@ class StableCreature(ContentEntry):
 		return self._special
 
 class Pet(StableCreature):
+	__slots__ = ()
 	# TODO POST /user/purchase-hourglass/pet/<key> - where is the value and currency in Pet?
 	def feed(self, food, amount=1):
 		""" Returns pet value after feeding. """
@@ -402,10 +424,12 @@ class Pet(StableCreature):
 		return self.api.post('user', 'feed', self.key, food.key, **params).data
 
 class Mount(StableCreature):
+	__slots__ = ()
 	# TODO POST /user/purchase-hourglass/mount/<key> - where is the value and currency in Mount?
 	pass
 
 class Castable:
+	__slots__ = ()
 	@property
 	def mana(self):
 		return self._data['mana']
@@ -416,6 +440,7 @@ class Castable:
 
 class SpecialItem(ContentEntry, MarketableForGold, Castable):
 	""" Cards, seeds, sparkles, debuff potions etc. """
+	__slots__ = ()
 	@property
 	def purchaseType(self):
 		return self._data.get('purchaseType')
@@ -444,6 +469,7 @@ class SpecialItem(ContentEntry, MarketableForGold, Castable):
 		return self.api.post('user', 'buy-special-spell', self.key)
 
 class Spell(ContentEntry, Castable):
+	__slots__ = ()
 	@property
 	@vintage.deprecated('Use spell.key instead')
 	def name(self): # pragma: no cover -- kept for backward compatibility.
@@ -457,6 +483,7 @@ class Spell(ContentEntry, Castable):
 		return self._data['lvl']
 
 class Gear(ContentEntry, BaseStats, MarketableForGold):
+	__slots__ = ()
 	@property
 	def klass(self):
 		return self._data['klass']
@@ -503,6 +530,7 @@ class Gear(ContentEntry, BaseStats, MarketableForGold):
 		return self.api.post('user', 'purchase', 'gear', self.key)
 
 class MysterySet(ContentEntry, Marketable): # TODO MarketableForHourglass?
+	__slots__ = ()
 	@property
 	def class_name(self):
 		return self._data['class']
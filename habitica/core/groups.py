@@ -4,23 +4,33 @@ from functools import lru_cache
 from collections import defaultdict
 from . import base, content, tasks, quests, user
 
-def iterate_pages(api_obj, class_type, *get_request_path, _limit=30, **query_params):
+def iterate_pages(api_obj, class_type, *get_request_path, _limit=30, _stream=False, **query_params):
 	""" Loads paged entities via GET request.
 	Yields produced objects of class_type.
 	Produced object should support field .id
 	Request should support optional 'lastId'
+	If _stream is True, page entries are decoded and produced one by one
+	as response arrives (for pages of huge entries, see API.get).
 	"""
-	batch = api_obj.children(class_type, api_obj.api.get(*get_request_path, **query_params).data)
-	lastId = batch[-1].id
-	while len(batch) >= _limit:
-		for entity in batch:
+	lastId = None
+	while True:
+		params = dict(query_params, lastId=lastId) if lastId else query_params
+		if _stream:
+			entries = api_obj.api.get(*get_request_path, _stream=True, **params)
+		else:
+			entries = api_obj.api.get(*get_request_path, **params).data
+		count = 0
+		for entry in entries:
+			entity = api_obj.child(class_type, entry)
+			lastId = entity.id
+			count += 1
 			yield entity
-		batch = api_obj.children(class_type, api_obj.api.get(*get_request_path, lastId=lastId, **query_params).data)
-		lastId = batch[-1].id
-	for entity in batch:
-		yield entity
+		if count < _limit:
+			break
 
 class Challenge(base.Entity):
+	__slots__ = ()
+	CANONICAL = True
 	# TODO get challenge by id: get:/challenges/:id
 	# TODO .categories
 	@property
@@ -68,7 +78,7 @@ class Challenge(base.Entity):
 		return self.child(user.Member, self.api.get('challenges', self.id, 'members', id).data)
 	def members(self, includeAllPublicFields=False, includeTasks=False):
 		""" Yields all current invites for the group. """
-		for member in iterate_pages(self, user.Member, 'challenges', self.id, 'members', includeAllPublicFields=includeAllPublicFields, includeTasks=includeTasks):
+		for member in iterate_pages(self, user.Member, 'challenges', self.id, 'members', includeAllPublicFields=includeAllPublicFields, includeTasks=includeTasks, _stream=includeTasks):
 			yield member
 	def group(self):
 		# FIXME get group by id.
@@ -100,6 +110,7 @@ class Challenge(base.Entity):
 		self.api.post('tasks', 'unlink-all', self.id, keep='keep-all' if keep else 'emove-all')
 
 class ChatMessage(base.Entity):
+	__slots__ = ()
 	@property
 	def group(self):
 		return self._parent
@@ -126,6 +137,7 @@ class ChatMessage(base.Entity):
 		self.api.post('groups', self.group.id, 'chat', self.id, 'clearflags')
 
 class Chat(base.ApiInterface):
+	__slots__ = ('_entries',)
 	def __init__(self, **kwargs):
 		super().__init__(**kwargs)
 		self._entries = None
@@ -156,6 +168,8 @@ class Chat(base.ApiInterface):
 
 class Group(base.Entity):
 	""" Habitica's user group: a guild, a party, the Tavern. """
+	__slots__ = ()
+	CANONICAL = True
 	PARTY = 'party'
 	GUILDS = 'guilds'
 	PRIVATE_GUILDS = 'privateGuilds'
@@ -291,13 +305,14 @@ class Group(base.Entity):
 				]
 	def members(self, includeAllPublicFields=False, includeTasks=False):
 		""" Yields all current invites for the group. """
-		for member in iterate_pages(self, user.Member, 'groups', self.id, 'members', includeAllPublicFields=includeAllPublicFields, includeTasks=includeTasks):
+		for member in iterate_pages(self, user.Member, 'groups', self.id, 'members', includeAllPublicFields=includeAllPublicFields, includeTasks=includeTasks, _stream=includeTasks):
 			yield member
 	def removeMember(self, member, message=''):
 		self.api.post('groups', self.id, 'removeMember', member.id, message=message)
 
 
 class Party(Group):
+	__slots__ = ()
 	@property
 	def quest(self):
 		if not self._data['quest'].get('key'):
@@ -7,6 +7,7 @@ from .content import ContentEntry, MarketableForGems, parse_habitica_event
 
 class Rage(base.ApiObject):
 	# TODO 'desperation' ('stressbeat' world quest)
+	__slots__ = ('_rage_progress',)
 	def __init__(self, *args, _rage_progress=None, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._rage_progress = _rage_progress
@@ -54,6 +55,7 @@ class Rage(base.ApiObject):
 		return self._data.get('mpDrain')
 
 class QuestBoss(base.ApiObject):
+	__slots__ = ('_rage_progress', '_hp_progress')
 	def __init__(self, *args, _rage_progress=None, _hp_progress=None, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._rage_progress = _rage_progress
@@ -73,7 +75,7 @@ class QuestBoss(base.ApiObject):
 				self._hp_progress if self._hp_progress is not None else self._data['hp'],
 				self._data['hp'],
 				)
-	@property
+	@base.cached_child
 	def rage(self):
 		data = self._data.get('rage')
 		return self.child(Rage, data, _rage_progress=self._rage_progress) if data else None
@@ -81,6 +83,7 @@ class QuestBoss(base.ApiObject):
 QuestCollectItem = namedtuple('QuestCollectItem', 'key text')
 
 class QuestCollect(base.ApiObject):
+	__slots__ = ('_collect_progress',)
 	def __init__(self, *args, _collect_progress=None, **kwargs):
 		super().__init__(*args, **kwargs)
 		self._collect_progress = _collect_progress
@@ -119,6 +122,7 @@ class QuestCollect(base.ApiObject):
 		return sum(_['count'] for _ in self._data.values())
 
 class QuestDropItem(base.ApiObject):
+	__slots__ = ()
 	def get_content_entry(self):
 		return getattr(self.content, self._data['type'])(key=self._data['key'])
 	@property
@@ -135,6 +139,7 @@ class QuestDropItem(base.ApiObject):
 		return self._data.get('onlyOwner', False)
 
 class QuestDrop(base.ApiObject):
+	__slots__ = ()
 	@property
 	def unlock(self):
 		return self._data.get('unlock', '')
@@ -144,11 +149,12 @@ class QuestDrop(base.ApiObject):
 	@property
 	def gold(self):
 		return base.Price(self._data['gp'], 'gold')
-	@property
+	@base.cached_child
 	def items(self):
 		return self.children(QuestDropItem, self._data.get('items', []))
 
 class QuestUnlockCondition(base.ApiObject):
+	__slots__ = ()
 	@property
 	def text(self):
 		return self._data['text']
@@ -179,6 +185,7 @@ class LazyQuestData:
 		return self._data.get(key, default)
 
 class Quest(ContentEntry, MarketableForGems):
+	__slots__ = ('_group_progress', '_user_progress')
 	def __init__(self, *args, _content=None, _data=None, _group_progress=None, _user_progress=None, **kwargs):
 		if _data is None:
 			assert _group_progress or _user_progress
@@ -204,7 +211,7 @@ class Quest(ContentEntry, MarketableForGems):
 	@property
 	def level(self):
 		return self._data.get('lvl')
-	@property
+	@base.cached_child
 	def unlockCondition(self):
 		data = self._data.get('unlockCondition')
 		return self.child(QuestUnlockCondition, data) if data else None
@@ -235,7 +242,7 @@ class Quest(ContentEntry, MarketableForGems):
 		result = self._data.get('collect')
 		collect_progress = self._group_progress['progress']['collect'] if self._group_progress else None
 		return self.child(QuestCollect, result, _collect_progress=collect_progress) if result else None
-	@property
+	@base.cached_child
 	def drop(self):
 		return self.child(QuestDrop, self._data['drop'])
 	@property
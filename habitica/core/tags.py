@@ -1,6 +1,8 @@
 from . import base
 
 class Tag(base.Entity):
+	__slots__ = ()
+	CANONICAL = True
 	@property
 	def name(self):
 		return self._data['name']
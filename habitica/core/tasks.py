@@ -19,6 +19,7 @@ class QuestProgressEvent(base.Event):
 		return 'Quest progress: {0}'.format(base.signed(self.questProgress))
 
 class Approval(base.ApiObject):
+	__slots__ = ()
 	@property
 	def required(self):
 		return self._data['required']
@@ -36,6 +37,7 @@ class Approval(base.ApiObject):
 		return self._data['requestedDate']
 
 class GroupInfo(base.Entity):
+	__slots__ = ()
 	def __call__(self):
 		from . import groups
 		return self.child(groups.Group, self.api.get('groups', self.id).data)
@@ -60,11 +62,12 @@ class GroupInfo(base.Entity):
 	@property
 	def managerNotes(self):
 		return self._data['managerNotes']
-	@property
+	@base.cached_child
 	def approval(self):
 		return self.child(Approval, self._data['approval'])
 
 class ChallengeInfo(base.Entity):
+	__slots__ = ()
 	def __call__(self):
 		from . import groups
 		return self.child(groups.Challenge, self.api.get('challenges', self.id).data)
@@ -82,6 +85,7 @@ class ChallengeInfo(base.Entity):
 		return self._data['winner']
 
 class Reminder(base.Entity): # pragma: no cover -- TODO no way to create yet.
+	__slots__ = ()
 	@property
 	def startDate(self):
 		return self._data['startDate']
@@ -91,6 +95,8 @@ class Reminder(base.Entity): # pragma: no cover -- TODO no way to create yet.
 
 class Task(base.Entity):
 	""" Parent class for any task (habit, daily, todo, reward). """
+	__slots__ = ()
+	CANONICAL = True
 	DARK_RED, RED, ORANGE = -20, -10, -1
 	YELLOW = 0
 	GREEN, LIGHT_BLUE, BRIGHT_BLUE = 1, 5, 10
@@ -113,8 +119,8 @@ class Task(base.Entity):
 			# API args:
 			**kwargs
 			):
+		super().__init__(**kwargs)
 		if text is None:
-			super().__init__(**kwargs)
 			return
 		self._data = {
 				'text' : text,
@@ -158,11 +164,23 @@ class Task(base.Entity):
 			_body['reminders'] = reminders
 		if tags is not None:
 			_body['tags'] = tags
-		self._data = self.api.put('tasks', self.id, _body=_body).data
+		def optimistic():
+			self._update(_body)
+			return self._data
+		self._data = self._written(self.api.put('tasks', self.id, _body=_body), optimistic)
 
 	def _handle_events(self, data):
+		""" Score response contains new user stats.
+		If task belongs to loaded user object, stats are applied to it
+		and changes are reported (see base.ApiObject._update()),
+		otherwise only tracked stats are compared with previously seen values.
+		"""
 		self._add_event(DropEvent, '_tmp', 'drop', 'dialog', data=data)
 		self._add_event(QuestProgressEvent, '_tmp', 'quest', 'progressDelta', data=data)
+		from .user import User
+		if isinstance(self._parent, User):
+			self._parent._update({'stats':{key:value for key, value in data.items() if key not in ('delta', '_tmp')}})
+			return
 		self._track_stat('class', data=data)
 		self._track_stat('gp', data=data)
 
@@ -222,16 +240,20 @@ class Task(base.Entity):
 	@property
 	def reminders(self):
 		return self._data['reminders'] # TODO
-	@property
+	@base.cached_child
 	def group(self):
 		return self.child(GroupInfo, self._data['group'])
-	@property
+	@base.cached_child
 	def challenge(self):
 		return self.child(ChallengeInfo, self._data['challenge'])
 	def add_tag(self, tag):
-		self._data = self.api.post('tasks', self.id, 'tags', tag.id).data
+		self._data = self._written(self.api.post('tasks', self.id, 'tags', tag.id),
+				lambda: dict(self._data, tags=[_ for _ in self._data.get('tags', []) if _ != tag.id] + [tag.id]),
+				)
 	def delete_tag(self, tag):
-		self._data = self.api.delete('tasks', self.id, 'tags', tag.id).data
+		self._data = self._written(self.api.delete('tasks', self.id, 'tags', tag.id),
+				lambda: dict(self._data, tags=[_ for _ in self._data.get('tags', []) if _ != tag.id]),
+				)
 	def approve_for(self, member):
 		self._data = self.api.post('tasks', self.id, 'approve', member.id).data
 	def assign_to(self, member):
@@ -248,11 +270,12 @@ class Task(base.Entity):
 		"""
 		return self.api.post('tasks', self.id, 'move', 'to', str(new_pos)).data
 	def needs_work(self, assigned_user):
-		self.data = self.api.post('tasks', self.id, 'needs-work', assigned_user.id).data
+		self._data = self.api.post('tasks', self.id, 'needs-work', assigned_user.id).data
 	def unlink_from_challenge(self, keep=False):
 		self.api.post('tasks', 'unlink-one', self.id, keep='keep' if keep else 'remove')
 
 class Reward(Task, base.MarketableForGold):
+	__slots__ = ()
 	def __init__(self, text=None, alias=None, attribute=None, collapseChecklist=None,
 			notes=None, priority=None, reminders=None, tags=None,
 			# Reward-only fields:
@@ -300,6 +323,7 @@ class TaskValue:
 	""" Base trait for tasks that have value and colors (habit, daily, todo).
 	Expects property .value
 	"""
+	__slots__ = ()
 	@property
 	def value(self):
 		return self._data['value']
@@ -323,6 +347,7 @@ class CannotScoreDown(Exception):
 		return "Habit '{0}' cannot be decremented".format(self.habit.text)
 
 class Habit(Task, TaskValue):
+	__slots__ = ()
 	# TODO history
 	def __init__(self, text=None, alias=None, attribute=None, collapseChecklist=None,
 			notes=None, priority=None, reminders=None, tags=None,
@@ -400,7 +425,7 @@ class Habit(Task, TaskValue):
 			raise CannotScoreUp(self)
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'up').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'up'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 	def down(self):
@@ -408,13 +433,14 @@ class Habit(Task, TaskValue):
 			raise CannotScoreDown(self)
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'down').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'down'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 
 class Checkable:
 	""" Base class for task or sub-item that can be checked (completed) or unchecked.
 	"""
+	__slots__ = ()
 	@property
 	def is_completed(self):
 		return self._data['completed']
@@ -426,6 +452,8 @@ class Checkable:
 		self._data['completed'] = False
 
 class SubItem(Task, Checkable):
+	__slots__ = ()
+	CANONICAL = False # Part of parent task's checklist.
 	@property
 	def parent(self):
 		return self._parent
@@ -446,10 +474,14 @@ class SubItem(Task, Checkable):
 		self.api.post('tasks', self._parent.id, 'checklist', self.id, 'score')
 		super().undo()
 	def update(self, text):
-		self._parent._data = self.api.put('tasks', self._parent.id, 'checklist', self.id, _body={'text':text}).data
+		def optimistic():
+			self._data['text'] = text
+			return self._parent._data
+		self._parent._data = self._written(self.api.put('tasks', self._parent.id, 'checklist', self.id, _body={'text':text}), optimistic)
 
 class Checklist:
 	""" Base class for task that provides list of checkable sub-items. """
+	__slots__ = ()
 	@property
 	def collapseChecklist(self):
 		return self._data['collapseChecklist']
@@ -477,6 +509,7 @@ class Checklist:
 		self._data = self.api.delete('tasks', self.id, 'checklist', item.id).data
 
 class DailyFrequency(base.ApiObject):
+	__slots__ = ()
 	def __init__(self,
 			startDate=None,
 			everyX=None,
@@ -505,6 +538,7 @@ class DailyFrequency(base.ApiObject):
 		return self._data['weeksOfMonth']
 
 class WeeklyFrequency(base.ApiObject):
+	__slots__ = ()
 	# Weekday abbreviations used in task frequencies.
 	ABBR = ["m", "t", "w", "th", "f", "s", "su"]
 
@@ -557,6 +591,7 @@ class WeeklyFrequency(base.ApiObject):
 		return self._data['repeat'][self.ABBR[6]]
 
 class Daily(Task, TaskValue, Checkable, Checklist):
+	__slots__ = ()
 	class Frequency:
 		DAILY = 'daily'
 		WEEKLY = 'weekly'
@@ -657,7 +692,7 @@ class Daily(Task, TaskValue, Checkable, Checklist):
 	@property
 	def frequency(self):
 		return self._data['frequency']
-	@property
+	@base.cached_child
 	def trigger(self):
 		if self.frequency == Daily.Frequency.DAILY:
 			return self.child(DailyFrequency, self._data)
@@ -689,7 +724,7 @@ class Daily(Task, TaskValue, Checkable, Checklist):
 		""" Marks daily as completed. """
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'up').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'up'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 		super().complete()
@@ -697,12 +732,13 @@ class Daily(Task, TaskValue, Checkable, Checklist):
 		""" Marks daily as not completed. """
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'down').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'down'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 		super().undo()
 
 class Todo(Task, TaskValue, Checkable, Checklist):
+	__slots__ = ()
 	def __init__(self, text=None, alias=None, attribute=None, collapseChecklist=None,
 			notes=None, priority=None, reminders=None, tags=None,
 			# Todo-only fields:
@@ -761,7 +797,7 @@ class Todo(Task, TaskValue, Checkable, Checklist):
 		""" Marks todo as completed. """
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'up').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'up'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 		super().complete()
@@ -769,7 +805,7 @@ class Todo(Task, TaskValue, Checkable, Checklist):
 		""" Marks todo as not completed. """
 		# TODO data also stores updated user stats, needs to calculate diff and notify.
 		# TODO also data._tmp is a Drop, need to display notification.
-		result = self.api.post('tasks', self.id, 'score', 'down').data
+		result = self._written(self.api.post('tasks', self.id, 'score', 'down'), lambda: {'delta':0})
 		self._handle_events(result)
 		self._data['value'] += result['delta']
 		super().undo()
@@ -1,9 +1,11 @@
 """ User and user-related functionality: inventory, spells etc.
 """
+import threading
 from . import base, content, tasks, groups, tags
-from ..api import dotdict
+from ..api import dataview
 
 class UserAppearance(base.ApiObject):
+	__slots__ = ()
 	# TODO unlock hair.color.* etc
 	@property
 	def size(self):
@@ -40,12 +42,13 @@ class UserAppearance(base.ApiObject):
 		return self._data['chair']
 
 class UserPreferences(base.ApiObject):
+	__slots__ = ()
 	# TODO .webhooks
 	# TODO .emailNotifications
 	# TODO .pushNotifications
 	# TODO .suppressModals
 	# TODO .tasks - ??
-	@property
+	@base.cached_child
 	def appearance(self):
 		return self.child(UserAppearance, self._data)
 	@property
@@ -116,6 +119,7 @@ class UserPreferences(base.ApiObject):
 		self._data['dayStart'] = dayStart
 
 class Buffs(base.ApiObject, content.BaseStats):
+	__slots__ = ()
 	@property
 	def stealth(self):
 		return self._data['stealth']
@@ -136,12 +140,11 @@ class Buffs(base.ApiObject, content.BaseStats):
 		return self._data['seafoam']
 
 class Training(base.ApiObject, content.BaseStats):
+	__slots__ = ()
 	pass
 
 class UserStats(base.ApiObject, content.BaseStats):
-	def _handle_events(self):
-		self._track_stat('class')
-		self._track_stat('gp')
+	__slots__ = ()
 	@property
 	def unallocated_points(self):
 		return self._data['points']
@@ -174,10 +177,10 @@ class UserStats(base.ApiObject, content.BaseStats):
 	@property
 	def gold(self):
 		return self._data['gp']
-	@property
+	@base.cached_child
 	def buffs(self):
 		return self.child(Buffs, self._data['buffs'])
-	@property
+	@base.cached_child
 	def training(self):
 		return self.child(Training, self._data['training'])
 	def allocate(self, strength=None, intelligence=None, perception=None, constitution=None):
@@ -195,14 +198,13 @@ class UserStats(base.ApiObject, content.BaseStats):
 			data = self.api.post('user', 'allocate', stat=next(iter(stats.keys()))).data
 		else:
 			data = self.api.post('user', 'allocate-bulk', _body={'stats':stats}).data
-		self._handle_events()
 		self._update(data)
 	def autoallocate_all(self):
 		data = self.api.post('user', 'allocate-now').data
-		self._handle_events()
 		self._update(data)
 
 class Gear(base.ApiObject):
+	__slots__ = ()
 	@property
 	def weapon(self):
 		return self.content.gear(self._data['weapon'])
@@ -229,11 +231,12 @@ class Gear(base.ApiObject):
 		return self.content.gear(self._data['body'])
 
 class Inventory(base.ApiObject):
+	__slots__ = ()
 	# TOOD items.special -- see User model.
 	@property
 	def lastDrop(self):
 		""" {.date, .count} """
-		return dotdict(self._data['lastDrop'])
+		return dataview.item(self._data, 'lastDrop')
 	@property
 	def food(self):
 		return [
@@ -265,10 +268,10 @@ class Inventory(base.ApiObject):
 	@property
 	def gear(self):
 		return self._data['gear']['owned'] # FIXME is it a dict of IDs?
-	@property
+	@base.cached_child
 	def costume(self):
 		return self.child(Gear, self._data['gear']['costume'])
-	@property
+	@base.cached_child
 	def equipped(self):
 		return self.child(Gear, self._data['gear']['equipped'])
 
@@ -276,6 +279,7 @@ class _UserMethods:
 	""" Trait to be used by ApiObject or ApiInterface
 	to access user methods that do not require user data.
 	"""
+	__slots__ = ()
 	def party(self):
 		""" Returns user's party. """
 		return self.child(groups.Party, self.api.get('groups', 'party').data)
@@ -325,6 +329,7 @@ class UserProxy(base.ApiInterface, _UserMethods):
 	   real_user.party()
 	   ...
 	"""
+	__slots__ = ()
 	def __call__(self):
 		# TODO supports query userFields=...,...
 		return self.child(User, self.api.get('user').data, _parent=self._parent)
@@ -338,6 +343,7 @@ class Email:
 		self.name = name
 
 class Achievement(base.ApiObject):
+	__slots__ = ()
 	@property
 	def label(self):
 		return self._parent._data['label']
@@ -365,10 +371,11 @@ class Achievement(base.ApiObject):
 		return self._data['optionalCount']
 
 class Achievements(base.ApiObject):
+	__slots__ = ()
 	@property
 	def label(self):
 		return self._data['label']
-	@property
+	@base.cached_child
 	def achievements(self):
 		return self.children(Achievement, self._data['achievements'].values())
 	def __len__(self):
@@ -378,6 +385,8 @@ class Achievements(base.ApiObject):
 
 class Member(base.Entity):
 	""" All other Habitica users beside you. """
+	__slots__ = ()
+	CANONICAL = True
 	@property
 	def name(self):
 		return self._data.get('profile', {}).get('name')
@@ -399,7 +408,7 @@ class Member(base.Entity):
 		if not achievements:
 			achievements = self.api.get('members', self.id, 'achievements').data
 			self._data['achievements'] = achievements
-		return dotdict({label:self.child(Achievements, entries) for label, entries in achievements.items()})
+		return dataview({label:self.child(Achievements, entries) for label, entries in achievements.items()})
 	@property
 	def auth(self):
 		return self._data.get('auth', {})
@@ -409,9 +418,15 @@ class Member(base.Entity):
 		return self.children(tasks.Task, self._data.get('tasks', []))
 
 class User(base.Entity, _UserMethods):
-	def __init__(self, *args, **kwargs):
-		super().__init__(*args, **kwargs)
-		self.stats._handle_events()
+	__slots__ = ()
+	CANONICAL = True
+	TRACKS_STATS = True
+	# Scoring tasks or casting spells from worker threads (e.g. cli.BulkExecutor)
+	# updates the same user data, so updates are serialized.
+	_update_lock = threading.RLock()
+	def _update(self, new_values):
+		with self._update_lock:
+			return super()._update(new_values)
 	# TODO auth -- see model
 	# TODO achievements -- see model
 	# TODO backer -- see model
@@ -442,11 +457,11 @@ class User(base.Entity, _UserMethods):
 	@property
 	def blurb(self):
 		return self._data['profile']['blurb']
-	@property
+	@base.cached_child
 	def quest(self):
 		from . import quests
 		return self.child(quests.Quest, None, _user_progress=self._data['party']['quest'])
-	@property
+	@base.cached_child
 	def stats(self):
 		return self.child(UserStats, self._data['stats'])
 	@property
@@ -473,11 +488,11 @@ class User(base.Entity, _UserMethods):
         # "flags.armoireEmpty": "Boolean",
         # "flags.cardReceived": "Boolean",
         # "flags.warnedLowHealth": "Boolean",
-		return dotdict(self._data['flags'])
-	@property
+		return dataview.item(self._data, 'flags')
+	@base.cached_child
 	def preferences(self):
 		return self.child(UserPreferences, self._data['preferences'])
-	@property
+	@base.cached_child
 	def inventory(self):
 		return self.child(Inventory, self._data['items'])
 	@property
@@ -497,7 +512,7 @@ class User(base.Entity, _UserMethods):
 		return self._data['lastCron'] # FIXME parse date
 	@property
 	def gemsLeft(self):
-		plan = self._data.purchased.get('plan')
+		plan = self._data['purchased'].get('plan')
 		if not plan:
 			return 0
 		planGemLimits_convCap = 25 # TODO hardcoded in Habitica itself.
@@ -569,11 +584,11 @@ class User(base.Entity, _UserMethods):
 	def sleep(self):
 		if self.preferences.sleep:
 			return
-		self._data['preferences']['sleep'] = self.api.post('user', 'sleep').data
+		self._data['preferences']['sleep'] = self._written(self.api.post('user', 'sleep'), lambda: True)
 	def wake_up(self):
 		if not self.preferences.sleep:
 			return
-		self._data['preferences']['sleep'] = self.api.post('user', 'sleep').data
+		self._data['preferences']['sleep'] = self._written(self.api.post('user', 'sleep'), lambda: False)
 	def read_card(self, card):
 		self._update(self.api.post('user', 'read-card', card.key).data)
 	def revive(self):
@@ -0,0 +1,210 @@
+""" Unit of work for write requests.
+
+Every write request costs a call to the server (and in batch mode a share of
+rate limit budget), while several mutations in a row are often redundant:
+task updated twice, checklist item checked and unchecked, tag added and removed.
+WriteQueue records such mutations instead of sending them,
+folds redundant and cancelling ones per entity and sends
+the minimal set on commit:
+	with habitica.write_queue() as queue:
+		task.update(text='New text')
+		task.update(notes='New notes') # Merged into a single PUT.
+		item.complete()
+		item.undo() # Cancels completion, nothing is sent at all.
+	print(queue.stats()['saved'])
+
+Postponed writes return Queued marker instead of server response,
+so objects apply changes locally (optimistically), see ApiObject._written().
+Only requests that have folding rule are postponed, any other request
+(including reads) flushes pending writes first, so it always observes them.
+
+If offline journal is specified (see habitica.journal), scoring requests
+that fail because server is unavailable are saved to journal to be replayed later
+and also return Queued marker.
+"""
+import threading
+import logging
+logger = logging.getLogger('habitica')
+from .. import journal as offline
+
+class Queued:
+	""" Marker response for write request that was postponed by WriteQueue. """
+	def __init__(self, method, path):
+		self.method = method
+		self.path = path
+	def __repr__(self):
+		return 'Queued({0} {1})'.format(self.method, '/'.join(self.path))
+
+class PendingWrite:
+	def __init__(self, method, path, body, query):
+		self.method = method
+		self.path = path
+		self.body = body
+		self.query = query
+	@property
+	def entity(self):
+		""" Writes are folded only within the same entity (task, user etc). """
+		return self.path[:2]
+
+ANY = object()
+
+def _matches(pattern, path):
+	return len(pattern) == len(path) and all(part is ANY or part == actual for part, actual in zip(pattern, path))
+
+class WriteQueue:
+	""" Proxy for API (see module docstring).
+	Passes all requests through unless queue is active.
+	"""
+	MERGE, TOGGLE, IDEMPOTENT = 'merge', 'toggle', 'idempotent'
+	RULES = [
+			# Later fields of the same update override earlier ones.
+			('PUT', ('tasks', ANY), MERGE),
+			('PUT', ('tasks', ANY, 'checklist', ANY), MERGE),
+			# Repeated request reverts previous one.
+			('POST', ('tasks', ANY, 'checklist', ANY, 'score'), TOGGLE),
+			('POST', ('user', 'sleep'), TOGGLE),
+			# Repeated request does nothing, opposite request reverts previous one.
+			('POST', ('tasks', ANY, 'tags', ANY), IDEMPOTENT),
+			('DELETE', ('tasks', ANY, 'tags', ANY), IDEMPOTENT),
+			]
+	OPPOSITE = {'POST':'DELETE', 'DELETE':'POST'}
+	JOURNALED = [
+			('POST', ('tasks', ANY, 'score', ANY)),
+			('POST', ('tasks', ANY, 'checklist', ANY, 'score')),
+			]
+	def __init__(self, api_obj, journal=None):
+		""" Journal is habitica.journal.Journal for offline writes, by default is disabled. """
+		self._api = api_obj
+		self.journal = journal
+		self._lock = threading.RLock()
+		self._active = 0
+		self._pending = []
+		self.recorded = 0
+		self.sent = 0
+	def __enter__(self):
+		with self._lock:
+			self._active += 1
+		return self
+	def __exit__(self, exc_type, exc_value, traceback):
+		with self._lock:
+			self._active -= 1
+			if self._active:
+				return
+			if exc_type is None:
+				self.flush()
+			else:
+				self.discard()
+	@property
+	def active(self):
+		return self._active > 0
+	@property
+	def saved(self):
+		""" Number of requests that were not sent thanks to folding. """
+		return self.recorded - self.sent - len(self._pending)
+	def stats(self):
+		return {
+				'recorded' : self.recorded,
+				'sent' : self.sent,
+				'pending' : len(self._pending),
+				'saved' : self.saved,
+				}
+	def _rule(self, method, path):
+		for rule_method, pattern, kind in self.RULES:
+			if rule_method == method and _matches(pattern, path):
+				return kind
+		return None
+	def _record(self, method, path, body, query):
+		""" Records postponable write and folds it with pending ones.
+		Returns Queued marker or None if write should be sent immediately.
+		"""
+		if not self._active:
+			return None
+		kind = self._rule(method, path)
+		if kind is None:
+			return None
+		write = PendingWrite(method, path, body, query)
+		self.recorded += 1
+		last = next((pending for pending in reversed(self._pending) if pending.entity == write.entity), None)
+		if last is None or last.path != path or last.query != query:
+			self._pending.append(write)
+		elif kind == self.MERGE and last.method == method:
+			last.body = dict(last.body or {}, **(body or {}))
+		elif kind == self.TOGGLE and last.method == method:
+			self._pending.remove(last)
+		elif kind == self.IDEMPOTENT and last.method == method:
+			pass
+		elif kind == self.IDEMPOTENT and last.method == self.OPPOSITE.get(method):
+			self._pending.remove(last)
+		else: # pragma: no cover -- rules for the same path have the same kind.
+			self._pending.append(write)
+		return Queued(method, path)
+	def flush(self):
+		""" Sends all pending writes in order of recording.
+		Stops at the first failed request: it and the rest of writes stay pending,
+		so they can be sent again by the next flush() or dropped by discard().
+		"""
+		with self._lock:
+			while self._pending:
+				write = self._pending[0]
+				self._send(write.method, write.path, write.body, write.query)
+				self._pending.pop(0)
+				self.sent += 1
+	def discard(self):
+		""" Drops all pending writes without sending them. """
+		with self._lock:
+			self.recorded -= len(self._pending)
+			self._pending = []
+	def _send(self, method, path, body, query):
+		if method == 'POST':
+			return self._api.post(*path, _body=body, **query)
+		if method == 'PUT':
+			return self._api.put(*path, _body=body, **query)
+		return self._api.delete(*path, **query)
+	def _write(self, method, path, body, query):
+		with self._lock:
+			queued = self._record(method, path, body, query)
+			if queued is not None:
+				return queued
+			if self._pending:
+				self.flush()
+		try:
+			return self._send(method, path, body, query)
+		except Exception as e:
+			if not self._journaled(method, path) or not offline.is_offline(e):
+				raise
+			if offline.was_not_sent(e):
+				self.journal.record(method, path, body, query)
+				logger.warning('Server is unavailable ({0}), request is saved to offline journal: {1} {2}'.format(e, method, '/'.join(path)))
+			else:
+				self.journal.record(method, path, body, query, uncertain=True)
+				logger.warning('Server is unavailable ({0}), request may have been processed and is saved to offline journal as uncertain (needs explicit retry): {1} {2}'.format(e, method, '/'.join(path)))
+			return Queued(method, path)
+	def _journaled(self, method, path):
+		if self.journal is None:
+			return False
+		return any(rule_method == method and _matches(pattern, path) for rule_method, pattern in self.JOURNALED)
+	def replay_journal(self, retry_uncertain=False):
+		""" Sends writes that were saved to offline journal.
+		See habitica.journal.Journal.replay() for details.
+		"""
+		if self._pending:
+			self.flush()
+		return self.journal.replay(self._api, retry_uncertain=retry_uncertain)
+
+	def post(self, *path, _body=None, **query):
+		return self._write('POST', path, _body, query)
+	def put(self, *path, _body=None, **query):
+		return self._write('PUT', path, _body, query)
+	def delete(self, *path, **query):
+		return self._write('DELETE', path, None, query)
+	def get(self, *path, **query):
+		if self._pending:
+			self.flush()
+		return self._api.get(*path, **query)
+	@property
+	def v4(self):
+		if self._pending:
+			self.flush()
+		return self._api.v4
+	def __getattr__(self, attr):
+		return getattr(self._api, attr)
@@ -0,0 +1,190 @@
+""" Durable offline journal for write requests.
+
+When server is unreachable (or rate limit is exhausted even after retries),
+write requests like task scoring are appended to journal file instead of being lost
+and are sent later in the same order:
+	journal = Journal(Path(config.get_data_dir())/'journal.jsonl')
+	habitica = Habitica(auth, journal=journal)
+	...
+	journal.replay(api)
+
+Journal is an append-only JSON Lines file (one record per line),
+so it survives crashes and is safe to share between processes (guarded by file lock).
+Every write gets unique idempotency key. Before sending a write replay appends
+'attempt' record and after success 'ack' record, so write that was attempted
+but not acknowledged (process was killed in between or connection was lost
+after request was sent) is not resent automatically: it is reported as uncertain
+and resent only on explicit demand, so scoring is never doubled silently.
+"""
+import os
+import json
+import time
+import uuid
+from pathlib import Path
+import requests
+import logging
+logger = logging.getLogger('habitica')
+from . import config
+from .api import CircuitOpenError, connection_not_established
+
+def is_offline(error):
+	""" Returns True if request failed because server is not available at the moment
+	(connection errors, timeouts, rate limit or server errors),
+	i.e. request could succeed later.
+	"""
+	if isinstance(error, requests.exceptions.HTTPError):
+		status = getattr(error.response, 'status_code', None) or 0
+		return status == 429 or status >= 500
+	return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+NOT_PROCESSED_STATUSES = (429, 503)
+
+def was_not_sent(error):
+	""" Returns True if it is known for sure that failed request was not processed by server:
+	it was rejected before processing (rate limit, service unavailable)
+	or was not sent at all (connection could not be established, circuit breaker is open).
+	Otherwise (e.g. other server errors or connection was lost while waiting for response)
+	request may have been already applied, so result is unknown.
+	"""
+	if isinstance(error, requests.exceptions.HTTPError):
+		status = getattr(error.response, 'status_code', None) or 0
+		return status in NOT_PROCESSED_STATUSES
+	return isinstance(error, CircuitOpenError) or connection_not_established(error)
+
+class Entry:
+	""" Journaled write request. """
+	PENDING, UNCERTAIN, DONE, FAILED, DROPPED = 'pending', 'uncertain', 'done', 'failed', 'dropped'
+	def __init__(self, key, method, path, body=None, query=None, time=None):
+		self.key = key
+		self.method = method
+		self.path = path
+		self.body = body
+		self.query = query or {}
+		self.time = time
+		self.state = self.PENDING
+		self.error = None
+	def __str__(self):
+		return '{0} {1}'.format(self.method, '/'.join(self.path))
+	def send(self, api_obj):
+		if self.method == 'POST':
+			return api_obj.post(*self.path, _body=self.body, **self.query)
+		if self.method == 'PUT':
+			return api_obj.put(*self.path, _body=self.body, **self.query)
+		return api_obj.delete(*self.path, **self.query)
+
+class Journal:
+	""" Append-only journal of write requests (see module docstring). """
+	def __init__(self, filename=None):
+		""" Default location is <data dir>/journal.jsonl """
+		self.filename = Path(filename or Path(config.get_data_dir())/'journal.jsonl')
+	def _append(self, *records):
+		with open(str(self.filename), 'a') as f:
+			for record in records:
+				f.write(json.dumps(record, sort_keys=True) + '\n')
+			f.flush()
+			os.fsync(f.fileno())
+	def _read(self):
+		if not self.filename.exists():
+			return []
+		records = []
+		with open(str(self.filename)) as f:
+			for line in f:
+				try:
+					records.append(json.loads(line))
+				except ValueError:
+					logger.warning('Skipping broken journal record: {0}'.format(repr(line)))
+		return records
+	def entries(self):
+		""" Returns all entries in order of recording with their current states. """
+		entries = {}
+		for record in self._read():
+			op, key = record.get('op'), record.get('key')
+			if op == 'write':
+				entries.setdefault(key, Entry(key, record['method'], record['path'],
+					body=record.get('body'), query=record.get('query'), time=record.get('time'),
+					))
+			elif key not in entries:
+				continue
+			elif op == 'attempt':
+				entries[key].state = Entry.UNCERTAIN
+			elif op == 'release':
+				entries[key].state = Entry.PENDING
+			elif op == 'ack':
+				entries[key].state = Entry.DONE
+			elif op == 'fail':
+				entries[key].state = Entry.FAILED
+				entries[key].error = record.get('error')
+			elif op == 'drop':
+				entries[key].state = Entry.DROPPED
+		return list(entries.values())
+	def pending(self):
+		""" Returns entries that were not sent yet (including uncertain ones). """
+		return [entry for entry in self.entries() if entry.state in (Entry.PENDING, Entry.UNCERTAIN)]
+	def record(self, method, path, body=None, query=None, key=None, uncertain=False):
+		""" Appends write request to journal. Returns its idempotency key.
+		If entry with the same key is already journaled, nothing is recorded again.
+		If uncertain is True, request is recorded as already attempted
+		(it may have reached server), so it will be replayed only on explicit retry.
+		"""
+		key = key or uuid.uuid4().hex
+		with config.file_lock(self.filename):
+			if any(entry.key == key for entry in self.entries()):
+				return key
+			self._append({
+				'op' : 'write',
+				'key' : key,
+				'time' : time.time(),
+				'method' : method.upper(),
+				'path' : list(path),
+				'body' : body,
+				'query' : query or {},
+				})
+			if uncertain:
+				self._append({'op':'attempt', 'key':key, 'time':time.time()})
+		return key
+	def drop(self, *keys):
+		""" Marks entries as dropped, so they will never be sent. """
+		with config.file_lock(self.filename):
+			self._append(*({'op':'drop', 'key':key, 'time':time.time()} for key in keys))
+	def replay(self, api_obj, retry_uncertain=False):
+		""" Sends pending writes in order of recording via given API
+		(so rate limits and retry policy of API apply).
+		Uncertain entries are skipped unless retry_uncertain is True.
+		Requests that were rejected by server (4xx) are marked as failed and are not retried.
+		Stops at the first request that fails because server is still unavailable
+		(that request stays pending if it was not sent, otherwise it becomes uncertain).
+		Returns stats: {'sent', 'failed', 'skipped', 'pending'}
+		"""
+		stats = {'sent':0, 'failed':0, 'skipped':0}
+		with config.file_lock(self.filename):
+			for entry in self.pending():
+				if entry.state == Entry.UNCERTAIN and not retry_uncertain:
+					stats['skipped'] += 1
+					continue
+				self._append({'op':'attempt', 'key':entry.key, 'time':time.time()})
+				try:
+					entry.send(api_obj)
+				except Exception as e:
+					if is_offline(e):
+						if was_not_sent(e):
+							self._append({'op':'release', 'key':entry.key, 'time':time.time()})
+						logger.warning('Server is still unavailable: {0}'.format(e))
+						break
+					if not isinstance(e, requests.exceptions.HTTPError):
+						raise
+					self._append({'op':'fail', 'key':entry.key, 'time':time.time(), 'error':str(e)})
+					stats['failed'] += 1
+					continue
+				self._append({'op':'ack', 'key':entry.key, 'time':time.time()})
+				stats['sent'] += 1
+			self._compact()
+		stats['pending'] = len(self.pending())
+		return stats
+	def _compact(self):
+		""" Rewrites journal, removing records of completed and dropped entries. """
+		records = self._read()
+		finished = {record['key'] for record in records if record.get('op') in ('ack', 'drop')}
+		lines = ''.join(json.dumps(record, sort_keys=True) + '\n' for record in records if record.get('key') not in finished)
+		tmp_file = self.filename.with_name(self.filename.name + '.{0}.tmp'.format(os.getpid()))
+		tmp_file.write_text(lines)
+		os.replace(str(tmp_file), str(self.filename))
@@ -0,0 +1,280 @@
+""" Benchmark suite: object model, CLI helpers and transport.
+
+	python -m habitica.test.bench [NAME...] [--repeat N] [--threshold X] [--save] [--baseline path/to/baseline.json]
+
+Runs offline: against mock API (see mock_api) or local fake server (see fake_server).
+Every benchmark is run <repeat> times, the best time is reported
+as it is the least affected by noise of other processes.
+Memory benchmarks report memory allocated per created object (in bytes) instead of time.
+Results are compared with stored baseline (bench_baseline.json next to this file):
+benchmark that is slower than its baseline time multiplied by threshold
+is reported as regression and exit code is non-zero.
+Option --save stores current results as the new baseline
+(should be done on the same machine that runs comparisons).
+"""
+import gc
+import sys
+import json
+import time
+import inspect
+import argparse
+import datetime
+import tempfile
+import tracemalloc
+import contextlib
+import unittest.mock
+from pathlib import Path
+from .. import core, cli, extra
+from ..core import base, groups
+from .mock_api import MockAPI, MockRequest, MockDataRequest, MockData
+from .test_api import MockAPI as MockTransportAPI
+from . import fake_server, bench_content
+
+BASELINE_FILE = Path(__file__).with_name('bench_baseline.json')
+THRESHOLD = 1.5
+REPEAT = 5
+
+BENCHMARKS = {}
+MEMORY_BENCHMARKS = set()
+
+def benchmark(name, memory=False):
+	""" Registers benchmark.
+	Decorated function prepares data and returns either function to measure
+	or pair (setup, function) if some preparations should be done before every run
+	(setup is not measured, its result is passed to function).
+	For memory benchmarks function should return list of created objects.
+	"""
+	def _decorator(func):
+		BENCHMARKS[name] = func
+		if memory:
+			MEMORY_BENCHMARKS.add(name)
+		return func
+	return _decorator
+
+def _habitica(*requests, **params):
+	return core.Habitica(_api=MockAPI(*requests), **params)
+
+def _tasks(count, task_type, checklist=0):
+	return [task for task in fake_server.generate_tasks(count * len(fake_server.TASK_TYPES), checklist=checklist) if task['type'] == task_type]
+
+@benchmark('children')
+def bench_children():
+	habitica = _habitica()
+	data = _tasks(5000, 'todo', checklist=5)
+	return lambda: list(habitica.children(core.Todo, data))
+
+@benchmark('object_memory', memory=True)
+def bench_object_memory():
+	habitica = _habitica()
+	data = _tasks(10000, 'todo')
+	return lambda: [habitica.child(core.Todo, entry) for entry in data]
+
+@benchmark('identity_map_memory', memory=True)
+def bench_identity_map_memory():
+	habitica = _habitica(identity_map=True)
+	data = _tasks(10000, 'todo')
+	return lambda: [habitica.child(core.Todo, entry) for entry in data]
+
+class _ContentServer:
+	""" Fake server with synthetic content and API with isolated cache dir. """
+	def __init__(self):
+		self.server = fake_server.FakeServer(fake_server.FakeState(MockData.USER, content=bench_content.generate_content()['data']))
+		self.cache_dir = tempfile.TemporaryDirectory()
+	def __enter__(self):
+		self.server.start()
+		self.patcher = unittest.mock.patch('habitica.config.get_cache_dir', return_value=self.cache_dir.name)
+		self.patcher.start()
+		return self
+	def __exit__(self, *args):
+		self.patcher.stop()
+		self.server.stop()
+		self.cache_dir.cleanup()
+	def clear_cache(self):
+		for path in sorted(Path(self.cache_dir.name).glob('**/*'), reverse=True):
+			path.rmdir() if path.is_dir() else path.unlink()
+	def load_content(self):
+		with MockTransportAPI(self.server.url, self.server.user_id, self.server.api_key) as api_obj:
+			content = core.Content(_api=api_obj)
+			content.spells('rogue')
+			content.gear(next(iter(content._data['gear']['flat'])))
+		return content
+
+@benchmark('content_cold')
+def bench_content_cold(resources):
+	server = resources.enter_context(_ContentServer())
+	return server.clear_cache, lambda _: server.load_content()
+
+@benchmark('content_warm')
+def bench_content_warm(resources):
+	server = resources.enter_context(_ContentServer())
+	server.load_content()
+	return lambda: server.load_content()
+
+@benchmark('content_food_fallback')
+def bench_content_food_fallback():
+	content_data = dict(MockData.CONTENT_DATA)
+	content_data.pop('food', None)
+	content_data['loginIncentives'] = {
+			str(day):{'reward':[{'key':'Food{0}_{1}'.format(day, index), 'text':'Food', 'textThe':'the Food', 'value':1} for index in range(3)]}
+			for day in range(500)
+			}
+	mock_api = MockAPI()
+	mock_api.cache = [MockRequest('get', ['content'], {'data':content_data}, cached=True)]
+	content = core.Content(_api=mock_api)
+	return lambda: content.food()
+
+def _task_list(count):
+	habitica = _habitica()
+	return habitica.children(core.Todo, _tasks(count, 'todo', checklist=3))
+
+@benchmark('filter_tasks')
+def bench_filter_tasks():
+	todos = _task_list(5000)
+	patterns = ['1-1000,2000-2500', '3000.1,3000.2', '#4990', '#4994']
+	return lambda: list(cli.filter_tasks(todos, patterns))
+
+@benchmark('parse_task_number_arg')
+def bench_parse_task_number_arg():
+	raw_arg = ','.join('{0}-{1},{1}.1'.format(index, index + 5) for index in range(1, 5000, 10))
+	return lambda: cli.parse_task_number_arg(raw_arg)
+
+@benchmark('print_task_list')
+def bench_print_task_list():
+	habitica = _habitica()
+	dailies = habitica.children(core.Daily, _tasks(3000, 'daily', checklist=3))
+	time_now = datetime.datetime(2020, 1, 1, 12, 0, 0)
+	return lambda: cli.print_task_list(dailies, timezoneOffset=180, with_notes=True, time_now=time_now, printer=lambda line: None)
+
+def _user_doc(size):
+	return {
+			'profile' : {'name':'User'},
+			'items' : {
+				'gear' : {'owned':{'item{0}'.format(index):True for index in range(size)}},
+				'pets' : {'Pet-{0}'.format(index):5 for index in range(size)},
+				'food' : {'Food{0}'.format(index):index for index in range(size)},
+				},
+			'achievements' : {'achievement{0}'.format(index):{'earned':True, 'value':index} for index in range(size)},
+			'tasksOrder' : {'todos':['todo{0}'.format(index) for index in range(size)]},
+			}
+
+@benchmark('update_dict_deep')
+def bench_update_dict_deep():
+	original, update = _user_doc(5000), _user_doc(5000)
+	return lambda: base.update_dict_deep(original, update)
+
+@benchmark('diff_patch')
+def bench_diff_patch():
+	update = _user_doc(5000)
+	update['items']['food'] = {key:value + 1 for key, value in update['items']['food'].items() if value % 10 == 0}
+	return (lambda: _user_doc(5000)), lambda original: base.patch_dict(original, base.diff_dict_deep(original, update))
+
+@benchmark('iterate_pages')
+def bench_iterate_pages():
+	members = [{'_id':'member{0:06}'.format(index), 'profile':{'name':'Member'}} for index in range(3000)]
+	def setup():
+		pages = [members[start:start + 30] for start in range(0, len(members) + 1, 30)]
+		return _habitica(*(MockDataRequest('get', ['groups', 'crowd', 'members'], page) for page in pages))
+	return setup, lambda habitica: list(groups.iterate_pages(habitica, core.user.Member, 'groups', 'crowd', 'members'))
+
+@benchmark('rss_feed')
+def bench_rss_feed():
+	group = {'id':'party', 'name':'Party'}
+	messages = [{'id':'message{0}'.format(index), 'username':'member{0}'.format(index % 100), 'timestamp':1600000000 + index,
+		'text':'Message #{0} with **markdown** and [link](https://habitica.com)'.format(index)} for index in range(10000)]
+	def run():
+		feed = extra.RSSMessageFeed()
+		for message in messages:
+			feed.add_message(group, dict(message))
+		feed.done()
+		return feed.getvalue()
+	return run
+
+@benchmark('transport')
+def bench_transport(resources):
+	server = resources.enter_context(fake_server.FakeServer(fake_server.FakeState.from_mock_data().populate(tasks=200)))
+	api_obj = resources.enter_context(MockTransportAPI(server.url, server.user_id, server.api_key, coalesce_window=0))
+	def run():
+		for _ in range(20):
+			api_obj.get('user')
+			api_obj.get('tasks', 'user')
+			api_obj.post('tasks', 'task-habit-0', 'score', 'up')
+	return run
+
+def _allocated_per_object(measured, arg):
+	gc.collect()
+	tracemalloc.start()
+	try:
+		objects = measured(arg)
+		allocated, _ = tracemalloc.get_traced_memory()
+	finally:
+		tracemalloc.stop()
+	return allocated / len(objects)
+
+def run_benchmark(name, repeat):
+	""" Returns best time (seconds) of <repeat> runs of benchmark.
+	For memory benchmarks returns the least memory per object (bytes).
+	"""
+	with contextlib.ExitStack() as resources:
+		func = BENCHMARKS[name]
+		prepared = func(resources) if inspect.signature(func).parameters else func()
+		setup, measured = prepared if isinstance(prepared, tuple) else (None, lambda _: prepared())
+		times = []
+		for _ in range(repeat):
+			arg = setup() if setup else None
+			if name in MEMORY_BENCHMARKS:
+				times.append(_allocated_per_object(measured, arg))
+				continue
+			start = time.perf_counter()
+			measured(arg)
+			times.append(time.perf_counter() - start)
+		return min(times)
+
+def _format_ms(seconds):
+	return '{0:.2f} ms'.format(seconds * 1000)
+
+def _format_bytes(value):
+	return '{0:.0f} B'.format(value)
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('names', nargs='*', help='Benchmarks to run. Default is all: ' + ', '.join(BENCHMARKS))
+	parser.add_argument('--repeat', type=int, default=REPEAT, help='Number of runs of each benchmark. Default is {0}.'.format(REPEAT))
+	parser.add_argument('--threshold', type=float, default=THRESHOLD, help='Max allowed ratio to baseline time. Default is {0}.'.format(THRESHOLD))
+	parser.add_argument('--baseline', default=str(BASELINE_FILE), help='Baseline file. Default is {0}'.format(BASELINE_FILE.name))
+	parser.add_argument('--save', action='store_true', help='Store results as the new baseline.')
+	args = parser.parse_args()
+
+	unknown = set(args.names) - set(BENCHMARKS)
+	if unknown:
+		parser.error('Unknown benchmarks: {0}'.format(', '.join(sorted(unknown))))
+	baseline_file = Path(args.baseline)
+	baseline = json.loads(baseline_file.read_text()) if baseline_file.exists() else {}
+	results = {}
+	regressions = []
+	print('{0:<24} {1:>10} {2:>13} {3:>7}'.format('benchmark', 'best', 'baseline', 'ratio'))
+	for name in args.names or BENCHMARKS:
+		results[name] = run_benchmark(name, args.repeat)
+		expected = baseline.get(name)
+		ratio = results[name] / expected if expected else None
+		mark = ''
+		if ratio is not None and ratio > args.threshold:
+			regressions.append(name)
+			mark = ' REGRESSION'
+		units = _format_bytes if name in MEMORY_BENCHMARKS else _format_ms
+		print('{0:<24} {1:>10} {2:>13} {3:>7}{4}'.format(
+			name, units(results[name]),
+			units(expected) if expected else '-',
+			'{0:.2f}'.format(ratio) if ratio is not None else '-',
+			mark,
+			))
+	if args.save:
+		baseline.update({name:round(value, 6) for name, value in results.items()})
+		baseline_file.write_text(json.dumps(baseline, indent='\t', sort_keys=True) + '\n')
+		print('Baseline is saved to {0}'.format(baseline_file))
+	elif regressions:
+		print('Regressions (slower than baseline x{0}): {1}'.format(args.threshold, ', '.join(regressions)))
+		return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main())
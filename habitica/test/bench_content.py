@@ -0,0 +1,132 @@
+""" Benchmark: cold load of cached Habitica content, JSON vs binary snapshot vs lazy shards vs mapped pack.
+
+	python -m habitica.test.bench_content [--file path/to/content.cache.json] [--runs N]
+
+Every load is performed in a fresh interpreter (like a CLI invocation),
+reported time is measured around the load itself, peak RSS (VmHWM) is for the whole process
+(imports are the same for all methods, so the difference is caused by the load).
+Private RSS (RssAnon) is the part of memory that is not shared with other processes,
+i.e. what every additional worker process costs.
+Without --file synthetic content of comparable size is generated.
+"""
+import os, sys
+import json
+import argparse
+import tempfile
+import subprocess
+import statistics
+import unittest.mock
+from pathlib import Path
+
+LOADERS = {
+		'json' : """
+data = api.dotdict(json.loads(cached.cache_file.read_text())).data
+""",
+		'snapshot' : """
+data = cached._load().data
+""",
+		'sharded' : """
+data = cached._load_shards('data')
+""",
+		'mapped' : """
+data = cached._load_pack('data')
+""",
+		}
+
+CHILD_CODE = """
+import json, time, resource, types
+def proc_status_kb(field):
+	try:
+		with open('/proc/self/status') as status:
+			return int(next(line for line in status if line.startswith(field + ':')).split()[1])
+	except (OSError, StopIteration):
+		return None
+def peak_rss_kb(): # ru_maxrss is inherited from parent process through exec, VmHWM is not.
+	return proc_status_kb('VmHWM') or resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+from habitica import api
+cached = api.API.Cached(types.SimpleNamespace(app_version=None, _inside_response_hook=False, response_cache=None), 'content')
+start = time.perf_counter()
+{loader}
+assert data['spells']['rogue'] # Typical command touches only a couple of collections
+assert next(iter(data['gear']['flat'].values())) # or single items of large ones.
+elapsed = time.perf_counter() - start
+rss_after = peak_rss_kb()
+print(json.dumps({{'time': elapsed, 'rss_kb': rss_after, 'private_kb': proc_status_kb('RssAnon')}}))
+"""
+
+def generate_content(scale=1):
+	""" Generates synthetic content with the shape and size of real one (~2Mb per scale unit). """
+	content = {'gear':{'flat':{}, 'tree':{}}, 'quests':{}, 'spells':{}, 'petInfo':{}, 'mountInfo':{}, 'backgroundsFlat':{}, 'food':{}}
+	for index in range(2500 * scale):
+		key = 'armor_special_{0}'.format(index)
+		content['gear']['flat'][key] = {
+				'key':key, 'text':'Armor #{0}'.format(index), 'notes':'Increases Constitution by {0}. Limited Edition 2020 Winter Gear.'.format(index),
+				'type':'armor', 'klass':'special', 'specialClass':'warrior', 'set':'winter2020', 'index':str(index),
+				'value':100, 'str':0, 'int':0, 'per':0, 'con':index % 20, 'event':{'start':'2020-01-01', 'end':'2020-01-31'},
+				}
+	for index in range(400 * scale):
+		key = 'quest{0}'.format(index)
+		content['quests'][key] = {
+				'key':key, 'text':'Quest #{0}'.format(index), 'notes':'Long quest description. ' * 20,
+				'completion':'Quest completion text. ' * 10, 'value':4, 'category':'pet', 'goldValue':0,
+				'boss':{'name':'Boss', 'hp':500, 'str':1.5, 'def':1}, 'drop':{'gp':31, 'exp':500, 'items':[{'type':'eggs', 'key':'Egg', 'text':'Egg'}] * 3},
+				}
+	for klass in ['wizard', 'healer', 'warrior', 'rogue', 'special']:
+		content['spells'][klass] = {'spell{0}'.format(index):{'key':'spell{0}'.format(index), 'text':'Spell', 'notes':'Spell notes. ' * 5, 'mana':10, 'target':'self', 'lvl':index} for index in range(10)}
+	for index in range(3000 * scale):
+		key = 'Pet-{0}'.format(index)
+		content['petInfo'][key] = {'key':key, 'type':'Base', 'potion':'Base', 'egg':'Wolf', 'text':'Base Wolf {0}'.format(index)}
+		content['mountInfo'][key] = {'key':key, 'type':'Base', 'potion':'Base', 'egg':'Wolf', 'text':'Base Wolf {0}'.format(index)}
+	for index in range(1000 * scale):
+		key = 'background{0}'.format(index)
+		content['backgroundsFlat'][key] = {'key':key, 'text':'Background', 'notes':'Background notes. ' * 3, 'price':7, 'set':'backgrounds012020'}
+	for index in range(100 * scale):
+		key = 'Food{0}'.format(index)
+		content['food'][key] = {'key':key, 'text':'Food', 'textA':'a Food', 'textThe':'the Food', 'target':'Base', 'value':1, 'canDrop':True, 'notes':'Food notes.'}
+	return {'success':True, 'data':content, 'appVersion':'5.0.0'}
+
+def run_loader(name, cache_home):
+	env = dict(os.environ, XDG_CACHE_HOME=str(cache_home))
+	env['PYTHONPATH'] = os.pathsep.join([str(Path(__file__).resolve().parents[2])] + sys.path)
+	output = subprocess.check_output([sys.executable, '-c', CHILD_CODE.format(loader=LOADERS[name])], env=env)
+	return json.loads(output.decode().splitlines()[-1])
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+	parser.add_argument('--file', help='Real content.cache.json to use instead of synthetic one.')
+	parser.add_argument('--runs', type=int, default=5, help='Number of cold loads for each method. Default is 5.')
+	parser.add_argument('--scale', type=int, default=1, help='Size of synthetic content. Default is 1 (~2Mb).')
+	args = parser.parse_args()
+
+	from habitica import api
+	with tempfile.TemporaryDirectory() as cache_home:
+		cache_dir = Path(cache_home)/'habitica'
+		cache_dir.mkdir()
+		content_file = cache_dir/'content.cache.json'
+		if args.file:
+			content_file.write_text(Path(args.file).read_text())
+		else:
+			content_file.write_text(json.dumps(generate_content(args.scale)))
+		data = json.loads(content_file.read_text())
+		marshal_file = cache_dir/'content.cache.marshal'
+		import marshal
+		marshal_file.write_bytes(api.API.Cached.snapshot_header(content_file.stat()) + marshal.dumps(data))
+		cached = api.API.Cached(None, 'content')
+		with unittest.mock.patch('habitica.config.get_cache_dir', return_value=str(cache_dir)):
+			cached._write_shards(data['data'], content_file.stat())
+			cached._write_pack(data['data'], content_file.stat())
+		print('JSON size:     {0:.1f} Kb'.format(content_file.stat().st_size / 1024))
+		print('Snapshot size: {0:.1f} Kb'.format(marshal_file.stat().st_size / 1024))
+		print('Pack size:     {0:.1f} Kb'.format((cache_dir/'content.cache.pack').stat().st_size / 1024))
+		print('{0:<10} {1:>12} {2:>12} {3:>14} {4:>17}'.format('method', 'median, ms', 'min, ms', 'peak RSS, Kb', 'private RSS, Kb'))
+		for name in LOADERS:
+			results = [run_loader(name, cache_home) for _ in range(args.runs)]
+			times = [result['time'] * 1000 for result in results]
+			print('{0:<10} {1:>12.1f} {2:>12.1f} {3:>14} {4:>17}'.format(
+				name, statistics.median(times), min(times),
+				max(result['rss_kb'] for result in results),
+				max(result['private_kb'] or 0 for result in results),
+				))
+
+if __name__ == '__main__':
+	main()
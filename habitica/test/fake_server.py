@@ -0,0 +1,693 @@
+""" Stateful in-process fake Habitica server for load and scale testing.
+
+Serves the subset of v3/v4 endpoints that is used by the library
+(user, tasks, scoring, checklists, tags, groups, chat, members with lastId paging,
+challenges, content) from its own in-memory state, so the whole stack
+(API, rate limiter, retries, core objects) can be exercised
+with thousands of entities without touching the real server:
+	state = FakeState.from_mock_data().populate(tasks=5000, checklist=300, members=10000)
+	with FakeServer(state, latency=0.01, rate_limit=30, error_rate=0.05) as server:
+		with API(server.url, server.user_id, server.api_key) as api_obj:
+			...
+
+State is modified by write requests (scoring, updates, chat posts etc),
+so consequent reads see the changes. Faults are injected per request:
+latency (fixed or random range), rate limit (X-RateLimit-* headers and 429
+when budget is exhausted) and random 503 errors with given rate.
+"""
+import re
+import copy
+import json
+import time
+import random
+import datetime
+import threading
+import urllib.parse
+import http.server
+from .mock_api import MockData
+
+API_KEY = 'fake-api-key'
+APP_VERSION = '5.0.0'
+MEMBERS_PAGE_SIZE = 30
+MEMBERS_PAGE_MAX = 60
+GROUPS_PAGE_SIZE = 30
+CHALLENGES_PAGE_SIZE = 10
+
+class FakeError(Exception):
+	""" Error response of fake server. """
+	def __init__(self, status, error, message):
+		super().__init__(message)
+		self.status = status
+		self.error = error
+
+class NotFound(FakeError):
+	def __init__(self, what, key):
+		super().__init__(404, 'NotFound', '{0} not found: {1}'.format(what, key))
+
+def _flag(value):
+	return str(value).lower() in ('true', '1')
+
+def _js_date(timestamp):
+	""" Date string in the format of X-RateLimit-Reset of real server. """
+	date = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+	return date.strftime('%a %b %d %Y %H:%M:%S GMT+0000 (Coordinated Universal Time)')
+
+#### SYNTHETIC DATA ############################################################
+
+TASK_TYPES = ['habit', 'daily', 'todo', 'reward']
+
+def generate_tasks(count, checklist=0, prefix='task'):
+	""" Yields synthetic tasks of all types in turn.
+	Dailies and todos get checklists of given size.
+	"""
+	for index in range(count):
+		task_type = TASK_TYPES[index % len(TASK_TYPES)]
+		task_id = '{0}-{1}-{2}'.format(prefix, task_type, index)
+		task = {
+				'id' : task_id,
+				'type' : task_type,
+				'text' : 'Synthetic {0} #{1}'.format(task_type, index),
+				'notes' : 'Generated task notes. ' * 3,
+				'value' : 0 if task_type != 'reward' else 10,
+				'priority' : 1,
+				'attribute' : 'str',
+				'tags' : [],
+				'createdAt' : '2016-06-20T21:00:00.000Z',
+				'updatedAt' : '2016-06-20T21:00:00.000Z',
+				}
+		if task_type == 'habit':
+			task.update({'up':True, 'down':True, 'counterUp':0, 'counterDown':0, 'frequency':'daily'})
+		if task_type in ('daily', 'todo'):
+			task.update({'completed':False, 'collapseChecklist':False, 'checklist':[
+				{'id':'{0}-item-{1}'.format(task_id, item), 'text':'Item #{0}'.format(item), 'completed':False}
+				for item in range(checklist)
+				]})
+		if task_type == 'daily':
+			task.update({'streak':0, 'isDue':True, 'frequency':'daily', 'everyX':index % 3 + 1, 'startDate':'2016-06-20T21:00:00.000Z', 'yesterDaily':True})
+		yield task
+
+def generate_members(count, tasks=0, prefix='member'):
+	""" Yields synthetic group members, each with given number of tasks. """
+	for index in range(count):
+		member_id = '{0}{1:06}'.format(prefix, index)
+		yield {
+				'_id' : member_id,
+				'id' : member_id,
+				'profile' : {'name':'Member #{0}'.format(index)},
+				'stats' : {'lvl':index % 100 + 1, 'class':'warrior', 'hp':50, 'mp':10, 'exp':0, 'gp':0},
+				'tasks' : list(generate_tasks(tasks, prefix=member_id)),
+				}
+
+def generate_chat(count, prefix='message'):
+	""" Yields synthetic chat messages. """
+	for index in range(count):
+		yield {
+				'id' : '{0}{1:06}'.format(prefix, index),
+				'user' : 'member{0:06}'.format(index % 100),
+				'timestamp' : 1600000000 + index,
+				'text' : 'Message #{0}'.format(index),
+				}
+
+#### STATE #####################################################################
+
+class FakeState:
+	""" In-memory database of fake server.
+	All data is stored as plain JSON-like structures (as they are returned by server).
+	Access should be guarded by .lock
+	"""
+	def __init__(self, user, content=None):
+		self.lock = threading.RLock()
+		self.user = copy.deepcopy(user)
+		self.user.setdefault('tasksOrder', {'habits':[], 'dailys':[], 'todos':[], 'rewards':[]})
+		self.user.setdefault('stats', {}).setdefault('gp', 0)
+		self.content = copy.deepcopy(content or {})
+		self.tasks = {}
+		self.tags = {}
+		self.groups = {}
+		self.chats = {}
+		self.members = {}
+		self.group_members = {}
+		self.challenges = {}
+		self.challenge_members = {}
+		self._next_id = 0
+	@property
+	def user_id(self):
+		return self.user['id']
+	def new_id(self, prefix):
+		self._next_id += 1
+		return '{0}-{1}'.format(prefix, self._next_id)
+
+	@classmethod
+	def from_mock_data(cls):
+		""" Creates state filled with the same data that is used by unit tests (see mock_api.MockData). """
+		state = cls(MockData.USER, content=MockData.CONTENT_DATA)
+		for task_type, collection in zip(TASK_TYPES, (MockData.HABITS, MockData.DAILIES, MockData.TODOS, MockData.REWARDS)):
+			for task in collection.values():
+				state.add_task(dict(task, type=task_type))
+		for tag in MockData.TAGS.values():
+			state.add_tag(tag)
+		for group in MockData.GROUPS.values():
+			state.add_group(group)
+		state.chats['party'] = copy.deepcopy(MockData.PARTY_CHAT)
+		for challenge in MockData.CHALLENGES.values():
+			state.add_challenge(challenge)
+		troopers = sorted((key for key in MockData.MEMBERS if key.startswith('mj12trooper')), key=lambda key: int(key[len('mj12trooper'):]))
+		for member_id, member in MockData.MEMBERS.items():
+			state.add_member(member, groups=['party'] if member_id in troopers else [])
+		for member_id in troopers:
+			state.challenge_members['unatco'].append(member_id)
+		return state
+	def populate(self, tasks=0, checklist=0, members=0, member_tasks=0, chat=0, group='crowd'):
+		""" Adds synthetic data of given size:
+		- user tasks (of all types) with checklists of given size (for dailies and todos);
+		- guild <group> (and challenge of the same id) with given number of members,
+		  each member has <member_tasks> tasks;
+		- party chat messages.
+		Returns self.
+		"""
+		for task in generate_tasks(tasks, checklist=checklist):
+			self.add_task(task)
+		if members:
+			if group not in self.groups:
+				self.add_group({'id':group, 'name':group.title(), 'type':'guild', 'privacy':'public', 'leader':self.user_id})
+			if group not in self.challenges:
+				self.add_challenge({'id':group, 'name':group.title(), 'shortName':group, 'group':{'id':group, 'name':group.title()}})
+			for member in generate_members(members, tasks=member_tasks):
+				self.add_member(member, groups=[group])
+				self.challenge_members[group].append(member['_id'])
+		self.chats.setdefault('party', []).extend(generate_chat(chat))
+		return self
+
+	def add_task(self, task, owner=None):
+		""" Adds task to user's task list (or just registers it if owner is not user). """
+		task = copy.deepcopy(task)
+		task.setdefault('id', self.new_id('task'))
+		task.setdefault('tags', [])
+		task.setdefault('value', 0)
+		if task['type'] in ('daily', 'todo'):
+			task.setdefault('completed', False)
+			task.setdefault('checklist', [])
+		if task['type'] == 'habit':
+			task.setdefault('up', True)
+			task.setdefault('down', True)
+		self.tasks[task['id']] = task
+		if owner is None:
+			self.user['tasksOrder'][task['type'] + 's'].append(task['id'])
+		return task
+	def add_tag(self, tag):
+		tag = copy.deepcopy(tag)
+		self.tags[tag['id']] = tag
+		return tag
+	def add_group(self, group):
+		group = copy.deepcopy(group)
+		self.groups[group['id']] = group
+		self.chats.setdefault(group['id'], [])
+		self.group_members.setdefault(group['id'], [])
+		return group
+	def add_challenge(self, challenge):
+		challenge = copy.deepcopy(challenge)
+		self.challenges[challenge['id']] = challenge
+		self.challenge_members.setdefault(challenge['id'], [])
+		return challenge
+	def add_member(self, member, groups=()):
+		member = copy.deepcopy(member)
+		member_id = member.get('_id') or member['id']
+		self.members[member_id] = member
+		for group_id in groups:
+			self.group_members[group_id].append(member_id)
+			self.groups[group_id]['memberCount'] = len(self.group_members[group_id])
+		return member
+
+	def task(self, task_id):
+		if task_id not in self.tasks:
+			raise NotFound('Task', task_id)
+		return self.tasks[task_id]
+	def group(self, group_id):
+		if group_id in self.groups:
+			return self.groups[group_id]
+		if group_id in ('party', 'habitrpg'):
+			group_type = group_id
+			for group in self.groups.values():
+				if group.get('type') == group_type:
+					return group
+		raise NotFound('Group', group_id)
+	def challenge(self, challenge_id):
+		if challenge_id not in self.challenges:
+			raise NotFound('Challenge', challenge_id)
+		return self.challenges[challenge_id]
+	def member(self, member_id):
+		if member_id == self.user_id:
+			return self.user
+		if member_id not in self.members:
+			raise NotFound('Member', member_id)
+		return self.members[member_id]
+
+#### ENDPOINTS #################################################################
+
+ROUTES = []
+
+def route(method, pattern):
+	""" Registers handler for requests with given method and path pattern
+	(relative to /api/vN/, named groups are passed to handler as args).
+	Routes are matched in order of registration.
+	"""
+	def _decorator(func):
+		ROUTES.append((method, re.compile('^' + pattern + '$'), func))
+		return func
+	return _decorator
+
+def _page(ids, lastId, limit):
+	""" Returns page of ids after lastId. """
+	start = 0
+	if lastId:
+		try:
+			start = ids.index(lastId) + 1
+		except ValueError:
+			raise NotFound('Entry', lastId)
+	return ids[start:start+limit]
+
+@route('GET', r'status')
+def get_status(state, query, body):
+	return {'status':'up'}
+
+@route('GET', r'content')
+def get_content(state, query, body):
+	return state.content
+
+@route('GET', r'user')
+def get_user(state, query, body):
+	return state.user
+
+@route('POST', r'user/sleep')
+def toggle_sleep(state, query, body):
+	preferences = state.user.setdefault('preferences', {})
+	preferences['sleep'] = not preferences.get('sleep', False)
+	return preferences['sleep']
+
+@route('POST', r'cron')
+def run_cron(state, query, body):
+	state.user['needsCron'] = False
+	return {}
+
+@route('GET', r'tasks/user')
+def get_user_tasks(state, query, body):
+	task_type = query.get('type')
+	if task_type == 'completedTodos':
+		return [task for task in state.tasks.values() if task['type'] == 'todo' and task.get('completed')]
+	order = state.user['tasksOrder']
+	task_types = [task_type] if task_type else ['habits', 'dailys', 'todos', 'rewards']
+	result = []
+	for key in task_types:
+		if key not in order:
+			raise FakeError(400, 'BadRequest', 'Invalid task type: {0}'.format(key))
+		result.extend(state.tasks[task_id] for task_id in order[key])
+	if task_type == 'todos':
+		result = [task for task in result if not task.get('completed')]
+	return result
+
+@route('POST', r'tasks/user')
+def create_user_task(state, query, body):
+	if (body or {}).get('type') not in TASK_TYPES:
+		raise FakeError(400, 'BadRequest', 'Invalid task type: {0}'.format((body or {}).get('type')))
+	return state.add_task(dict(body, id=state.new_id('task')))
+
+@route('POST', r'tasks/clearCompletedTodos')
+def clear_completed_todos(state, query, body):
+	completed = {task_id for task_id, task in state.tasks.items() if task['type'] == 'todo' and task.get('completed')}
+	for task_id in completed:
+		del state.tasks[task_id]
+	state.user['tasksOrder']['todos'] = [task_id for task_id in state.user['tasksOrder']['todos'] if task_id not in completed]
+	return {}
+
+@route('GET', r'tasks/(?P<task_id>[^/]+)')
+def get_task(state, query, body, task_id):
+	return state.task(task_id)
+
+@route('PUT', r'tasks/(?P<task_id>[^/]+)')
+def update_task(state, query, body, task_id):
+	task = state.task(task_id)
+	task.update(body or {})
+	return task
+
+@route('DELETE', r'tasks/(?P<task_id>[^/]+)')
+def delete_task(state, query, body, task_id):
+	task = state.tasks.pop(state.task(task_id)['id'])
+	order = state.user['tasksOrder'][task['type'] + 's']
+	if task_id in order:
+		order.remove(task_id)
+	return {}
+
+@route('POST', r'tasks/(?P<task_id>[^/]+)/score/(?P<direction>up|down)')
+def score_task(state, query, body, task_id, direction):
+	task = state.task(task_id)
+	stats = state.user['stats']
+	delta = 1.0 if direction == 'up' else -1.0
+	if task['type'] == 'reward':
+		if direction == 'up':
+			stats['gp'] = stats.get('gp', 0) - task.get('value', 0)
+		delta = 0.0
+	elif task['type'] == 'habit':
+		task['counter' + direction.title()] = task.get('counter' + direction.title(), 0) + 1
+	else:
+		task['completed'] = (direction == 'up')
+	task['value'] = task.get('value', 0) + delta
+	if delta > 0:
+		stats['exp'] = stats.get('exp', 0) + delta
+		stats['gp'] = stats.get('gp', 0) + delta
+	elif delta < 0 and task['type'] == 'habit':
+		stats['hp'] = stats.get('hp', 0) + delta
+	return dict({key:stats.get(key) for key in ('hp', 'mp', 'exp', 'gp', 'lvl', 'class')}, delta=delta, _tmp={})
+
+@route('POST', r'tasks/(?P<task_id>[^/]+)/move/to/(?P<position>-?\d+)')
+def move_task(state, query, body, task_id, position):
+	task = state.task(task_id)
+	order = state.user['tasksOrder'][task['type'] + 's']
+	order.remove(task_id)
+	position = int(position)
+	if position < 0:
+		position = len(order) + 1 + position
+	order.insert(position, task_id)
+	return order
+
+@route('POST', r'tasks/(?P<task_id>[^/]+)/checklist')
+def add_checklist_item(state, query, body, task_id):
+	task = state.task(task_id)
+	task.setdefault('checklist', []).append({'id':state.new_id('item'), 'text':(body or {}).get('text', ''), 'completed':False})
+	return task
+
+def _checklist_item(task, item_id):
+	for item in task.get('checklist', []):
+		if item['id'] == item_id:
+			return item
+	raise NotFound('Checklist item', item_id)
+
+@route('PUT', r'tasks/(?P<task_id>[^/]+)/checklist/(?P<item_id>[^/]+)')
+def update_checklist_item(state, query, body, task_id, item_id):
+	task = state.task(task_id)
+	_checklist_item(task, item_id).update(body or {})
+	return task
+
+@route('DELETE', r'tasks/(?P<task_id>[^/]+)/checklist/(?P<item_id>[^/]+)')
+def delete_checklist_item(state, query, body, task_id, item_id):
+	task = state.task(task_id)
+	task['checklist'].remove(_checklist_item(task, item_id))
+	return task
+
+@route('POST', r'tasks/(?P<task_id>[^/]+)/checklist/(?P<item_id>[^/]+)/score')
+def score_checklist_item(state, query, body, task_id, item_id):
+	task = state.task(task_id)
+	item = _checklist_item(task, item_id)
+	item['completed'] = not item['completed']
+	return task
+
+@route('POST', r'tasks/(?P<task_id>[^/]+)/tags/(?P<tag_id>[^/]+)')
+def add_task_tag(state, query, body, task_id, tag_id):
+	task = state.task(task_id)
+	if tag_id not in task['tags']:
+		task['tags'].append(tag_id)
+	return task
+
+@route('DELETE', r'tasks/(?P<task_id>[^/]+)/tags/(?P<tag_id>[^/]+)')
+def delete_task_tag(state, query, body, task_id, tag_id):
+	task = state.task(task_id)
+	if tag_id in task['tags']:
+		task['tags'].remove(tag_id)
+	return task
+
+@route('GET', r'tags')
+def get_tags(state, query, body):
+	return list(state.tags.values())
+
+@route('POST', r'tags')
+def create_tag(state, query, body):
+	return state.add_tag(dict(body or {}, id=state.new_id('tag')))
+
+@route('GET', r'tags/(?P<tag_id>[^/]+)')
+def get_tag(state, query, body, tag_id):
+	if tag_id not in state.tags:
+		raise NotFound('Tag', tag_id)
+	return state.tags[tag_id]
+
+GROUP_TYPES = {
+		'party' : lambda group: group.get('type') == 'party',
+		'guilds' : lambda group: group.get('type') == 'guild',
+		'privateGuilds' : lambda group: group.get('type') == 'guild' and group.get('privacy') == 'private',
+		'publicGuilds' : lambda group: group.get('type') == 'guild' and group.get('privacy') == 'public',
+		'tavern' : lambda group: group.get('type') == 'habitrpg',
+		}
+
+@route('GET', r'groups')
+def get_groups(state, query, body):
+	group_types = [GROUP_TYPES[key] for key in query.get('type', '').split(',') if key in GROUP_TYPES]
+	result = [group for group in state.groups.values() if not group_types or any(matches(group) for matches in group_types)]
+	if _flag(query.get('paginate')):
+		page = int(query.get('page') or 0)
+		result = result[page*GROUPS_PAGE_SIZE:(page+1)*GROUPS_PAGE_SIZE]
+	return result
+
+@route('GET', r'groups/(?P<group_id>[^/]+)')
+def get_group(state, query, body, group_id):
+	return state.group(group_id)
+
+@route('GET', r'groups/(?P<group_id>[^/]+)/chat')
+def get_chat(state, query, body, group_id):
+	return state.chats[state.group(group_id)['id']]
+
+@route('POST', r'groups/(?P<group_id>[^/]+)/chat/seen')
+def mark_chat_seen(state, query, body, group_id):
+	state.group(group_id)
+	return {}
+
+@route('POST', r'groups/(?P<group_id>[^/]+)/chat')
+def post_chat_message(state, query, body, group_id):
+	chat = state.chats[state.group(group_id)['id']]
+	message = {
+			'id' : state.new_id('message'),
+			'user' : state.user_id,
+			'timestamp' : int(time.time()),
+			'text' : (body or {}).get('message', ''),
+			}
+	chat.append(message)
+	if query.get('previousMsg'):
+		return chat
+	return {'message':message}
+
+@route('DELETE', r'groups/(?P<group_id>[^/]+)/chat/(?P<message_id>[^/]+)')
+def delete_chat_message(state, query, body, group_id, message_id):
+	chat = state.chats[state.group(group_id)['id']]
+	chat[:] = [message for message in chat if message['id'] != message_id]
+	if query.get('previousMsg'):
+		return chat
+	return {}
+
+@route('GET', r'groups/(?P<group_id>[^/]+)/members')
+def get_group_members(state, query, body, group_id):
+	member_ids = state.group_members.get(state.group(group_id)['id'], [])
+	return _members_page(state, member_ids, query)
+
+@route('GET', r'groups/(?P<group_id>[^/]+)/invites')
+def get_group_invites(state, query, body, group_id):
+	state.group(group_id)
+	return []
+
+def _members_page(state, member_ids, query):
+	limit = min(MEMBERS_PAGE_MAX, int(query.get('limit') or MEMBERS_PAGE_SIZE))
+	result = []
+	for member_id in _page(member_ids, query.get('lastId'), limit):
+		member = state.member(member_id)
+		if not _flag(query.get('includeTasks')):
+			member = {key:value for key, value in member.items() if key != 'tasks'}
+		result.append(member)
+	return result
+
+@route('GET', r'challenges/user')
+def get_user_challenges(state, query, body):
+	page = int(query.get('page') or 0)
+	return list(state.challenges.values())[page*CHALLENGES_PAGE_SIZE:(page+1)*CHALLENGES_PAGE_SIZE]
+
+@route('GET', r'challenges/groups/(?P<group_id>[^/]+)')
+def get_group_challenges(state, query, body, group_id):
+	group_id = state.group(group_id)['id']
+	return [challenge for challenge in state.challenges.values() if challenge.get('group', {}).get('id') == group_id]
+
+@route('GET', r'challenges/(?P<challenge_id>[^/]+)')
+def get_challenge(state, query, body, challenge_id):
+	return state.challenge(challenge_id)
+
+@route('GET', r'challenges/(?P<challenge_id>[^/]+)/members')
+def get_challenge_members(state, query, body, challenge_id):
+	return _members_page(state, state.challenge_members[state.challenge(challenge_id)['id']], query)
+
+@route('GET', r'challenges/(?P<challenge_id>[^/]+)/members/(?P<member_id>[^/]+)')
+def get_challenge_member(state, query, body, challenge_id, member_id):
+	if member_id not in state.challenge_members[state.challenge(challenge_id)['id']]:
+		raise NotFound('Challenge member', member_id)
+	return state.member(member_id)
+
+@route('GET', r'members/(?P<member_id>[^/]+)')
+def get_member(state, query, body, member_id):
+	return state.member(member_id)
+
+@route('POST', r'news/read')
+def read_news(state, query, body):
+	return {}
+
+#### SERVER ####################################################################
+
+class _RequestHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1' # Keeps connections alive for pooled sessions.
+	disable_nagle_algorithm = True # Headers and body are sent separately.
+	def do_GET(self):
+		self.server.fake.handle(self)
+	do_POST = do_PUT = do_DELETE = do_GET
+	def log_message(self, format, *args):
+		pass
+
+class FakeServer:
+	""" HTTP server that runs in background thread and serves FakeState.
+	Use as context manager (or start()/stop()).
+
+	Faults:
+	- latency: delay before every response (seconds),
+	  either a number or (min, max) range for random delay;
+	- rate_limit: number of requests per rate_period seconds (fixed window, like real server);
+	  responses contain X-RateLimit-Limit/Remaining/Reset headers,
+	  requests over the limit are answered with 429 and Retry-After;
+	- error_rate: probability (0..1) to fail request with 503.
+	Random values are produced from given seed, so runs are reproducible.
+	"""
+	def __init__(self, state=None, latency=0, rate_limit=None, rate_period=60, error_rate=0, seed=0, api_key=API_KEY, app_version=APP_VERSION):
+		self.state = state or FakeState.from_mock_data()
+		self.latency = latency
+		self.rate_limit = rate_limit
+		self.rate_period = rate_period
+		self.error_rate = error_rate
+		self.api_key = api_key
+		self.app_version = app_version
+		self._random = random.Random(seed)
+		self._lock = threading.Lock()
+		self._window = None
+		self._window_requests = 0
+		self.requests = 0
+		self.failed = 0
+		self.throttled = 0
+		self._httpd = None
+		self._thread = None
+	@property
+	def user_id(self):
+		return self.state.user_id
+	@property
+	def url(self):
+		host, port = self._httpd.server_address[:2]
+		return 'http://{0}:{1}'.format(host, port)
+	def start(self):
+		self._httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _RequestHandler)
+		self._httpd.daemon_threads = True
+		self._httpd.fake = self
+		self._thread = threading.Thread(target=self._httpd.serve_forever, name='FakeServer', daemon=True)
+		self._thread.start()
+		return self
+	def stop(self):
+		if self._httpd is None:
+			return
+		self._httpd.shutdown()
+		self._httpd.server_close()
+		self._thread.join()
+		self._httpd = self._thread = None
+	def __enter__(self):
+		return self.start()
+	def __exit__(self, *args):
+		self.stop()
+	def stats(self):
+		""" Returns dict with counters: requests, failed (injected errors), throttled. """
+		with self._lock:
+			return {
+					'requests' : self.requests,
+					'failed' : self.failed,
+					'throttled' : self.throttled,
+					}
+
+	def _check_rate_limit(self, now):
+		""" Returns (headers, throttled). """
+		if self.rate_limit is None:
+			return {}, False
+		if self._window is None or now >= self._window + self.rate_period:
+			self._window, self._window_requests = now, 0
+		self._window_requests += 1
+		reset = self._window + self.rate_period
+		headers = {
+				'X-RateLimit-Limit' : str(self.rate_limit),
+				'X-RateLimit-Remaining' : str(max(0, self.rate_limit - self._window_requests)),
+				'X-RateLimit-Reset' : _js_date(reset),
+				}
+		if self._window_requests <= self.rate_limit:
+			return headers, False
+		headers['Retry-After'] = str(max(1, int(reset - now + 0.999)))
+		return headers, True
+	def _inject_faults(self):
+		""" Returns (delay, headers, error) for the next request. """
+		with self._lock:
+			self.requests += 1
+			delay = self.latency
+			if isinstance(delay, (tuple, list)):
+				delay = self._random.uniform(*delay)
+			headers, throttled = self._check_rate_limit(time.time())
+			if throttled:
+				self.throttled += 1
+				return delay, headers, FakeError(429, 'TooManyRequests', 'Rate limit exceeded')
+			if self.error_rate and self._random.random() < self.error_rate:
+				self.failed += 1
+				return delay, headers, FakeError(503, 'ServiceUnavailable', 'Injected server error')
+		return delay, headers, None
+	def _call(self, method, path, query, body):
+		""" Returns live state data, so should be called under state lock. """
+		for route_method, pattern, handler in ROUTES:
+			if route_method != method.upper():
+				continue
+			match = pattern.match(path.strip('/'))
+			if match:
+				return handler(self.state, query or {}, body, **match.groupdict())
+		raise FakeError(404, 'NotFound', 'Not found: {0} {1}'.format(method.upper(), path))
+	def dispatch(self, method, path, query=None, body=None):
+		""" Performs request on state directly (without HTTP and faults).
+		Path is relative to API root (e.g. 'tasks/user').
+		Returns copy of response data, raises FakeError.
+		"""
+		with self.state.lock:
+			return copy.deepcopy(self._call(method, path, query, body))
+	def handle(self, request):
+		url = urllib.parse.urlsplit(request.path)
+		query = {key:values[-1] for key, values in urllib.parse.parse_qs(url.query).items()}
+		length = int(request.headers.get('Content-Length') or 0)
+		body = request.rfile.read(length) if length else b''
+
+		delay, headers, error = self._inject_faults()
+		if delay:
+			time.sleep(delay)
+		status = 200
+		try:
+			if error:
+				raise error
+			match = re.match(r'^/api/v[34]/(.*)$', url.path)
+			if not match:
+				raise FakeError(404, 'NotFound', 'Not found: {0}'.format(url.path))
+			if request.headers.get('x-api-user') != self.user_id or request.headers.get('x-api-key') != self.api_key:
+				raise FakeError(401, 'NotAuthorized', 'Missing authentication headers.')
+			try:
+				body = json.loads(body.decode('utf-8')) if body else None
+			except ValueError:
+				raise FakeError(400, 'BadRequest', 'Invalid JSON body.')
+			with self.state.lock: # Data is encoded before any other request could modify it.
+				data = self._call(request.command, match.group(1), query, body)
+				content = json.dumps({'success':True, 'data':data, 'notifications':[], 'appVersion':self.app_version})
+		except FakeError as e:
+			status = e.status
+			content = json.dumps({'success':False, 'error':e.error, 'message':str(e)})
+		content = content.encode('utf-8')
+		request.send_response(status)
+		request.send_header('Content-Type', 'application/json; charset=utf-8')
+		request.send_header('Content-Length', str(len(content)))
+		for key, value in headers.items():
+			request.send_header(key, value)
+		request.end_headers()
+		request.wfile.write(content)
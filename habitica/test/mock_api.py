@@ -72,8 +72,15 @@ class MockAPI:
 		if self.hook:
 			self.hook(request.response)
 		return request.response
-	def get(self, *path, **params):
-		return self._perform_request('get', path, params=params)
+	def get(self, *path, _stream=False, **params):
+		response = self._perform_request('get', path, params=params)
+		if _stream:
+			return iter(response.data)
+		return response
+	def get_sharded(self, *path, _field='data', **params):
+		return self.get(*path, **params)[_field]
+	def get_mapped(self, *path, _field='data', **params):
+		return self.get(*path, **params)[_field]
 	def post(self, *path, _body=None, **params):
 		return self._perform_request('post', path, params=params, body=_body)
 	def put(self, *path, _body=None, **params):
@@ -1,8 +1,12 @@
 import unittest, unittest.mock
 unittest.defaultTestLoader.testMethodPrefix = 'should'
+import os
+import tempfile
 import json
+from pathlib import Path
 import requests
-from .. import api
+import urllib3
+from .. import api, cache
 
 class TestUtils(unittest.TestCase):
 	def should_access_dotdict_fields_via_dot(self):
@@ -23,6 +27,46 @@ class TestUtils(unittest.TestCase):
 		d = api.dotdict({'field':'foo', 'nested' : {'subfield': 'bar'}})
 		self.assertEqual(d.field, 'foo')
 		self.assertEqual(d.nested.subfield, 'bar')
+	def should_wrap_nested_dicts_without_copying(self):
+		d = api.dataview({'nested' : {'subfield': {'value':'bar'}}})
+		original = d['nested']
+		nested = d.nested
+		self.assertTrue(isinstance(nested, api.nestedview))
+		self.assertIs(api.unwrap(nested), original)
+		self.assertIs(d['nested'], original)
+		self.assertIs(api.unwrap(nested.subfield), original['subfield'])
+		d.nested.subfield.value = 'foo'
+		self.assertEqual(d, {'nested' : {'subfield': {'value':'foo'}}})
+		self.assertEqual(d.nested, {'subfield': {'value':'foo'}})
+		self.assertEqual(json.loads(json.dumps(d)), d)
+		self.assertIsNone(d.missing)
+		self.assertIsNone(nested.missing)
+		nested.added = 1
+		nested['other'] = 2
+		self.assertEqual(sorted(original), ['added', 'other', 'subfield'])
+		del nested.added
+		del nested['other']
+		self.assertEqual(list(nested.keys()), ['subfield'])
+		self.assertEqual(list(nested.values()), [{'value':'foo'}])
+		self.assertEqual(list(nested.items()), [('subfield', {'value':'foo'})])
+		self.assertEqual((len(nested), 'subfield' in nested, nested.get('missing', 0)), (1, True, 0))
+		self.assertEqual(repr(nested), repr(original))
+		self.assertIs(api.unwrap(original), original)
+		self.assertIs(api.dotdict, api.dataview)
+	def should_wrap_items_of_plain_dicts_without_copying(self):
+		import types
+		data = {'nested' : {'subfield': 'bar'}, 'value' : 1}
+		nested = api.dataview.item(data, 'nested')
+		self.assertIs(api.unwrap(nested), data['nested'])
+		self.assertIs(type(data['nested']), dict)
+		nested.subfield = 'foo'
+		self.assertEqual(data['nested'], {'subfield': 'foo'})
+		self.assertEqual(api.dataview.item(data, 'value'), 1)
+		with self.assertRaises(KeyError):
+			api.dataview.item(data, 'missing')
+		read_only = types.MappingProxyType({'nested' : {'subfield': 'bar'}})
+		self.assertEqual(api.dataview.item(read_only, 'nested').subfield, 'bar')
+		self.assertIs(type(read_only['nested']), dict)
 
 class MyException(api.API.Exception):
 	CODE, MESSAGE = 404, 'My object was not found'
@@ -98,23 +142,251 @@ class TestDelay(unittest.TestCase):
 				delay.wait_for('post')
 				self.assertAlmostEqual(sleep.call_args[0][0], 0.3)
 
+class TestRateLimiter(unittest.TestCase):
+	def should_allow_bursts_while_there_are_tokens_left(self):
+		limiter = api.RateLimiter(limit=3, period=60)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			self.assertEqual([limiter.delay_for('get') for _ in range(3)], [0, 0, 0])
+			self.assertEqual(limiter.delay_for('post'), 20)
+			get_time.return_value = 1040
+			self.assertEqual(limiter.delay_for('get'), 0)
+			self.assertEqual(limiter.delay_for('get'), 20)
+	def should_sleep_only_when_budget_is_exhausted(self):
+		limiter = api.RateLimiter(limit=1, period=10)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+			with unittest.mock.patch('time.sleep', unittest.mock.MagicMock()) as sleep:
+				limiter.wait_for('get')
+				self.assertFalse(sleep.called)
+				limiter.wait_for('get')
+				sleep.assert_called_with(10)
+	def should_keep_reserved_tokens(self):
+		limiter = api.RateLimiter(limit=5, period=50, reserve=2)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+			self.assertEqual([limiter.delay_for('get') for _ in range(4)], [0, 0, 0, 10])
+	def should_follow_server_rate_limit_headers(self):
+		limiter = api.RateLimiter(limit=3, period=60)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			limiter.update({
+				'X-RateLimit-Limit': '30',
+				'X-RateLimit-Remaining': '1',
+				'X-RateLimit-Reset': 'Thu Jan 01 1970 03:17:25 GMT+0300 (Moscow Standard Time)',
+				})
+			self.assertEqual(limiter.delay_for('get'), 0)
+			self.assertEqual(limiter.delay_for('get'), 45)
+			get_time.return_value = 1045
+			self.assertEqual([limiter.delay_for('get') for _ in range(28)], [0] * 28)
+	def should_wait_for_server_reset_from_current_moment(self):
+		limiter = api.RateLimiter(limit=3, period=60)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			limiter.update({
+				'X-RateLimit-Limit': '30',
+				'X-RateLimit-Remaining': '0',
+				'X-RateLimit-Reset': 'Thu Jan 01 1970 03:17:25 GMT+0300 (Moscow Standard Time)',
+				})
+			get_time.return_value = 1030
+			self.assertEqual(limiter.delay_for('get'), 15)
+			get_time.return_value = 1040
+			self.assertEqual(limiter.delay_for('get'), 5)
+	def should_ignore_missing_or_invalid_headers(self):
+		limiter = api.RateLimiter(limit=1, period=60)
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+			limiter.update(None)
+			limiter.update({'Content-Type': 'application/json'})
+			limiter.update({'X-RateLimit-Remaining': 'unknown'})
+			self.assertEqual(limiter.delay_for('get'), 0)
+	def should_share_budget_between_processes(self):
+		import tempfile, pathlib
+		with tempfile.TemporaryDirectory() as tempdir:
+			state_file = pathlib.Path(tempdir)/'ratelimit.json'
+			first = api.RateLimiter(limit=2, period=60, state_file=state_file)
+			second = api.RateLimiter(limit=2, period=60, state_file=state_file)
+			with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+				self.assertEqual(first.delay_for('get'), 0)
+				self.assertEqual(second.delay_for('get'), 0)
+				self.assertEqual(first.delay_for('get'), 30)
+				self.assertEqual(second.delay_for('get'), 60)
+			state_file.write_text('corrupted')
+			self.assertEqual(first.delay_for('get'), 0)
+	def should_parse_rate_limit_reset_values(self):
+		self.assertEqual(api.parse_rate_limit_reset('Mon Oct 19 2026 10:00:00 GMT+0300 (Moscow Standard Time)'), 1792393200)
+		self.assertEqual(api.parse_rate_limit_reset('Mon, 19 Oct 2026 07:00:00 GMT'), 1792393200)
+		self.assertEqual(api.parse_rate_limit_reset('1792393200'), 1792393200)
+		self.assertEqual(api.parse_rate_limit_reset('30', now=1000), 1030)
+		self.assertIsNone(api.parse_rate_limit_reset(None))
+		self.assertIsNone(api.parse_rate_limit_reset('tomorrow'))
+
+class TestSingleFlight(unittest.TestCase):
+	def should_share_call_in_progress_between_threads(self):
+		import threading
+		single_flight = api.SingleFlight(window=60)
+		started, finish = threading.Event(), threading.Event()
+		calls = []
+		def func():
+			calls.append(1)
+			started.set()
+			finish.wait(5)
+			return {'data':'test'}
+		results = []
+		leader = threading.Thread(target=lambda: results.append(single_flight.do('key', func)))
+		leader.start()
+		started.wait(5)
+		followers = [threading.Thread(target=lambda: results.append(single_flight.do('key', func))) for _ in range(3)]
+		for follower in followers:
+			follower.start()
+		finish.wait(0.05)
+		finish.set()
+		for thread in [leader] + followers:
+			thread.join(5)
+		self.assertEqual(len(calls), 1)
+		self.assertEqual(len(results), 4)
+		self.assertTrue(all(result is results[0] for result in results))
+		single_flight.forget()
+		self.assertEqual(single_flight.do('key', func), {'data':'test'})
+		self.assertEqual(len(calls), 2)
+	def should_reuse_recent_results_until_forgotten(self):
+		single_flight = api.SingleFlight(window=1)
+		calls = []
+		def func():
+			calls.append(1)
+			return len(calls)
+		with unittest.mock.patch('time.monotonic', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			self.assertEqual(single_flight.do('key', func), 1)
+			self.assertEqual(single_flight.do('key', func), 1)
+			self.assertEqual(single_flight.do('other', func), 2)
+			single_flight.forget()
+			self.assertEqual(single_flight.do('key', func), 3)
+			get_time.return_value = 1002
+			self.assertEqual(single_flight.do('key', func), 4)
+	def should_not_reuse_failures(self):
+		single_flight = api.SingleFlight(window=1)
+		def func():
+			raise requests.exceptions.ConnectionError()
+		with self.assertRaises(requests.exceptions.ConnectionError):
+			single_flight.do('key', func)
+		self.assertEqual(single_flight.do('key', lambda: 'ok'), 'ok')
+	def should_perform_reentrant_call_directly(self):
+		single_flight = api.SingleFlight()
+		calls = []
+		def func():
+			calls.append(1)
+			if len(calls) == 1:
+				return 'outer:' + single_flight.do('key', func)
+			return 'inner'
+		self.assertEqual(single_flight.do('key', func), 'outer:inner')
+		self.assertEqual(single_flight.do('key', func), 'inner')
+	def should_share_coroutine_in_progress(self):
+		import asyncio
+		single_flight = api.AsyncSingleFlight()
+		calls = []
+		async def func():
+			calls.append(1)
+			await asyncio.sleep(0)
+			return {'data':'test'}
+		async def fail():
+			await asyncio.sleep(0)
+			raise requests.exceptions.ConnectionError()
+		async def main():
+			results = await asyncio.gather(*[single_flight.do('key', func) for _ in range(3)])
+			errors = await asyncio.gather(*[single_flight.do('key', fail) for _ in range(2)], return_exceptions=True)
+			return results, errors
+		results, errors = asyncio.run(main())
+		self.assertEqual(len(calls), 1)
+		self.assertTrue(all(result is results[0] for result in results))
+		self.assertTrue(all(isinstance(error, requests.exceptions.ConnectionError) for error in errors))
+
+class TestConditionalCache(unittest.TestCase):
+	def should_store_only_responses_with_validators(self):
+		cache = api.ConditionalCache()
+		cache.store('user', {'ETag':'W/"1"'}, b'{"data": "user"}')
+		cache.store('party', {'Content-Type':'application/json'}, b'{"data": "party"}')
+		cache.store('news', {'Last-Modified':'Mon, 19 Oct 2026 07:00:00 GMT'}, b'{"data": "news"}')
+		self.assertEqual(len(cache), 2)
+		self.assertEqual(cache.validators(cache.lookup('user')), {'If-None-Match':'W/"1"'})
+		self.assertEqual(cache.validators(cache.lookup('news')), {'If-Modified-Since':'Mon, 19 Oct 2026 07:00:00 GMT'})
+		self.assertEqual(cache.validators(cache.lookup('party')), {})
+		cache.store('user', {}, b'{"data": "user"}')
+		self.assertIsNone(cache.lookup('user'))
+		self.assertEqual(cache.stats(), {'hits':0, 'misses':4, 'bytes_saved':0, 'entries':1})
+		cache.clear()
+		self.assertEqual(len(cache), 0)
+	def should_drop_least_recently_used_entries(self):
+		cache = api.ConditionalCache(max_entries=2)
+		cache.store('first', {'ETag':'1'}, b'{}')
+		cache.store('second', {'ETag':'2'}, b'{}')
+		cache.hit('first', cache.lookup('first'))
+		cache.store('third', {'ETag':'3'}, b'{}')
+		self.assertIsNotNone(cache.lookup('first'))
+		self.assertIsNone(cache.lookup('second'))
+		self.assertIsNotNone(cache.lookup('third'))
+	def should_return_new_copy_of_body_for_every_hit(self):
+		cache = api.ConditionalCache()
+		cache.store('user', {'ETag':'1'}, b'{"data": {"name": "JC Denton"}}')
+		first = cache.hit('user', cache.lookup('user'))
+		first['data']['name'] = 'Modified locally'
+		second = cache.hit('user', cache.lookup('user'))
+		self.assertEqual(second, {'data':{'name':'JC Denton'}})
+		self.assertIsNot(first, second)
+
+class TestJSONArrayParser(unittest.TestCase):
+	def _parse(self, document, chunk_size, field='data'):
+		parser = api.JSONArrayParser(field)
+		data = document.encode('utf-8')
+		items = []
+		for start in range(0, len(data), chunk_size):
+			items.append(parser.feed(data[start:start + chunk_size]))
+		items.append(parser.close())
+		return parser, items
+	def should_decode_array_elements_incrementally(self):
+		document = '{"success": true, "data": [{"id": "first", "name": "Ñåðã"}, 12345, [1, 2], "last"], "appVersion": "5.0.0"}'
+		for chunk_size in range(1, len(document) + 1):
+			parser, batches = self._parse(document, chunk_size)
+			self.assertEqual(sum(batches, []), [{'id':'first', 'name':'Ñåðã'}, 12345, [1, 2], 'last'], chunk_size)
+			self.assertEqual(parser.rest, {'success':True, 'appVersion':'5.0.0'})
+		parser, batches = self._parse(document, 16)
+		self.assertEqual(batches[:4], [[], [], [], [{'id':'first', 'name':'Ñåðã'}]])
+	def should_decode_top_level_arrays_and_empty_documents(self):
+		self.assertEqual(sum(self._parse(' [ 1 , 2.5e3 ,null ] ', 3, field=None)[1], []), [1, 2500.0, None])
+		self.assertEqual(sum(self._parse('[]', 1, field=None)[1], []), [])
+		parser, batches = self._parse('{"data": [], "notifications": []}', 5)
+		self.assertEqual(sum(batches, []), [])
+		self.assertEqual(parser.rest, {'notifications':[]})
+		parser, batches = self._parse('{}', 1)
+		self.assertEqual(sum(batches, []), [])
+	def should_fail_on_malformed_documents(self):
+		for document in ['{"data": [1, 2', '{"data": {"key": 1}}', '[1 2]', '{"data": [1]} []', '{"data": [1,, 2]}', '{"data" 1}']:
+			with self.assertRaises(ValueError, msg=document):
+				self._parse(document, 4, field='data' if document.startswith('{') else None)
+
 class MockRequestSession:
 	class Response:
 		def __init__(self, status_code=None, reason=None, content=None):
 			self.status_code = status_code
 			self.reason = reason
-			self.content = content
+			self._data = content
+			self.content = None if content is None else json.dumps(content).encode('utf-8')
 		def json(self):
-			return self.content
+			return self._data
 		def raise_for_status(self):
 			pass
+		def iter_content(self, chunk_size):
+			data = json.dumps(self._data).encode('utf-8')
+			for start in range(0, len(data), chunk_size):
+				yield data[start:start + chunk_size]
+		def close(self):
+			self.closed = True
 
 	def __init__(self, response):
 		self._response = response
 		self._raises = []
+		self.created = 0
+		self.mounted = {}
+		self.closed = False
 	def raises(self, *exc_objects):
 		self._raises = exc_objects
-	def mount(self, *args, **kwargs): pass
+	def mount(self, prefix, adapter):
+		self.mounted[prefix] = adapter
+	def close(self):
+		self.closed = True
 	def _actual_call(self, method, args, kwargs):
 		self._request = (method, args, kwargs)
 		if self._raises:
@@ -131,6 +403,7 @@ class MockRequestSession:
 	def get(self, *args, **kwargs):
 		return self._actual_call('get', args, kwargs)
 	def __call__(self, *args, **kwargs):
+		self.created += 1
 		return self
 
 class MockDelay:
@@ -142,11 +415,20 @@ class MockDelay:
 	def wait_for(self, method):
 		self.waited_for.append(method)
 		self.updated = False
-	def update(self):
+	def delay_for(self, method):
+		self.wait_for(method)
+		return 0
+	def update(self, headers=None):
 		self.updated = True
 
+class MockRetryPolicy(api.RetryPolicy):
+	BACKOFF = 0 # No actual sleeps between retries.
+
 class MockAPI(api.API):
 	Delay = MockDelay
+	RetryPolicy = MockRetryPolicy
+	def _rate_limit_state_file(self):
+		return None
 
 class TestAPI(unittest.TestCase):
 	def should_fill_request_headers(self):
@@ -170,6 +452,39 @@ class TestAPI(unittest.TestCase):
 			self.assertEqual(mock_session._request[0], 'post')
 			self.assertEqual(obj._delay.waited_for, ['post'])
 			self.assertTrue(obj._delay.updated)
+	def should_stream_array_elements_of_response(self):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		obj.STREAM_CHUNK_SIZE = 7
+		response = MockRequestSession.Response(
+			status_code=200,
+			content={'success':True, 'data':[{'id':'first'}, {'id':'second'}], 'appVersion':'5.0.0'},
+			)
+		mock_session = MockRequestSession(response)
+		with unittest.mock.patch('requests.Session', mock_session):
+			items = obj.get('groups', 'party', 'members', includeTasks=True, _stream=True)
+			self.assertFalse(hasattr(mock_session, '_request'))
+			self.assertEqual(next(items), {'id':'first'})
+			self.assertEqual(mock_session._request[2]['stream'], True)
+			self.assertEqual(mock_session._request[2]['params'], {'includeTasks':True})
+			self.assertIsNone(obj.app_version)
+			self.assertFalse(getattr(response, 'closed', False))
+			self.assertEqual(list(items), [{'id':'second'}])
+			self.assertTrue(response.closed)
+			self.assertEqual(obj.app_version, '5.0.0')
+	def should_close_streamed_response_when_iteration_is_abandoned(self):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		response = MockRequestSession.Response(
+			status_code=200,
+			content={'success':True, 'data':[{'id':'first'}, {'id':'second'}]},
+			)
+		mock_session = MockRequestSession(response)
+		with unittest.mock.patch('requests.Session', mock_session):
+			obj.get('groups', 'party', 'members', _stream=True).close()
+			self.assertFalse(hasattr(mock_session, '_request'))
+			items = obj.get('groups', 'party', 'members', _stream=True)
+			self.assertEqual(next(items), {'id':'first'})
+			items.close()
+			self.assertTrue(response.closed)
 	def should_post_request(self):
 		obj = MockAPI('http://localhost/', 'login', 'password', batch_mode=False)
 		mock_session = MockRequestSession(MockRequestSession.Response(
@@ -233,9 +548,9 @@ class TestAPI(unittest.TestCase):
 				requests.exceptions.ConnectionError(),
 				)
 		with unittest.mock.patch('requests.Session', mock_session):
-			response = obj.post('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
+			response = obj.put('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
 			self.assertEqual(response, {'data':'test'})
-			self.assertEqual(mock_session._request[0], 'post')
+			self.assertEqual(mock_session._request[0], 'put')
 			self.assertEqual(mock_session._request[1], ('http://localhost/api/v3/path/to/request',))
 			self.assertEqual(json.loads(mock_session._request[2]['data']), {'request':'value'})
 			self.assertEqual(mock_session._request[2]['params'], {'query1':'param1', 'query2':'param2'})
@@ -257,9 +572,9 @@ class TestAPI(unittest.TestCase):
 				)
 		with unittest.mock.patch('requests.Session', mock_session):
 			with self.assertRaises(requests.exceptions.ReadTimeout):
-				response = obj.post('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
+				response = obj.put('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
 			with self.assertRaises(requests.exceptions.ConnectionError):
-				response = obj.post('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
+				response = obj.put('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
 	def should_raise_on_http_errors(self):
 		obj = MockAPI('http://localhost/', 'login', 'password')
 		mock_session = MockRequestSession(MockRequestSession.Response(
@@ -292,9 +607,9 @@ class TestAPI(unittest.TestCase):
 				)
 		with unittest.mock.patch('requests.Session', mock_session):
 			with self.assertRaises(requests.exceptions.HTTPError):
-				response = obj.post('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
+				response = obj.put('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
 
-			response = obj.post('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
+			response = obj.put('path', 'to', 'request', query1='param1', query2='param2', _body={'request':'value'})
 			self.assertEqual(response, {'data':'test'})
 	def should_make_v4_calls(self):
 		obj = MockAPI('http://localhost/', 'login', 'password', batch_mode=False)
@@ -309,3 +624,772 @@ class TestAPI(unittest.TestCase):
 			self.assertEqual(mock_session._request[1], ('http://localhost/api/v4/path/to/request',))
 			self.assertEqual(json.loads(mock_session._request[2]['data']), {'request':'value'})
 			self.assertEqual(mock_session._request[2]['params'], {'query1':'param1', 'query2':'param2'})
+	def should_reuse_single_session_for_all_calls(self):
+		obj = MockAPI('http://localhost/', 'login', 'password', pool_maxsize=4, pool_block=True)
+		mock_session = MockRequestSession(MockRequestSession.Response(
+			status_code=200,
+			content={'data':'test'},
+			))
+		with unittest.mock.patch('requests.Session', mock_session):
+			obj.get('path')
+			obj.v4.post('path')
+			obj.put('path')
+			self.assertEqual(mock_session.created, 1)
+			adapter = mock_session.mounted['https://']
+			self.assertIs(mock_session.mounted['http://'], adapter)
+			self.assertEqual(adapter._pool_maxsize, 4)
+			self.assertTrue(adapter._pool_block)
+	def should_close_session_and_reopen_it_on_demand(self):
+		mock_session = MockRequestSession(MockRequestSession.Response(
+			status_code=200,
+			content={'data':'test'},
+			))
+		with unittest.mock.patch('requests.Session', mock_session):
+			with MockAPI('http://localhost/', 'login', 'password') as obj:
+				obj.get('path')
+				self.assertFalse(mock_session.closed)
+			self.assertTrue(mock_session.closed)
+			obj.get('path')
+			self.assertEqual(mock_session.created, 2)
+	def should_pass_rate_limit_headers_to_limiter(self):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		obj._delay = api.RateLimiter(limit=30, period=60)
+		response = MockRequestSession.Response(
+			status_code=200,
+			content={'data':'test'},
+			)
+		response.headers = {'X-RateLimit-Remaining':'0', 'X-RateLimit-Reset':'10'}
+		with unittest.mock.patch('requests.Session', MockRequestSession(response)):
+			with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+				obj.get('path')
+				self.assertEqual(obj._delay.delay_for('get'), 10)
+	def should_coalesce_identical_get_requests(self):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		mock_session = MockRequestSession(MockRequestSession.Response(
+			status_code=200,
+			content={'data':'test'},
+			))
+		calls = []
+		def count_calls(method, args, kwargs, _actual_call=mock_session._actual_call):
+			calls.append((method, args[0], kwargs.get('params')))
+			return _actual_call(method, args, kwargs)
+		mock_session._actual_call = count_calls
+		with unittest.mock.patch('requests.Session', mock_session):
+			first = obj.get('members', 'joegreen', param=1)
+			second = obj.get('members', 'joegreen', param='1')
+			self.assertIs(first, second)
+			obj.get('members', 'joegreen', param=2)
+			obj.post('members', 'joegreen', 'flag')
+			obj.get('members', 'joegreen', param=1)
+		self.assertEqual([method for method, _, _ in calls], ['get', 'get', 'post', 'get'])
+		self.assertEqual(obj._delay.waited_for, ['GET', 'GET', 'POST', 'GET'])
+	def should_coalesce_identical_async_get_requests(self):
+		import asyncio
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				MockClientSession.Response(content={'data':'user'}),
+				MockClientSession.Response(content={'data':'party'}),
+				MockClientSession.Response(content={}),
+				MockClientSession.Response(content={'data':'user'}),
+				]) as obj:
+				results = await asyncio.gather(obj.get('user'), obj.get('groups', 'party'), obj.get('user'))
+				await obj.post('user', 'sleep')
+				await obj.get('user')
+				return obj, results
+		obj, results = asyncio.run(main())
+		self.assertIs(results[0], results[2])
+		self.assertEqual(results[1].data, 'party')
+		self.assertEqual([uri.split('/v3/')[1] for _, uri, _ in obj.mock_session.requests], ['user', 'groups/party', 'user/sleep', 'user'])
+	def should_revalidate_cached_responses(self):
+		obj = MockAPI('http://localhost/', 'login', 'password', coalesce_window=0, conditional_cache=True)
+		response = MockRequestSession.Response(
+			status_code=200,
+			content={'data':'test'},
+			)
+		response.headers = {'ETag':'W/"abc"'}
+		mock_session = MockRequestSession(response)
+		with unittest.mock.patch('requests.Session', mock_session):
+			self.assertEqual(obj.get('user'), {'data':'test'})
+			self.assertNotIn('If-None-Match', mock_session._request[2]['headers'])
+			mock_session._response = MockRequestSession.Response(status_code=304)
+			self.assertEqual(obj.get('user'), {'data':'test'})
+			self.assertEqual(mock_session._request[2]['headers']['If-None-Match'], 'W/"abc"')
+			self.assertNotIn('If-None-Match', obj.headers)
+			mock_session._response = response
+			obj.post('user', 'sleep')
+			self.assertNotIn('If-None-Match', mock_session._request[2]['headers'])
+		self.assertEqual(obj.conditional_cache.stats(), {'hits':1, 'misses':1, 'bytes_saved':len(b'{"data": "test"}'), 'entries':1})
+		self.assertIsNone(MockAPI('http://localhost/', 'login', 'password').conditional_cache)
+	def should_revalidate_cached_async_responses(self):
+		import asyncio
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', coalesce_window=0, conditional_cache=True, _responses=[
+				MockClientSession.Response(content={'data':'user'}, headers={'ETag':'"1"'}),
+				MockClientSession.Response(status=304, reason='Not Modified', content=''),
+				]) as obj:
+				first = await obj.get('user')
+				second = await obj.get('user')
+				return obj, first, second
+		obj, first, second = asyncio.run(main())
+		self.assertEqual(first, second)
+		self.assertNotIn('If-None-Match', obj.mock_session.requests[0][2]['headers'])
+		self.assertEqual(obj.mock_session.requests[1][2]['headers']['If-None-Match'], '"1"')
+		self.assertEqual(obj.conditional_cache.hits, 1)
+		self.assertEqual(obj.conditional_cache.bytes_saved, len(b'{"data": "user"}'))
+	def should_serve_requests_from_response_cache(self):
+		obj = MockAPI('http://localhost/', 'login', 'password', coalesce_window=0, response_cache=cache.ResponseCache())
+		mock_session = MockRequestSession(MockRequestSession.Response(
+			status_code=200,
+			content={'data':{'name':'JC Denton'}, 'appVersion':'5.0.0'},
+			))
+		calls = []
+		def count_calls(method, args, kwargs, _actual_call=mock_session._actual_call):
+			calls.append((method, args[0].split('/v3/')[1]))
+			return _actual_call(method, args, kwargs)
+		mock_session._actual_call = count_calls
+		with unittest.mock.patch('requests.Session', mock_session):
+			self.assertEqual(obj.get('user').data.name, 'JC Denton')
+			self.assertEqual(obj.get('user').data.name, 'JC Denton')
+			obj.get('tasks', 'user')
+			obj.get('members', 'joegreen')
+			obj.post('tasks', '1234', 'score', 'up')
+			obj.get('user')
+			obj.get('tasks', 'user')
+			obj.get('members', 'joegreen')
+			obj.get('status')
+			obj.get('status')
+		self.assertEqual(calls, [
+			('get', 'user'), ('get', 'tasks/user'), ('get', 'members/joegreen'),
+			('post', 'tasks/1234/score/up'),
+			('get', 'user'), ('get', 'tasks/user'),
+			('get', 'status'), ('get', 'status'),
+			])
+		self.assertEqual(obj.app_version, '5.0.0')
+		self.assertEqual(obj.response_cache.version, '5.0.0')
+	def should_not_share_cached_responses_between_logins(self):
+		with tempfile.TemporaryDirectory() as tempdir:
+			mock_session = MockRequestSession(MockRequestSession.Response(
+				status_code=200,
+				content={'data':{'name':'JC Denton'}},
+				))
+			with unittest.mock.patch('requests.Session', mock_session):
+				first = MockAPI('http://localhost/', 'jcdenton', 'password', coalesce_window=0, response_cache=cache.ResponseCache(directory=tempdir))
+				self.assertEqual(first.get('user').data.name, 'JC Denton')
+				mock_session._response = MockRequestSession.Response(
+					status_code=200,
+					content={'data':{'name':'Paul Denton'}},
+					)
+				second = MockAPI('http://localhost/', 'pauldenton', 'password', coalesce_window=0, response_cache=cache.ResponseCache(directory=tempdir))
+				self.assertEqual(second.get('user').data.name, 'Paul Denton')
+				self.assertEqual(first.get('user').data.name, 'JC Denton')
+				self.assertEqual(second.get('user').data.name, 'Paul Denton')
+				restarted = MockAPI('http://localhost/', 'jcdenton', 'password', coalesce_window=0, response_cache=cache.ResponseCache(directory=tempdir))
+				self.assertEqual(restarted.get('user').data.name, 'JC Denton')
+	def should_serve_async_requests_from_response_cache(self):
+		import asyncio
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', coalesce_window=0, response_cache=cache.ResponseCache(), _responses=[
+				MockClientSession.Response(content={'data':'old'}),
+				MockClientSession.Response(content={'data':'new'}),
+				]) as obj:
+				with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+					first = await obj.get('user')
+					get_time.return_value = 1040
+					second = await obj.get('user')
+					await asyncio.gather(*obj._refresh_tasks.values())
+					third = await obj.get('user')
+				return first, second, third
+		first, second, third = asyncio.run(main())
+		self.assertEqual((first.data, second.data, third.data), ('old', 'old', 'new'))
+	def should_close_connections_without_keep_alive(self):
+		obj = MockAPI('http://localhost/', 'login', 'password', keep_alive=False)
+		self.assertEqual(obj.headers['connection'], 'close')
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		self.assertNotIn('connection', obj.headers)
+
+def http_error(status_code, headers=None):
+	response = requests.Response()
+	response.status_code = status_code
+	response.headers.update(headers or {})
+	return requests.exceptions.HTTPError(response=response)
+
+class TestRetryPolicy(unittest.TestCase):
+	def should_use_exponential_backoff_with_jitter(self):
+		policy = api.RetryPolicy(max_attempts=6, deadline=None, backoff=1, max_backoff=5, jitter=0.5, random=lambda: 1.0)
+		error = requests.exceptions.ConnectionError()
+		self.assertEqual([policy.next_delay(attempt, error, 0) for attempt in range(1, 7)], [0.5, 1, 2, 2.5, 2.5, None])
+		policy = api.RetryPolicy(backoff=1, random=lambda: 0.0)
+		self.assertEqual(policy.next_delay(2, requests.exceptions.ReadTimeout(), 0), 2)
+		self.assertEqual(policy.stats(), {'retries':1, 'gave_up':0, 'waited':2})
+	def should_retry_only_temporary_errors(self):
+		policy = api.RetryPolicy(jitter=0)
+		self.assertEqual(policy.next_delay(1, http_error(502), 0), policy.BACKOFF)
+		self.assertEqual(policy.next_delay(1, http_error(503), 0), policy.BACKOFF)
+		self.assertIsNone(policy.next_delay(1, http_error(500), 0))
+		self.assertIsNone(policy.next_delay(1, http_error(404), 0))
+		self.assertIsNone(policy.next_delay(1, api.CircuitOpenError(), 0))
+		self.assertIsNone(policy.next_delay(1, ValueError(), 0))
+		self.assertEqual(policy.stats()['gave_up'], 0)
+	def should_retry_non_idempotent_requests_only_if_they_were_not_processed(self):
+		policy = api.RetryPolicy(jitter=0)
+		refused = requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, '/', reason=urllib3.exceptions.NewConnectionError(None, 'Connection refused')))
+		self.assertEqual(policy.next_delay(1, requests.exceptions.ConnectTimeout(), 0, 'POST'), policy.BACKOFF)
+		self.assertEqual(policy.next_delay(1, refused, 0, 'POST'), policy.BACKOFF)
+		self.assertEqual(policy.next_delay(1, http_error(429), 0, 'POST'), policy.BACKOFF)
+		self.assertEqual(policy.next_delay(1, http_error(503, {'Retry-After':'1'}), 0, 'POST'), 1)
+		self.assertIsNone(policy.next_delay(1, http_error(503), 0, 'POST'))
+		self.assertIsNone(policy.next_delay(1, http_error(502), 0, 'POST'))
+		self.assertIsNone(policy.next_delay(1, http_error(504), 0, 'POST'))
+		self.assertIsNone(policy.next_delay(1, requests.exceptions.ReadTimeout(), 0, 'POST'))
+		self.assertIsNone(policy.next_delay(1, requests.exceptions.ConnectionError(), 0, 'DELETE'))
+		self.assertEqual(policy.next_delay(1, requests.exceptions.ReadTimeout(), 0, 'PUT'), policy.BACKOFF)
+	def should_not_retry_scoring_that_may_have_been_processed(self):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		mock_session.raises(http_error(502), requests.exceptions.ReadTimeout())
+		with unittest.mock.patch('requests.Session', mock_session):
+			with self.assertRaises(requests.exceptions.HTTPError):
+				obj.post('tasks', 'armory', 'score', 'up')
+			with self.assertRaises(requests.exceptions.ReadTimeout):
+				obj.post('tasks', 'armory', 'score', 'up')
+			self.assertEqual(obj.post('tasks', 'armory', 'score', 'up'), {'data':'test'})
+		self.assertEqual(obj.retry_policy.stats()['retries'], 0)
+	def should_respect_retry_after_and_deadline(self):
+		policy = api.RetryPolicy(deadline=30)
+		self.assertEqual(policy.next_delay(1, http_error(429, {'Retry-After':'7'}), 0), 7)
+		self.assertIsNone(policy.next_delay(2, http_error(429, {'Retry-After':'7'}), 25))
+		with unittest.mock.patch('time.time', return_value=1445412480):
+			self.assertEqual(policy.next_delay(1, http_error(503, {'Retry-After':'Wed, 21 Oct 2015 07:28:10 GMT'}), 0), 10)
+			self.assertEqual(policy.next_delay(1, http_error(503, {'Retry-After':'Wed, 21 Oct 2015 07:27:00 GMT'}), 0), 0)
+		self.assertEqual(policy.stats(), {'retries':3, 'gave_up':1, 'waited':17})
+
+class TestCircuitBreaker(unittest.TestCase):
+	def should_open_after_consecutive_failures_and_recover(self):
+		breaker = api.CircuitBreaker('localhost', threshold=2, reset_timeout=30)
+		with unittest.mock.patch('time.monotonic', return_value=1000) as now:
+			breaker.before_call()
+			breaker.after_call(requests.exceptions.ConnectionError())
+			breaker.after_call()
+			breaker.after_call(http_error(502))
+			breaker.after_call(http_error(404))
+			self.assertEqual(breaker.state, breaker.CLOSED)
+			breaker.after_call(requests.exceptions.ReadTimeout())
+			breaker.after_call(http_error(503))
+			self.assertEqual(breaker.state, breaker.OPEN)
+			with self.assertRaises(api.CircuitOpenError) as e:
+				breaker.before_call()
+			self.assertEqual(str(e.exception), 'Circuit breaker for localhost is open, server seems to be down. Retry in 30s.')
+			now.return_value = 1030
+			breaker.before_call()
+			self.assertEqual(breaker.state, breaker.HALF_OPEN)
+			with self.assertRaises(api.CircuitOpenError):
+				breaker.before_call() # Only single trial call.
+			breaker.after_call(requests.exceptions.ConnectionError())
+			self.assertEqual(breaker.state, breaker.OPEN)
+			self.assertEqual(breaker.stats(), {'state':'open', 'failures':3, 'opened':2, 'rejected':2})
+			now.return_value = 1060
+			breaker.before_call()
+			breaker.after_call()
+			breaker.before_call()
+			self.assertEqual(breaker.stats(), {'state':'closed', 'failures':0, 'opened':2, 'rejected':2})
+	def should_keep_separate_breakers_for_hosts(self):
+		breakers = api.CircuitBreakers(threshold=1)
+		breakers.get('http://localhost/api/v3/user').after_call(requests.exceptions.ConnectionError())
+		self.assertIs(breakers.get('http://localhost/api/v4/news'), breakers.get('http://localhost/api/v3/user'))
+		breakers.get('https://habitica.com/api/v3/user').after_call()
+		self.assertEqual({host:stats['state'] for host, stats in breakers.stats().items()}, {
+			'localhost':'open',
+			'habitica.com':'closed',
+			})
+
+class TestRetries(unittest.TestCase):
+	def should_wait_between_retries(self):
+		spans = []
+		obj = MockAPI('http://localhost/', 'login', 'password', retry_policy=api.RetryPolicy(backoff=1, jitter=0))
+		obj.instrumentation.subscribe(spans.append)
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		mock_session.raises(
+				requests.exceptions.ConnectionError(),
+				http_error(503, {'Retry-After':'5'}),
+				requests.exceptions.ReadTimeout(),
+				)
+		with unittest.mock.patch('requests.Session', mock_session):
+			with unittest.mock.patch('time.sleep') as sleep:
+				self.assertEqual(obj.get('path'), {'data':'test'})
+		self.assertEqual([call.args[0] for call in sleep.call_args_list], [1, 5, 4])
+		self.assertEqual(spans[0].attempts, 4)
+		self.assertGreater(spans[0].timings['backoff'], 0)
+		self.assertEqual(obj.retry_policy.stats(), {'retries':3, 'gave_up':0, 'waited':10})
+		self.assertEqual(mock_session.mounted['http://'].max_retries.total, 0)
+	def should_fail_fast_while_server_is_down(self):
+		obj = MockAPI('http://localhost/', 'login', 'password', circuit_breakers=api.CircuitBreakers(threshold=2))
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		mock_session.raises(*([requests.exceptions.ConnectionError()] * 8))
+		with unittest.mock.patch('requests.Session', mock_session):
+			for _ in range(2):
+				with self.assertRaises(requests.exceptions.ConnectionError):
+					obj.get('path')
+			mock_session._request = None
+			with self.assertRaises(api.CircuitOpenError):
+				obj.get('path')
+			self.assertIsNone(mock_session._request)
+		self.assertEqual(obj.circuit_breakers.stats(), {'localhost':{'state':'open', 'failures':2, 'opened':1, 'rejected':1}})
+		self.assertEqual(obj.retry_policy.stats(), {'retries':6, 'gave_up':2, 'waited':0})
+	def should_wait_between_async_retries(self):
+		import asyncio
+		delays = []
+		async def mock_sleep(delay):
+			delays.append(delay)
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				MockClientSession.Response(status=429, reason='Too Many Requests', content={}, headers={'Retry-After':'3'}),
+				MockClientSession.Response(content={'data':'test'}),
+				], retry_policy=api.RetryPolicy()) as obj:
+				with unittest.mock.patch('asyncio.sleep', mock_sleep):
+					return await obj.get('path')
+		self.assertEqual(asyncio.run(main()).data, 'test')
+		self.assertEqual(delays, [3])
+
+class TestInstrumentation(unittest.TestCase):
+	def _api(self, *subscribers):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		for subscriber, payload in subscribers:
+			obj.instrumentation.subscribe(subscriber, payload=payload)
+		return obj
+	def should_not_measure_anything_without_subscribers(self):
+		obj = self._api()
+		self.assertIs(obj.instrumentation.start('GET', 'http://localhost/'), api.Instrumentation.NULL_SPAN)
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		with unittest.mock.patch('requests.Session', mock_session):
+			with unittest.mock.patch.object(api.LazyJSON, '__str__') as render:
+				self.assertEqual(obj.post('path', _body={'request':'value'}), {'data':'test'})
+		render.assert_not_called()
+		self.assertEqual(str(api.LazyJSON({'b':1, 'a':[2]})), '{\n  "a": [\n    2\n  ],\n  "b": 1\n}')
+	def should_pass_call_spans_to_subscribers(self):
+		spans, payload_spans = [], []
+		obj = self._api((spans.append, False))
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, reason='OK', content={'data':'test'}))
+		with unittest.mock.patch('requests.Session', mock_session):
+			obj.get('path', 'to', 'request')
+			obj.instrumentation.subscribe(payload_spans.append, payload=True)
+			mock_session.raises(requests.exceptions.ConnectTimeout())
+			obj.post('path', _body={'request':'value'})
+		self.assertEqual(len(spans), 2)
+		span = spans[0]
+		self.assertEqual((span.method, span.uri, span.status, span.reason), ('GET', 'http://localhost/api/v3/path/to/request', 200, 'OK'))
+		self.assertEqual((span.attempts, span.request_bytes, span.response_bytes), (1, 0, 16))
+		self.assertEqual(sorted(span.timings), sorted(api.CallSpan.PHASES))
+		self.assertAlmostEqual(span.total, sum(span.timings.values()))
+		self.assertIsNone(span.response)
+		self.assertTrue(repr(span).startswith('GET http://localhost/api/v3/path/to/request 200: queue='))
+		self.assertEqual(payload_spans, spans[1:])
+		span = spans[1]
+		self.assertEqual((span.method, span.attempts, span.request_bytes), ('POST', 2, 2 * len('{"request": "value"}')))
+		self.assertEqual(span.request_body, {'request':'value'})
+		self.assertEqual(span.response, {'data':'test'})
+		self.assertIsNone(span.error)
+	def should_report_failed_calls_and_ignore_broken_subscribers(self):
+		spans = []
+		def broken_subscriber(span):
+			raise RuntimeError('Broken subscriber')
+		obj = self._api((spans.append, True), (broken_subscriber, False))
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		mock_session.raises(*([requests.exceptions.ConnectionError()] * 5))
+		with unittest.mock.patch('requests.Session', mock_session):
+			with self.assertLogs('habitica', level='ERROR'):
+				with self.assertRaises(requests.exceptions.ConnectionError):
+					obj.get('path')
+			obj.instrumentation.unsubscribe(broken_subscriber)
+			obj.instrumentation.unsubscribe(spans.append)
+			obj.get('path')
+		self.assertEqual(len(spans), 1)
+		self.assertEqual(spans[0].attempts, api.RetryPolicy.MAX_ATTEMPTS)
+		self.assertTrue(isinstance(spans[0].error, requests.exceptions.ConnectionError))
+		self.assertIsNone(spans[0].status)
+		self.assertIs(obj.instrumentation.start('GET', 'path'), api.Instrumentation.NULL_SPAN)
+	def should_measure_rate_limit_sleep(self):
+		spans = []
+		obj = self._api((spans.append, False))
+		obj._delay.delay_for = lambda method: 0.5
+		mock_session = MockRequestSession(MockRequestSession.Response(status_code=200, content={'data':'test'}))
+		with unittest.mock.patch('requests.Session', mock_session):
+			with unittest.mock.patch('time.sleep') as sleep:
+				obj.get('path')
+		sleep.assert_called_once_with(0.5)
+		self.assertEqual(len(spans), 1)
+	def should_pass_async_call_spans_to_subscribers(self):
+		import asyncio
+		spans = []
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				MockClientSession.Response(content={'data':'test'}),
+				MockClientSession.Response(content={'data':'v4'}),
+				]) as obj:
+				obj._delay.delay_for = lambda method: 0.001
+				obj.instrumentation.subscribe(spans.append, payload=True)
+				await obj.get('path')
+				await obj.post('path', _body={'request':'value'})
+		asyncio.run(main())
+		self.assertEqual([(span.method, span.status, span.attempts) for span in spans], [('GET', 200, 1), ('POST', 200, 1)])
+		self.assertEqual(spans[0].response, {'data':'test'})
+		self.assertEqual(spans[0].response_bytes, len(json.dumps({'data':'test'})))
+		self.assertEqual(spans[1].request_body, {'request':'value'})
+		self.assertGreater(spans[1].timings['rate_limit'], 0)
+
+class TestCached(unittest.TestCase):
+	def setUp(self):
+		import tempfile
+		self.tempdir = tempfile.TemporaryDirectory()
+		patcher = unittest.mock.patch('habitica.config.get_cache_dir', unittest.mock.MagicMock(return_value=self.tempdir.name))
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.addCleanup(self.tempdir.cleanup)
+		self.calls = []
+	def _session(self, *responses):
+		responses = list(responses)
+		mock_session = MockRequestSession(None)
+		def respond(method, args, kwargs):
+			self.calls.append(args[0].split('/v3/')[1])
+			mock_session._response = responses.pop(0)
+			if isinstance(mock_session._response, Exception):
+				raise mock_session._response
+			return mock_session._response
+		mock_session._actual_call = respond
+		return mock_session
+	def _response(self, data, version):
+		return MockRequestSession.Response(status_code=200, content={'data':data, 'appVersion':version})
+	def _get_content(self, mock_session, max_age=None, fetch_user=False):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		with unittest.mock.patch('requests.Session', mock_session):
+			if fetch_user:
+				obj.get('user')
+			return obj.cached('content', max_age=max_age).get('content').data
+	def should_keep_content_until_server_version_changes(self):
+		self.assertEqual(self._get_content(self._session(self._response('content v1', '5.0.0'))), 'content v1')
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=10**10)):
+			self.assertEqual(self._get_content(self._session(self._response('user', '5.0.0')), fetch_user=True), 'content v1')
+		self.assertEqual(self._get_content(self._session(
+			self._response('user', '5.0.1'),
+			self._response('content v2', '5.0.1'),
+			), fetch_user=True), 'content v2')
+		self.assertEqual(self.calls, ['content', 'user', 'user', 'content'])
+		self.assertEqual(json.loads((Path(self.tempdir.name)/'content.cache.meta.json').read_text())['version'], '5.0.1')
+	def should_fall_back_to_max_age_when_version_is_unknown(self):
+		self.assertEqual(self._get_content(self._session(self._response('content v1', None))), 'content v1')
+		self.assertEqual(self._get_content(self._session(), max_age=60), 'content v1')
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=10**10)):
+			self.assertEqual(self._get_content(self._session(self._response('content v2', None)), max_age=60), 'content v2')
+		self.assertEqual(self.calls, ['content', 'content'])
+	def should_fall_back_to_max_age_until_server_version_is_received(self):
+		self.assertEqual(self._get_content(self._session(self._response('content v1', '5.0.0'))), 'content v1')
+		self.assertEqual(self._get_content(self._session(), max_age=60), 'content v1')
+		(Path(self.tempdir.name)/'content.cache.meta.json').write_text('invalid')
+		self.assertEqual(self._get_content(self._session()), 'content v1')
+		self.assertEqual(self.calls, ['content'])
+		(Path(self.tempdir.name)/'content.cache.meta.json').write_text(json.dumps({'version':'5.0.0', 'stored':1000}))
+		self.assertEqual(self._get_content(self._session(self._response('content v2', '5.0.0')), max_age=60), 'content v2')
+		self.assertEqual(self.calls, ['content', 'content'])
+	def should_load_content_from_binary_snapshot(self):
+		self._get_content(self._session(self._response({'potion':{'value':25}}, '5.0.0')))
+		cache_file = Path(self.tempdir.name)/'content.cache.json'
+		snapshot_file = Path(self.tempdir.name)/'content.cache.marshal'
+		self.assertTrue(snapshot_file.read_bytes().startswith(api.API.Cached.snapshot_header(cache_file.stat())))
+		json_stat = cache_file.stat()
+		cache_file.write_text(' ' * json_stat.st_size)
+		os.utime(str(cache_file), ns=(json_stat.st_atime_ns, json_stat.st_mtime_ns))
+		self.assertEqual(self._get_content(self._session()), {'potion':{'value':25}})
+	def should_rebuild_outdated_snapshot_from_json(self):
+		self._get_content(self._session(self._response({'potion':{'value':25}}, '5.0.0')))
+		cache_file = Path(self.tempdir.name)/'content.cache.json'
+		snapshot_file = Path(self.tempdir.name)/'content.cache.marshal'
+		json_stat = cache_file.stat()
+		cache_file.write_text(json.dumps({'data':{'potion':{'value':50}}, 'appVersion':'5.0.0'}))
+		os.utime(str(cache_file), ns=(json_stat.st_atime_ns, json_stat.st_mtime_ns + 1))
+		self.assertEqual(self._get_content(self._session()), {'potion':{'value':50}})
+		self.assertTrue(snapshot_file.read_bytes().startswith(api.API.Cached.snapshot_header(cache_file.stat())))
+		snapshot_file.write_bytes(api.API.Cached.snapshot_header(cache_file.stat()) + b'corrupted')
+		self.assertEqual(self._get_content(self._session()), {'potion':{'value':50}})
+		snapshot_file.unlink()
+		self.assertEqual(self._get_content(self._session()), {'potion':{'value':50}})
+		self.assertTrue(snapshot_file.exists())
+	def _get_sharded_content(self, mock_session, fetch_user=False):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		with unittest.mock.patch('requests.Session', mock_session):
+			if fetch_user:
+				obj.get('user')
+			return obj.cached('content').get_sharded('content')
+	def should_load_content_collections_lazily(self):
+		content = {'gear':{'flat':{'armor':{}}}, 'spells':{'rogue':{}}, 'potion':{'value':25}}
+		self.assertEqual(self._get_sharded_content(self._session(self._response(content, '5.0.0'))), content)
+		shards_dir = Path(self.tempdir.name)/'content.cache.shards'
+		self.assertEqual(sorted(path.name for path in shards_dir.iterdir()), ['gear.marshal', 'index.marshal', 'potion.marshal', 'spells.marshal'])
+		data = self._get_sharded_content(self._session())
+		self.assertTrue(isinstance(data, api.ShardedData))
+		self.assertEqual(sorted(data.keys()), ['gear', 'potion', 'spells'])
+		self.assertEqual(data['potion'], {'value':25})
+		self.assertEqual(list(data._loaded), ['potion'])
+		self.assertEqual(data['potion'], {'value':25})
+		self.assertNotIn('food', data)
+		with self.assertRaises(KeyError):
+			data['food']
+		(shards_dir/'spells.marshal').write_bytes(b'corrupted')
+		self.assertEqual(data['spells'], {'rogue':{}})
+		self.assertEqual(sorted(data._loaded), ['gear', 'potion', 'spells'])
+		self.assertEqual(len(data), 3)
+	def should_rebuild_outdated_shards(self):
+		self._get_sharded_content(self._session(self._response({'potion':{'value':25}}, '5.0.0')))
+		cache_file = Path(self.tempdir.name)/'content.cache.json'
+		json_stat = cache_file.stat()
+		cache_file.write_text(json.dumps({'data':{'potion':{'value':50}}, 'appVersion':'5.0.0'}))
+		os.utime(str(cache_file), ns=(json_stat.st_atime_ns, json_stat.st_mtime_ns + 1))
+		data = self._get_sharded_content(self._session())
+		self.assertEqual(data, {'potion':{'value':50}})
+		data = self._get_sharded_content(self._session())
+		self.assertTrue(isinstance(data, api.ShardedData))
+		self.assertEqual(data['potion'], {'value':50})
+		self.assertEqual(self._get_sharded_content(self._session(
+			self._response('user', '5.0.1'),
+			self._response({'potion':{'value':75}}, '5.0.1'),
+			), fetch_user=True), {'potion':{'value':75}})
+
+	def _get_mapped_content(self, mock_session):
+		obj = MockAPI('http://localhost/', 'login', 'password')
+		with unittest.mock.patch('requests.Session', mock_session):
+			return obj.cached('content').get_mapped('content')
+	def should_map_content_into_memory(self):
+		content = {
+				'gear':{'flat':{'armor_{0}'.format(index):{'key':'armor_{0}'.format(index)} for index in range(10)}},
+				'spells':{'rogue':{'stealth':{'mana':45}}},
+				'potion':{'value':25},
+				'cardTypes':['greeting', 'thankyou'],
+				}
+		self.assertEqual(self._get_mapped_content(self._session(self._response(content, '5.0.0'))), content)
+		self.assertTrue((Path(self.tempdir.name)/'content.cache.pack').exists())
+		with unittest.mock.patch.object(api.MappedData, 'MIN_NODE_SIZE', 100):
+			self.assertEqual(self._get_mapped_content(self._session()), content)
+			(Path(self.tempdir.name)/'content.cache.pack').unlink()
+			self._get_mapped_content(self._session())
+		data = self._get_mapped_content(self._session())
+		self.assertTrue(isinstance(data, api.MappedData))
+		self.assertEqual(sorted(data), ['cardTypes', 'gear', 'potion', 'spells'])
+		self.assertEqual(len(data), 4)
+		self.assertIn('spells', data)
+		self.assertNotIn('food', data)
+		with self.assertRaises(KeyError):
+			data['food']
+		self.assertEqual(data['potion'], {'value':25})
+		self.assertEqual(list(data._loaded), ['potion'])
+		self.assertTrue(isinstance(data['gear'], api.MappedData))
+		self.assertTrue(isinstance(data['gear']['flat'], api.MappedData))
+		self.assertEqual(data['gear']['flat']['armor_1'], {'key':'armor_1'})
+		self.assertEqual(list(data['gear']['flat']._loaded), ['armor_1'])
+		self.assertEqual(data['spells'], {'rogue':{'stealth':{'mana':45}}})
+		self.assertTrue(type(data['spells']) is dict)
+		self.assertEqual(data['cardTypes'], ['greeting', 'thankyou'])
+	def should_rebuild_outdated_or_broken_pack_file(self):
+		self._get_mapped_content(self._session(self._response({'potion':{'value':25}}, '5.0.0')))
+		cache_file = Path(self.tempdir.name)/'content.cache.json'
+		pack_file = Path(self.tempdir.name)/'content.cache.pack'
+		mapped = self._get_mapped_content(self._session())
+		json_stat = cache_file.stat()
+		cache_file.write_text(json.dumps({'data':{'potion':{'value':50}}, 'appVersion':'5.0.0'}))
+		os.utime(str(cache_file), ns=(json_stat.st_atime_ns, json_stat.st_mtime_ns + 1))
+		self.assertEqual(self._get_mapped_content(self._session()), {'potion':{'value':50}})
+		self.assertEqual(mapped['potion'], {'value':25}) # Already mapped data is not affected.
+		self.assertEqual(self._get_mapped_content(self._session())['potion'], {'value':50})
+		header = api.API.Cached.snapshot_header(cache_file.stat())
+		for broken in [b'', header, header + api.MappedData.ROOT.pack(10**6, 10)]:
+			pack_file.write_bytes(broken)
+			self.assertEqual(self._get_mapped_content(self._session()), {'potion':{'value':50}})
+		content = pack_file.read_bytes()
+		pack_file.write_bytes(content.replace(api.marshal.dumps({'value':50}), b'\xff' * len(api.marshal.dumps({'value':50}))))
+		data = self._get_mapped_content(self._session())
+		self.assertTrue(isinstance(data, api.MappedData))
+		self.assertEqual(data['potion'], {'value':50})
+		with unittest.mock.patch('builtins.open', side_effect=PermissionError('Access denied')):
+			self.assertIsNone(api.MappedData.open(pack_file, header, None))
+
+	def should_load_lazy_content_asynchronously(self):
+		import asyncio
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				MockClientSession.Response(content={'data':{'potion':{'value':25}}, 'appVersion':'5.0.0'}),
+				]) as obj:
+				fetched = await obj.cached('content').get_mapped('content')
+				mapped = await obj.cached('content').get_mapped('content')
+				sharded = await obj.cached('content').get_sharded('content')
+				return fetched, mapped, sharded
+		fetched, mapped, sharded = asyncio.run(main())
+		self.assertEqual(fetched, {'potion':{'value':25}})
+		self.assertTrue(isinstance(mapped, api.MappedData))
+		self.assertEqual(mapped['potion'], {'value':25})
+		self.assertEqual(sharded['potion'], {'value':25})
+
+class MockClientSession:
+	""" Mock for aiohttp.ClientSession. """
+	class StreamReader:
+		def __init__(self, data):
+			self.data = data
+		async def iter_chunked(self, chunk_size):
+			for start in range(0, len(self.data), chunk_size):
+				yield self.data[start:start + chunk_size]
+	class Response:
+		def __init__(self, status=200, reason='OK', content=None, headers=None):
+			self.status = status
+			self.reason = reason
+			self.content = MockClientSession.StreamReader(json.dumps(content).encode('utf-8'))
+			self.headers = headers or {}
+			self.exited = False
+		async def __aenter__(self):
+			return self
+		async def __aexit__(self, *args):
+			self.exited = True
+		async def read(self):
+			return self.content.data
+	def __init__(self, *responses):
+		self.responses = list(responses)
+		self.requests = []
+		self.closed = False
+	def request(self, method, uri, **kwargs):
+		self.requests.append((method, uri, kwargs))
+		response = self.responses.pop(0)
+		if isinstance(response, Exception):
+			raise response
+		return response
+	async def close(self):
+		self.closed = True
+
+class MockAsyncAPI(api.AsyncAPI):
+	Delay = MockDelay
+	RetryPolicy = MockRetryPolicy
+	def _rate_limit_state_file(self):
+		return None
+	def __init__(self, *args, _responses=(), **kwargs):
+		super().__init__(*args, **kwargs)
+		self.mock_session = MockClientSession(*_responses)
+	def _create_session(self):
+		return self.mock_session
+
+class TestAsyncAPI(unittest.TestCase):
+	def should_perform_async_calls(self):
+		import asyncio
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				MockClientSession.Response(content={'data':'test'}),
+				MockClientSession.Response(content={'data':'v4'}),
+				]) as obj:
+				response = await obj.get('path', 'to', 'request', flag=True, skipped=None)
+				self.assertEqual(response.data, 'test')
+				response = await obj.v4.post('path', _body={'request':'value'})
+				self.assertEqual(response.data, 'v4')
+				return obj
+		obj = asyncio.run(main())
+		self.assertTrue(obj.mock_session.closed)
+		method, uri, kwargs = obj.mock_session.requests[0]
+		self.assertEqual((method, uri), ('GET', 'http://localhost/api/v3/path/to/request'))
+		self.assertEqual(kwargs['params'], {'flag':'True'})
+		self.assertNotIn('data', kwargs)
+		method, uri, kwargs = obj.mock_session.requests[1]
+		self.assertEqual((method, uri), ('POST', 'http://localhost/api/v4/path'))
+		self.assertEqual(json.loads(kwargs['data']), {'request':'value'})
+		self.assertEqual(obj._delay.waited_for, ['GET', 'POST'])
+		self.assertTrue(obj._delay.updated)
+	def should_return_async_responses_as_text_if_requested(self):
+		import asyncio
+		response = MockClientSession.Response()
+		response.content = MockClientSession.StreamReader('<svg>Avatar</svg>'.encode('utf-8'))
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[response]) as obj:
+				return await obj.call('GET', obj.get_url('export', 'avatar-jcdenton.html'), as_json=False)
+		self.assertEqual(asyncio.run(main()), '<svg>Avatar</svg>')
+	def should_not_block_event_loop_with_rate_limiter_and_response_cache(self):
+		import asyncio, threading
+		calls = []
+		def recorded(func):
+			def _wrapper(*args, **kwargs):
+				calls.append((func.__name__, threading.get_ident()))
+				return func(*args, **kwargs)
+			return _wrapper
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', coalesce_window=0, response_cache=cache.ResponseCache(), _responses=[
+				MockClientSession.Response(content={'data':'user'}),
+				MockClientSession.Response(content={'data':'sleeping'}),
+				]) as obj:
+				for name in ['delay_for', 'update']:
+					setattr(obj._delay, name, recorded(getattr(obj._delay, name)))
+				for name in ['lookup', 'store', 'invalidate']:
+					setattr(obj.response_cache, name, recorded(getattr(obj.response_cache, name)))
+				await obj.get('user')
+				await obj.post('user', 'sleep')
+				return threading.get_ident()
+		loop_thread = asyncio.run(main())
+		self.assertEqual(sorted(set(name for name, _ in calls)), ['delay_for', 'invalidate', 'lookup', 'store', 'update'])
+		self.assertNotIn(loop_thread, [thread for _, thread in calls])
+	def should_stream_async_responses(self):
+		import asyncio
+		ok = MockClientSession.Response(content={'data':[{'id':'first'}, {'id':'second'}], 'appVersion':'5.0.0'})
+		failed = MockClientSession.Response(status=404, reason='Not Found', content={'message':'Not found'})
+		async def main():
+			async with MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[ok, failed]) as obj:
+				obj.STREAM_CHUNK_SIZE = 5
+				items = []
+				async for item in obj.get('groups', 'party', 'members', _stream=True):
+					self.assertFalse(ok.exited)
+					items.append(item)
+				self.assertTrue(ok.exited)
+				with self.assertRaises(requests.exceptions.HTTPError):
+					async for item in obj.get('groups', 'unknown', 'members', _stream=True): # pragma: no cover
+						pass
+				self.assertTrue(failed.exited)
+				return obj, items
+		obj, items = asyncio.run(main())
+		self.assertEqual(items, [{'id':'first'}, {'id':'second'}])
+		self.assertEqual(obj.app_version, '5.0.0')
+	def should_retry_async_calls_and_convert_errors(self):
+		import asyncio
+		async def main():
+			obj = MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				ConnectionResetError(),
+				asyncio.TimeoutError(),
+				MockClientSession.Response(status=502, reason='Bad Gateway', content={}),
+				MockClientSession.Response(content={'data':'test'}),
+				MockClientSession.Response(status=404, reason='Not Found', content={'message':'Not found'}),
+				])
+			response = await obj.get('path')
+			self.assertEqual(response.data, 'test')
+			with self.assertRaises(MyException):
+				with api.API.Exceptions(MyException):
+					await obj.put('path')
+			await obj.close()
+		asyncio.run(main())
+	def should_retry_async_post_only_if_connection_was_not_established(self):
+		import asyncio
+		async def main():
+			obj = MockAsyncAPI('http://localhost/', 'login', 'password', _responses=[
+				ConnectionRefusedError(),
+				MockClientSession.Response(content={'data':'test'}),
+				ConnectionResetError(),
+				])
+			response = await obj.post('tasks', 'armory', 'score', 'up')
+			self.assertEqual(response.data, 'test')
+			with self.assertRaises(requests.exceptions.ConnectionError):
+				await obj.post('tasks', 'armory', 'score', 'up')
+			await obj.close()
+		asyncio.run(main())
+	def should_share_rate_limit_between_concurrent_calls(self):
+		import asyncio
+		delays = []
+		async def mock_sleep(delay):
+			delays.append(delay)
+		async def main():
+			obj = MockAsyncAPI('http://localhost/', 'login', 'password')
+			obj._delay = api.RateLimiter(limit=2, period=60)
+			obj._create_session = lambda: MockClientSession(*[
+				MockClientSession.Response(content={'data':'test'}) for _ in range(3)
+				])
+			with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)):
+				with unittest.mock.patch('asyncio.sleep', mock_sleep):
+					await asyncio.gather(obj.get('a'), obj.get('b'), obj.post('c'))
+			await obj.close()
+		asyncio.run(main())
+		self.assertEqual(delays, [30])
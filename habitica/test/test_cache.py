@@ -0,0 +1,113 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import tempfile
+from pathlib import Path
+from .. import cache
+
+class TestPolicies(unittest.TestCase):
+	def should_match_endpoints_by_pattern(self):
+		response_cache = cache.ResponseCache()
+		self.assertEqual(response_cache.policy('user').pattern, 'user')
+		self.assertEqual(response_cache.policy('members/joegreen').pattern, 'members/*')
+		self.assertEqual(response_cache.policy('groups/party/members').pattern, 'groups/*/members')
+		self.assertIsNone(response_cache.policy('members/joegreen/objections/transfer-gems'))
+		self.assertIsNone(response_cache.policy('status'))
+	def should_detect_fresh_stale_and_expired_entries(self):
+		response_cache = cache.ResponseCache()
+		policy = cache.Policy('user', ttl=30, stale=30)
+		entry = cache.Entry('user', {}, 1000, None, 2)
+		self.assertEqual(response_cache.state(policy, entry, now=1030), response_cache.FRESH)
+		self.assertEqual(response_cache.state(policy, entry, now=1060), response_cache.STALE)
+		self.assertEqual(response_cache.state(policy, entry, now=1061), response_cache.EXPIRED)
+		self.assertEqual(response_cache.state(cache.Policy('content'), entry, now=10**10), response_cache.FRESH)
+	def should_invalidate_versioned_entries_on_version_change(self):
+		response_cache = cache.ResponseCache()
+		policy = cache.Policy('content', ttl=60, versioned=True)
+		entry = cache.Entry('content', {}, 1000, '5.0.0', 2)
+		self.assertEqual(response_cache.state(policy, entry, now=2000), response_cache.EXPIRED)
+		response_cache.set_version('5.0.0')
+		self.assertEqual(response_cache.state(policy, entry, now=2000), response_cache.FRESH)
+		response_cache.set_version('5.0.1')
+		self.assertEqual(response_cache.state(policy, entry, now=1010), response_cache.EXPIRED)
+
+class TestResponseCache(unittest.TestCase):
+	def should_cache_responses_of_known_endpoints_only(self):
+		response_cache = cache.ResponseCache()
+		calls = []
+		def fetch():
+			calls.append(1)
+			return {'data':len(calls)}
+		self.assertEqual(response_cache.get('user', 'user-key', fetch), {'data':1})
+		self.assertEqual(response_cache.get('user', 'user-key', fetch), {'data':1})
+		self.assertEqual(response_cache.get('status', 'status-key', fetch), {'data':2})
+		self.assertEqual(response_cache.get('status', 'status-key', fetch), {'data':3})
+		self.assertEqual(response_cache.stats(), {'hits':1, 'misses':1, 'refreshes':0, 'entries':1, 'bytes':len('{"data": 1}')})
+	def should_return_new_copy_of_body_for_every_hit(self):
+		response_cache = cache.ResponseCache()
+		body = {'data':{'items':['sword']}}
+		self.assertIs(response_cache.get('user', 'user', lambda: body), body)
+		body['data']['items'].append('shield')
+		hit = response_cache.get('user', 'user', lambda: {'data':'new'})
+		self.assertEqual(hit, {'data':{'items':['sword']}})
+		hit['data']['items'].append('pistol')
+		hit['data']['gold'] = 100
+		self.assertEqual(response_cache.get('user', 'user', lambda: {'data':'new'}), {'data':{'items':['sword']}})
+	def should_evict_least_recently_used_entries(self):
+		response_cache = cache.ResponseCache(max_entries=2, max_bytes=40)
+		response_cache.store('members/first', 'first', {'data':'first'})
+		response_cache.store('members/second', 'second', {'data':'second'})
+		response_cache.lookup('members/first', 'first')
+		response_cache.store('members/third', 'third', {'data':'third'})
+		self.assertEqual(response_cache.memory.keys(), ['first', 'third'])
+		response_cache.store('members/huge', 'huge', {'data':'x' * 40})
+		self.assertEqual(response_cache.memory.keys(), ['first', 'third'])
+		response_cache.store('members/fourth', 'fourth', {'data':'fourth'})
+		self.assertEqual(response_cache.memory.keys(), ['third', 'fourth'])
+		self.assertLessEqual(response_cache.memory.total_bytes, 40)
+	def should_return_stale_entries_and_refresh_them_in_background(self):
+		response_cache = cache.ResponseCache()
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			response_cache.store('user', 'user', {'data':'old'})
+			get_time.return_value = 1040
+			self.assertEqual(response_cache.get('user', 'user', lambda: {'data':'new'}), {'data':'old'})
+			response_cache.close()
+			self.assertEqual(response_cache.get('user', 'user', lambda: {'data':'newest'}), {'data':'new'})
+			get_time.return_value = 1200
+			self.assertEqual(response_cache.get('user', 'user', lambda: {'data':'newest'}), {'data':'newest'})
+		self.assertEqual(response_cache.refreshes, 1)
+	def should_not_break_on_failed_background_refresh(self):
+		response_cache = cache.ResponseCache()
+		def fetch():
+			raise RuntimeError('Network error')
+		with unittest.mock.patch('time.time', unittest.mock.MagicMock(return_value=1000)) as get_time:
+			response_cache.store('user', 'user', {'data':'old'})
+			get_time.return_value = 1040
+			self.assertEqual(response_cache.get('user', 'user', fetch), {'data':'old'})
+			response_cache.close()
+			self.assertEqual(response_cache.lookup('user', 'user')[0].value(), {'data':'old'})
+	def should_invalidate_entries_on_writes(self):
+		response_cache = cache.ResponseCache()
+		for path in ['user', 'tasks/user', 'members/joegreen', 'content']:
+			response_cache.store(path, path, {})
+		response_cache.invalidate('tasks/1234/score/up')
+		self.assertEqual(sorted(response_cache.memory.keys()), ['content', 'members/joegreen'])
+		response_cache.invalidate('some/unknown/endpoint')
+		self.assertEqual(response_cache.memory.keys(), [])
+	def should_keep_entries_on_disk(self):
+		with tempfile.TemporaryDirectory() as tempdir:
+			first = cache.ResponseCache(directory=Path(tempdir)/'responses', max_disk_entries=3)
+			first.store('user', ('GET', 'user'), {'data':'user'})
+			first.store('members/joegreen', ('GET', 'members/joegreen'), {'data':'member'})
+			second = cache.ResponseCache(directory=Path(tempdir)/'responses')
+			entry, state = second.lookup('user', ('GET', 'user'))
+			self.assertEqual(entry.value(), {'data':'user'})
+			self.assertEqual(state, second.FRESH)
+			self.assertIsNone(second.lookup('user', ('GET', 'user', 'other'))[0])
+			second.invalidate('user/sleep')
+			self.assertIsNone(cache.ResponseCache(directory=Path(tempdir)/'responses').lookup('user', ('GET', 'user'))[0])
+			self.assertIsNotNone(second.lookup('members/joegreen', ('GET', 'members/joegreen'))[0])
+			for index in range(5):
+				first.store('members/{0}'.format(index), index, {})
+			self.assertEqual(len(list(Path(tempdir, 'responses').glob('*.response.json'))), 3)
+			first.clear()
+			self.assertEqual(len(list(Path(tempdir, 'responses').glob('*.response.json'))), 0)
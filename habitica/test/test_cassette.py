@@ -0,0 +1,111 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import json
+import gzip
+import tempfile
+from pathlib import Path
+import requests
+from .. import cassette
+from .test_api import MockAPI
+
+class MockSession:
+	def __init__(self, *responses):
+		self.responses = list(responses)
+		self.requests = []
+		self.closed = False
+	def _request(self, method, url, **kwargs):
+		self.requests.append((method, url, kwargs))
+		status, body, headers = self.responses.pop(0)
+		response = requests.models.Response()
+		response.status_code = status
+		response.reason = 'OK' if status == 200 else 'Error'
+		response.url = url
+		response.headers = requests.structures.CaseInsensitiveDict(headers or {})
+		response._content = json.dumps(body).encode('utf-8')
+		return response
+	def get(self, url, **kwargs):
+		return self._request('GET', url, **kwargs)
+	def post(self, url, **kwargs):
+		return self._request('POST', url, **kwargs)
+	def put(self, url, **kwargs): # pragma: no cover
+		return self._request('PUT', url, **kwargs)
+	def delete(self, url, **kwargs): # pragma: no cover
+		return self._request('DELETE', url, **kwargs)
+	def mount(self, prefix, adapter):
+		pass
+	def close(self):
+		self.closed = True
+
+class TestCassette(unittest.TestCase):
+	def setUp(self):
+		self.tempdir = tempfile.TemporaryDirectory()
+		self.filename = Path(self.tempdir.name)/'session.jsonl.gz'
+	def tearDown(self):
+		self.tempdir.cleanup()
+	def _record(self, *responses):
+		session = MockSession(*responses)
+		with unittest.mock.patch('requests.Session', return_value=session):
+			with MockAPI('http://localhost/', 'login', 'secret-key', transport=cassette.Recorder(self.filename)) as api_obj:
+				api_obj.get('user', userFields='stats')
+				api_obj.post('tasks', 'armory', 'score', 'up')
+				api_obj.post('tasks', 'armory', 'score', 'up')
+				with self.assertRaises(requests.exceptions.HTTPError):
+					api_obj.get('members', 'unknown')
+		self.assertTrue(session.closed)
+		return session
+	def should_record_interactions_without_credentials(self):
+		session = self._record(
+				(200, {'data':{'id':'login', 'apiToken':'secret-key', 'notes':'key is secret-key'}}, {'X-RateLimit-Remaining':'29', 'Set-Cookie':'session'}),
+				(200, {'data':{'delta':1}}, {}),
+				(200, {'data':{'delta':2}}, {}),
+				(404, {'message':'Not found'}, {}),
+				)
+		self.assertEqual(len(session.requests), 4)
+		self.assertEqual(session.requests[0][2]['headers']['x-api-key'], 'secret-key')
+		interactions = cassette.Cassette(self.filename).load()
+		self.assertEqual([(_['method'], _['path'], _['status']) for _ in interactions], [
+			('GET', '/api/v3/user', 200),
+			('POST', '/api/v3/tasks/armory/score/up', 200),
+			('POST', '/api/v3/tasks/armory/score/up', 200),
+			('GET', '/api/v3/members/unknown', 404),
+			])
+		self.assertEqual(interactions[0]['query'], [['userFields', 'stats']])
+		self.assertEqual(interactions[0]['headers'], {'X-RateLimit-Remaining':'29'})
+		self.assertEqual(json.loads(interactions[0]['content']), {'data':{'id':'login', 'apiToken':'REDACTED', 'notes':'key is REDACTED'}})
+		self.assertNotIn(b'secret-key', gzip.decompress(self.filename.read_bytes()))
+	def should_replay_recorded_interactions(self):
+		self._record(
+				(200, {'data':{'id':'login'}}, {'X-RateLimit-Remaining':'0'}),
+				(200, {'data':{'delta':1}}, {}),
+				(200, {'data':{'delta':2}}, {}),
+				(404, {'message':'Not found'}, {}),
+				)
+		session = MockSession()
+		player = cassette.Player(self.filename, latency=0.001)
+		with unittest.mock.patch('requests.Session', return_value=session):
+			with MockAPI('http://example.com/', 'login', 'other-key', transport=player) as api_obj:
+				self.assertEqual(api_obj.get('user', userFields='stats').data.id, 'login')
+				self.assertTrue(session.closed)
+				self.assertEqual(api_obj.post('tasks', 'armory', 'score', 'up').data.delta, 1)
+				self.assertEqual(api_obj.post('tasks', 'armory', 'score', 'up').data.delta, 2)
+				self.assertEqual(api_obj.post('tasks', 'armory', 'score', 'up').data.delta, 2)
+				with self.assertRaises(requests.exceptions.HTTPError) as e:
+					api_obj.get('members', 'unknown')
+				self.assertEqual(e.exception.response.status_code, 404)
+				with self.assertRaises(cassette.CassetteError):
+					api_obj.get('user')
+		self.assertEqual(session.requests, [])
+		self.assertNotIn('X-RateLimit-Remaining', player.get('http://localhost/api/v3/user', params={'userFields':'stats'}).headers)
+	def should_stream_replayed_responses_and_simulate_recorded_latency(self):
+		self._record(
+				(200, {'data':[{'id':'first'}, {'id':'second'}]}, {'X-RateLimit-Remaining':'0'}),
+				(200, {'data':{}}, {}),
+				(200, {'data':{}}, {}),
+				(404, {}, {}),
+				)
+		player = cassette.Player(self.filename, latency='recorded', rate_limits=True)
+		response = player.get('http://localhost/api/v3/user', params={'userFields':'stats'})
+		self.assertEqual(response.headers['x-ratelimit-remaining'], '0')
+		self.assertEqual(b''.join(response.iter_content(5)), json.dumps({'data':[{'id':'first'}, {'id':'second'}]}).encode('utf-8'))
+		response.close()
+		player.close()
@@ -4,7 +4,12 @@ import textwrap
 import datetime
 import itertools
 import io, contextlib
+import threading
+import types
+import copy
+import click.testing
 from .. import cli, core
+from .mock_api import MockAPI, MockDataRequest, MockData
 
 class TestTaskFilter(unittest.TestCase):
 	def _parse_args(self, args):
@@ -146,3 +151,64 @@ class TestPrinter(unittest.TestCase):
 				    [X] 3.2 complete all tasks
 				    [_] 3.3 rest
 				"""))
+
+class TestBulkExecutor(unittest.TestCase):
+	def should_report_results_in_original_order(self):
+		first_is_done = threading.Event()
+		def action(item):
+			if item.id == 'first':
+				if not first_is_done.wait(5): # pragma: no cover
+					raise RuntimeError('Items are not processed concurrently')
+			elif item.id == 'failed':
+				raise RuntimeError('Cannot complete')
+			else:
+				first_is_done.set()
+			return item.id.upper()
+		items = [types.SimpleNamespace(id=item_id) for item_id in ['first', 'second', 'failed']]
+		results = list(cli.BulkExecutor(max_workers=2).run(action, items))
+		self.assertEqual([result.item for result in results], items)
+		self.assertEqual([result.value for result in results], ['FIRST', 'SECOND', None])
+		self.assertEqual([str(result.error) for result in results], ['None', 'None', 'Cannot complete'])
+	def should_process_items_with_the_same_key_sequentially(self):
+		task = types.SimpleNamespace(id='task')
+		items = [types.SimpleNamespace(id='item{0}'.format(i), parent=task) for i in range(5)] + [task]
+		processed, active = [], []
+		lock = threading.Lock()
+		def action(item):
+			with lock:
+				active.append(item)
+				self.assertEqual(len(active), 1)
+			processed.append(item.id)
+			with lock:
+				active.remove(item)
+		results = list(cli.BulkExecutor(max_workers=4).run(action, items))
+		self.assertEqual([result.error for result in results], [None] * 6)
+		self.assertEqual(processed, ['item0', 'item1', 'item2', 'item3', 'item4', 'task'])
+
+class TestCommands(unittest.TestCase):
+	def _habitica(self, *requests):
+		area51 = copy.deepcopy(MockData.TODOS['majestic12'])
+		area51.update(id='area51', text='Infiltrate Area 51')
+		return core.Habitica(_api=MockAPI(
+			MockDataRequest('get', ['tasks', 'user'], [MockData.TODOS['majestic12'], area51]),
+			*requests
+			))
+	def should_exit_with_error_if_some_bulk_items_failed(self):
+		habitica = self._habitica(
+			MockDataRequest('post', ['tasks', 'majestic12', 'score', 'up'], {'delta':1}),
+			)
+		result = click.testing.CliRunner().invoke(cli.todos_done, ['1,2'], obj=habitica)
+		self.assertIsInstance(result.exception, SystemExit)
+		self.assertEqual(result.exit_code, 1)
+		self.assertEqual([request.path for request in habitica.api.responses], [
+			['tasks', 'user'],
+			['tasks', 'majestic12', 'score', 'up'],
+			])
+	def should_exit_successfully_if_all_bulk_items_succeeded(self):
+		habitica = self._habitica(
+			MockDataRequest('post', ['tasks', 'majestic12', 'score', 'up'], {'delta':1}),
+			MockDataRequest('post', ['tasks', 'area51', 'score', 'up'], {'delta':1}),
+			)
+		result = click.testing.CliRunner().invoke(cli.todos_done, ['1,2'], obj=habitica)
+		self.assertEqual(result.exit_code, 0, result.output)
+		self.assertFalse(habitica.api.requests)
@@ -1,6 +1,7 @@
 import unittest, unittest.mock
 unittest.defaultTestLoader.testMethodPrefix = 'should'
 import datetime
+import threading
 import copy
 from collections import namedtuple
 from .. import core, api, timeutils
@@ -25,6 +26,10 @@ class TestBaseHabitica(unittest.TestCase):
 		content.my_value = 'foo'
 		content = habitica.content
 		self.assertEqual(content.my_value, 'foo')
+	def should_retrieve_mapped_content(self):
+		habitica = core.Habitica(_api=MockAPI(
+			), mapped_content=True)
+		self.assertEqual(habitica.content.potion.text, 'Health Potion')
 	def should_get_user_proxy_without_calls(self):
 		habitica = core.Habitica(_api=MockAPI(
 			))
@@ -451,6 +456,20 @@ class TestChallenges(unittest.TestCase):
 		members = list(challenge.members())
 		self.assertEqual(members[0].id, 'mj12trooper1')
 		self.assertEqual(members[30].id, 'mj12trooper31')
+	def should_stream_members_with_tasks(self):
+		habitica = core.Habitica(_api=MockAPI(
+			MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
+			MockDataRequest('get', ['groups', 'party', 'members'], [
+				MockData.MEMBERS['mj12trooper{0}'.format(i)] for i in range(1, 31)
+				]),
+			MockDataRequest('get', ['groups', 'party', 'members'], []),
+			))
+		party = next(_ for _ in habitica.groups(core.Group.GUILDS) if _.id == 'party')
+		members = party.members(includeTasks=True)
+		self.assertEqual(next(members).id, 'mj12trooper1')
+		self.assertEqual(habitica.api.responses[-1].params, {'includeAllPublicFields':False, 'includeTasks':True})
+		self.assertEqual(len(list(members)), 29)
+		self.assertEqual(habitica.api.responses[-1].params, {'includeAllPublicFields':False, 'includeTasks':True, 'lastId':'mj12trooper30'})
 	def should_create_task_for_challenge(self):
 		habitica = core.Habitica(_api=MockAPI(
 			MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
@@ -1670,6 +1689,31 @@ class TestEvents(unittest.TestCase):
 			"Class changed from 'rogue' to 'warrior'",
 			"Gp: +805.246",
 			])
+	def should_serialize_user_updates_from_worker_threads(self):
+		habitica = core.Habitica(_api=MockAPI(
+			MockDataRequest('get', ['user'], MockData.USER),
+			))
+		user = habitica.user()
+		inside, release = threading.Event(), threading.Event()
+		diff_dict_deep = core.base.diff_dict_deep
+		def slow_diff(*args, **kwargs):
+			if not inside.is_set():
+				inside.set()
+				release.wait(5)
+			return diff_dict_deep(*args, **kwargs)
+		with unittest.mock.patch('habitica.core.base.diff_dict_deep', slow_diff):
+			first = threading.Thread(target=user._update, args=({'stats':{'gp':20.0}},))
+			first.start()
+			inside.wait(5)
+			second = threading.Thread(target=user._update, args=({'stats':{'gp':30.0}},))
+			second.start()
+			second.join(0.1)
+			self.assertTrue(second.is_alive())
+			release.set()
+			first.join()
+			second.join()
+		self.assertEqual(user.stats.gold, 30.0)
+		self.assertEqual(list(map(str, habitica.events.dump())), ['Gp: +5.0', 'Gp: +10.0'])
 
 class TestHabits(unittest.TestCase):
 	def should_get_list_of_user_habits(self):
@@ -2026,6 +2070,21 @@ class TestTodos(unittest.TestCase):
 		self.assertTrue(challenge.broken)
 		self.assertEqual(challenge.winner, 'jcdenton')
 		self.assertEqual(challenge().id, 'unatco')
+	def should_keep_group_info_separate_for_tasks_of_the_same_group(self):
+		habitica = core.Habitica(_api=MockAPI(), identity_map=True)
+		first, second = habitica.children(core.Todo, [
+			{'id':'t{0}'.format(index), 'text':'Task', 'group':{'id':'unatco', 'taskId':'t{0}'.format(index), 'approval':{'required':index == 1}}}
+			for index in (1, 2)
+			])
+		self.assertIsNot(second.group, first.group)
+		self.assertEqual(first.group.taskId, 't1')
+		self.assertTrue(first.group.approval.required)
+		self.assertEqual(second.group.taskId, 't2')
+		self.assertFalse(second.group.approval.required)
+		self.assertEqual(first._data['group']['taskId'], 't1')
+		self.assertIs(first.group._parent, first)
+		self.assertIs(second.group._parent, second)
+		self.assertIs(habitica.child(core.Todo, {'id':'t1', 'text':'Updated'}), first)
 	def should_complete_todo(self):
 		habitica = core.Habitica(_api=MockAPI(
 			MockDataRequest('get', ['user'], MockData.USER),
@@ -0,0 +1,190 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import asyncio
+from .. import core
+from .mock_api import MockAPI, MockRequest, MockDataRequest, MockData
+
+class MockAsyncAPI:
+	""" Async wrapper for MockAPI.
+	Actual mock requests are performed within event loop.
+	"""
+	class MockAsyncAPIv4:
+		def __init__(self, api):
+			self.api = api
+		async def post(self, *path, **params):
+			await asyncio.sleep(0)
+			return self.api.v4.post(*path, **params)
+	def __init__(self, *requests):
+		self.api = MockAPI(*requests)
+		self.closed = False
+	@property
+	def base_url(self):
+		return self.api.base_url
+	@property
+	def v4(self):
+		return self.MockAsyncAPIv4(self.api)
+	def cached(self, *args, **kwargs):
+		return self
+	def set_response_hook(self, hook):
+		self.api.set_response_hook(hook)
+	def get(self, *path, _stream=False, **params):
+		if _stream:
+			return self._stream(*path, **params)
+		return self._get(*path, **params)
+	async def _get(self, *path, **params):
+		await asyncio.sleep(0)
+		return self.api.get(*path, **params)
+	async def _stream(self, *path, **params):
+		for item in self.api.get(*path, _stream=True, **params):
+			await asyncio.sleep(0)
+			yield item
+	async def get_sharded(self, *path, **params):
+		await asyncio.sleep(0)
+		return self.api.get_sharded(*path, **params)
+	async def get_mapped(self, *path, **params):
+		await asyncio.sleep(0)
+		return self.api.get_mapped(*path, **params)
+	async def post(self, *path, **params):
+		await asyncio.sleep(0)
+		return self.api.post(*path, **params)
+	async def put(self, *path, **params): # pragma: no cover
+		await asyncio.sleep(0)
+		return self.api.put(*path, **params)
+	async def delete(self, *path, **params): # pragma: no cover
+		await asyncio.sleep(0)
+		return self.api.delete(*path, **params)
+	async def close(self):
+		self.closed = True
+
+def run(coro):
+	return asyncio.run(coro)
+
+class TestAsyncHabitica(unittest.TestCase):
+	def should_get_user_and_tasks(self):
+		async def main():
+			async with core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['user'], MockData.USER),
+				MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.TODOS),
+				)) as habitica:
+				user = await habitica.user()
+				self.assertEqual(user.name, 'JC Denton')
+				self.assertEqual(user.stats.class_name, 'rogue')
+				todos = await user.todos()
+				self.assertEqual(todos[0].text, MockData.ORDERED.TODOS[0]['text'])
+				self.assertTrue(isinstance(todos[0], core.aio.AsyncProxy))
+			return habitica
+		habitica = run(main())
+		self.assertTrue(habitica.api.closed)
+	def should_iterate_over_generators_asynchronously(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
+				MockDataRequest('get', ['groups', 'party', 'members'], [
+					MockData.MEMBERS['mj12trooper{0}'.format(i)] for i in range(1, 31)
+					]),
+				MockDataRequest('get', ['groups', 'party', 'members'], [
+					MockData.MEMBERS['mj12trooper31'],
+					]),
+				)).connect()
+			groups = await habitica.groups(core.Group.GUILDS)
+			party = next(_ for _ in groups if _.id == 'party')
+			members = []
+			async for member in party.members():
+				members.append(member)
+			await habitica.close()
+			return members
+		members = run(main())
+		self.assertEqual(len(members), 31)
+		self.assertEqual(members[0].id, 'mj12trooper1')
+		self.assertEqual(members[30].id, 'mj12trooper31')
+	def should_stream_generators_through_worker_threads(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
+				MockDataRequest('get', ['groups', 'party', 'members'], [
+					MockData.MEMBERS['mj12trooper1'],
+					MockData.MEMBERS['mj12trooper2'],
+					]),
+				)).connect()
+			groups = await habitica.groups(core.Group.GUILDS)
+			party = next(_ for _ in groups if _.id == 'party')
+			members = []
+			async for member in party.members(includeTasks=True):
+				members.append(member)
+			await habitica.close()
+			return members
+		members = run(main())
+		self.assertEqual([member.id for member in members], ['mj12trooper1', 'mj12trooper2'])
+	def should_await_generators_as_lists(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
+				MockDataRequest('get', ['groups', 'party', 'members'], [
+					MockData.MEMBERS['mj12trooper1'],
+					]),
+				)).connect()
+			groups = await habitica.groups(core.Group.GUILDS)
+			party = next(_ for _ in groups if _.id == 'party')
+			members = await party.members()
+			await habitica.close()
+			return members
+		members = run(main())
+		self.assertEqual([member.id for member in members], ['mj12trooper1'])
+	def should_gather_concurrent_calls(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['groups'], MockData.ORDERED.GROUPS),
+				MockDataRequest('get', ['groups', 'party', 'chat'], MockData.PARTY_CHAT),
+				MockDataRequest('get', ['groups', 'unatco', 'chat'], MockData.PARTY_CHAT),
+				)).connect()
+			groups = await habitica.groups(core.Group.GUILDS)
+			groups = [group for group in groups if group.id in ('party', 'unatco')]
+			chats = await asyncio.gather(*(group.chat() for group in groups))
+			await habitica.close()
+			return chats
+		chats = run(main())
+		self.assertEqual(len(chats), 2)
+		self.assertEqual([len(chat) for chat in chats], [len(MockData.PARTY_CHAT)] * 2)
+	def should_require_connection_before_use(self):
+		habitica = core.AsyncHabitica(_api=MockAsyncAPI())
+		with self.assertRaises(RuntimeError):
+			habitica.user
+	def should_pass_content_options_to_habitica(self):
+		async def main():
+			async with core.AsyncHabitica(_api=MockAsyncAPI(), mapped_content=True, identity_map=True) as habitica:
+				return habitica._obj._mapped_content, habitica._obj._identities
+		mapped_content, identities = run(main())
+		self.assertTrue(mapped_content)
+		self.assertIsInstance(identities, core.base.IdentityMap)
+	def should_not_allow_blocking_requests_from_event_loop(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockDataRequest('get', ['news', 'greydeath'], MockData.NEWS),
+				MockDataRequest('get', ['members', 'joegreen'], MockData.MEMBERS['joegreen']),
+				)).connect()
+			post = await habitica.news('greydeath')
+			with self.assertRaises(RuntimeError):
+				post.author
+			author = await post.fetch('author')
+			await habitica.close()
+			return author
+		author = run(main())
+		self.assertEqual(author.id, 'joegreen')
+	def should_pass_v4_calls_and_notifications(self):
+		async def main():
+			habitica = await core.AsyncHabitica(_api=MockAsyncAPI(
+				MockRequest('get', ['news'], {'html':'<div>News</div>', 'message':'Hello'}),
+				MockRequest('post', ['news', 'read'], {}),
+				)).connect()
+			news = await habitica.news()
+			self.assertEqual(str(news.html_text), '<div>News</div>')
+			await news.mark_as_read()
+			await habitica.close()
+			return habitica.events.dump()
+		self.assertEqual(run(main()), ['Hello'])
+	def should_fetch_mapped_content(self):
+		async def main():
+			async with core.AsyncHabitica(_api=MockAsyncAPI(), mapped_content=True) as habitica:
+				content = await habitica.fetch('content')
+				return content.potion.text
+		self.assertEqual(run(main()), 'Health Potion')
@@ -1,7 +1,8 @@
 import unittest, unittest.mock
 unittest.defaultTestLoader.testMethodPrefix = 'should'
+import collections.abc
 from ..core import base
-from ..api import dotdict
+from ..api import dotdict, dataview
 
 class TestUtils(unittest.TestCase):
 	def should_get_text_repr_of_a_number(self):
@@ -73,6 +74,42 @@ class TestUtils(unittest.TestCase):
 					}, },
 				},
 			})
+	def should_diff_and_patch_dicts(self):
+		original = {
+				'profile' : {'name':'JC Denton', 'blurb':'UNATCO'},
+				'stats' : {'hp':50, 'gp':10, 'buffs':{'str':1}},
+				'tags' : ['a', 'b'],
+				}
+		new_values = {
+				'profile' : {'name':'JC Denton'},
+				'stats' : {'hp':45, 'gp':10, 'buffs':{'str':1, 'int':2}},
+				'tags' : ['a'],
+				}
+		changes = base.diff_dict_deep(original, new_values)
+		self.assertEqual(changes, [
+			(('stats', 'hp'), 50, 45),
+			(('stats', 'buffs', 'int'), base.MISSING, 2),
+			(('tags',), ['a', 'b'], ['a']),
+			])
+		self.assertEqual(changes[0].path, ('stats', 'hp'))
+		self.assertEqual(base.diff_dict_deep(original, new_values, removed=True)[0], (('profile', 'blurb'), 'UNATCO', base.MISSING))
+
+		self.assertIs(base.patch_dict(original, changes), original)
+		self.assertEqual(original, {
+				'profile' : {'name':'JC Denton', 'blurb':'UNATCO'},
+				'stats' : {'hp':45, 'gp':10, 'buffs':{'str':1, 'int':2}},
+				'tags' : ['a'],
+				})
+		base.patch_dict(original, base.diff_dict_deep(original, new_values, removed=True))
+		self.assertEqual(original, new_values)
+		self.assertEqual(base.diff_dict_deep(original, new_values, removed=True), [])
+
+class MockEventHandler(base.EventHandler):
+	def __init__(self):
+		super().__init__()
+		self.events = []
+	def add(self, event):
+		self.events.append(str(event))
 
 class MockApiObject(base.ApiObject):
 	pass
@@ -80,12 +117,29 @@ class MockApiObject(base.ApiObject):
 class MockApiInterface(base.ApiInterface):
 	pass
 
+class MockCurrentUser(base.ApiObject):
+	TRACKS_STATS = True
+
 class MockChildApiObject(base.ApiObject):
 	pass
 
 class MockChildApiInterface(base.ApiInterface):
 	pass
 
+class MockEntity(base.Entity):
+	CANONICAL = True
+
+class MockEmbeddedEntity(base.Entity):
+	pass
+
+class MockApiObjectWithChildren(base.ApiObject):
+	@base.cached_child
+	def nested(self):
+		return self.child(MockChildApiObject, self._data['nested'])
+	@base.cached_child
+	def items(self):
+		return self.children(MockChildApiObject, self._data['items'])
+
 class MockAnyObject:
 	pass
 
@@ -98,6 +152,17 @@ class TestApiObject(unittest.TestCase):
 		self.assertEqual(child.api, 'API')
 		self.assertEqual(child.content, 'CONTENT')
 		self.assertEqual(id(child._parent), id(obj))
+	def should_keep_original_dicts_of_response_views_as_data(self):
+		response = dataview({'data':{'id':'foo', 'nested':{'value':1}}})
+		obj = MockApiObject(_data=response.data)
+		self.assertIs(obj._data, response['data'])
+		child = obj.child(MockChildApiObject, response.data.nested)
+		self.assertIs(child._data, response['data']['nested'])
+		root = MockApiInterface()
+		root._identities = base.IdentityMap()
+		entity = root.child(MockEntity, response.data)
+		self.assertIs(entity._data, response['data'])
+		self.assertIs(root.child(MockEntity, response.data), entity)
 	def should_create_api_interface_as_child(self):
 		obj = MockApiObject(_api='API', _parent=self, _content='CONTENT')
 		child = obj.child_interface(MockChildApiInterface)
@@ -128,6 +193,116 @@ class TestApiObject(unittest.TestCase):
 		self.assertEqual(child.api, 'API')
 		self.assertEqual(child.content, 'CONTENT')
 		self.assertEqual(id(child._parent), id(obj))
+	def should_create_children_lazily(self):
+		obj = MockApiObject(_data={'foo':'bar'}, _api='API', _parent=self, _content='CONTENT')
+		entries = ['first', 'second', 'third']
+		with unittest.mock.patch.object(obj, 'child', wraps=obj.child) as create_child:
+			children = obj.children(MockChildApiObject, entries)
+			entries.append('fourth')
+			self.assertEqual(len(children), 3)
+			self.assertEqual(create_child.call_count, 0)
+			self.assertEqual(children[-1]._data, 'third')
+			self.assertEqual(create_child.call_count, 1)
+			first = children[0]
+			self.assertIs(children[0], first)
+			self.assertEqual(create_child.call_count, 2)
+			self.assertEqual([child._data for child in children[1:]], ['second', 'third'])
+			with self.assertRaises(IndexError):
+				children[3]
+		self.assertEqual(children, list(children))
+		self.assertEqual(len(children + [first]), 4)
+		self.assertEqual(len([first] + children), 4)
+		self.assertEqual(obj.children(MockChildApiObject, []), [])
+	def should_not_load_all_mapping_values_for_children(self):
+		class LazyMapping(dict):
+			def __getitem__(self, key):
+				loaded.append(key)
+				return super().__getitem__(key)
+			def values(self):
+				return collections.abc.ValuesView(self)
+		loaded = []
+		obj = MockApiObject(_data={'foo':'bar'}, _api='API', _parent=self, _content='CONTENT')
+		children = obj.children(MockChildApiObject, LazyMapping(first=1, second=2, third=3).values())
+		self.assertEqual(len(children), 3)
+		self.assertEqual(children[1]._data, 2)
+		self.assertEqual([child._data for child in children[1:]], [2, 3])
+		self.assertEqual(loaded, ['second', 'second', 'third'])
+	def should_memoize_derived_children_until_data_is_changed(self):
+		obj = MockApiObjectWithChildren(_data={'nested':{'value':1}, 'items':[1, 2]})
+		nested, items = obj.nested, obj.items
+		self.assertIs(obj.nested, nested)
+		self.assertIs(obj.items, items)
+		self.assertIsInstance(MockApiObjectWithChildren.nested, base.cached_child)
+
+		obj._update({'nested':{'value':2}})
+		self.assertIsNot(obj.nested, nested)
+		self.assertEqual(nested._data, {'value':2}) # Data is shared.
+		obj._update({'items':[3]})
+		self.assertEqual([item._data for item in obj.items], [3])
+
+		nested = obj.nested
+		obj._data = {'nested':{'value':3}, 'items':[]}
+		self.assertIsNot(obj.nested, nested)
+		self.assertEqual(obj.nested._data, {'value':3})
+		self.assertEqual(obj.items, [])
+	def should_map_entities_to_single_live_object(self):
+		root = MockApiInterface()
+		root._identities = base.IdentityMap()
+		first = root.child(MockEntity, {'id':'foo', 'value':1, 'nested':{'value':1}})
+		same = root.child(MockEntity, {'id':'foo', 'value':2})
+		self.assertIs(same, first)
+		self.assertEqual(first._data, {'id':'foo', 'value':2, 'nested':{'value':1}})
+		self.assertIs(root.children(MockEntity, [{'_id':'foo'}])[0], first)
+		self.assertIs(first.child(MockEntity, {'id':'foo'}), first)
+		self.assertIsNot(root.child(base.Entity, {'id':'foo'}), first)
+		embedded = root.child(MockEmbeddedEntity, {'id':'foo', 'value':1})
+		self.assertIsNot(root.child(MockEmbeddedEntity, {'id':'foo', 'value':2}), embedded)
+		self.assertEqual(embedded._data['value'], 1)
+		self.assertIsNot(root.child(MockEntity, {'id':'bar'}), first)
+		self.assertIsNot(MockApiInterface().child(MockEntity, {'id':'foo'}), first)
+
+		other_parent = root.child_interface(MockApiInterface)
+		self.assertIs(other_parent.child(MockEntity, {'id':'foo'}), first)
+		self.assertIs(first._parent, other_parent)
+
+		self.assertEqual(len(root._identities), 1) # Temporary objects are already removed.
+		del first, same, other_parent # Identity map does not keep objects alive.
+		self.assertEqual(len(root._identities), 0)
+		self.assertEqual(root.child(MockEntity, {'id':'foo', 'value':3})._data, {'id':'foo', 'value':3})
+	def should_compare_entities_by_id(self):
+		first, same, other = base.Entity(_data={'id':'foo'}), base.Entity(_data={'_id':'foo'}), base.Entity(_data={'id':'bar'})
+		self.assertEqual(first, same)
+		self.assertEqual(hash(first), hash(same))
+		self.assertNotEqual(first, other)
+		self.assertNotEqual(first, 'foo')
+		self.assertNotEqual(first, MockEntity(_data={'id':'foo'}))
+		self.assertEqual(len({first, same, other, MockEntity(_data={'id':'foo'})}), 3)
+		new, another_new = base.Entity(_data={}), base.Entity(_data={})
+		self.assertEqual(new, new)
+		self.assertNotEqual(new, another_new)
+		self.assertEqual(len({new, another_new}), 2)
+	def should_report_data_changes_on_update(self):
+		events = MockEventHandler()
+		obj = MockCurrentUser(_data={'stats':{'class':'rogue', 'gp':10, 'hp':50}}, _events=events)
+		self.assertEqual(obj._update({'stats':{'class':'rogue', 'gp':15.5}}), [(('stats', 'gp'), 10, 15.5)])
+		self.assertEqual(obj._data, {'stats':{'class':'rogue', 'gp':15.5, 'hp':50}})
+		self.assertEqual(obj._update({'stats':{'class':'warrior', 'gp':15.5, 'hp':45}, 'new':1}), [
+			(('stats', 'class'), 'rogue', 'warrior'),
+			(('stats', 'hp'), 50, 45),
+			(('new',), base.MISSING, 1),
+			])
+		self.assertEqual(obj._update({'new':1}), [])
+		obj._update({'items':{'gp':100}, 'gp':100})
+		other = MockApiObject(_data={'stats':{'class':'rogue', 'gp':10}}, _events=events)
+		other._update({'stats':{'class':'mage', 'gp':20}})
+		self.assertEqual(events.events, ['Gp: +5.5', "Class changed from 'rogue' to 'warrior'"])
+		self.assertEqual(events.stats, {'class':'warrior', 'gp':15.5})
+	def should_keep_api_object_fields_in_slots(self):
+		obj = base.Entity(_data={'id':'foo'}, _api='API', _parent=self, _content='CONTENT')
+		self.assertFalse(hasattr(obj, '__dict__'))
+		with self.assertRaises(AttributeError):
+			obj.unknown_field = 'foo'
+		self.assertEqual(obj.id, 'foo')
 
 class TestValueBar(unittest.TestCase):
 	def should_return_string_representation(self):
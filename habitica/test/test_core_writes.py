@@ -0,0 +1,178 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import tempfile
+from pathlib import Path
+import requests
+from .. import core, journal
+from ..core import writes
+from .mock_api import MockAPI, MockDataRequest, MockData
+
+class TestWriteQueue(unittest.TestCase):
+	def _habitica(self, *requests):
+		habitica = core.Habitica(_api=MockAPI(
+			MockDataRequest('get', ['user'], MockData.USER),
+			MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.DAILIES),
+			*requests
+			))
+		user = habitica.user()
+		return habitica, user, user.dailies()[0]
+	def should_pass_writes_through_when_inactive(self):
+		habitica, user, task = self._habitica(
+			MockDataRequest('put', ['tasks', 'armory'], MockData.DAILIES['armory']),
+			)
+		task.update(text='Restock')
+		self.assertEqual(habitica.api.responses[-1].body, {'text':'Restock'})
+		self.assertEqual(habitica.write_queue().stats()['recorded'], 0)
+	def should_merge_updates_of_the_same_entity(self):
+		habitica, user, task = self._habitica(
+			MockDataRequest('put', ['tasks', 'armory'], MockData.DAILIES['armory']),
+			MockDataRequest('put', ['tasks', 'armory', 'checklist', 'lockpick'], MockData.DAILIES['armory']),
+			)
+		with habitica.write_queue() as queue:
+			task.update(text='Restock')
+			task.update(notes='See Sam', streak=4)
+			task.update(text='Restock at armory again')
+			self.assertEqual(task.text, 'Restock at armory again')
+			self.assertEqual(task.notes, 'See Sam')
+			task[1].update('Choose')
+			task[1].update('Choose lockpick')
+			self.assertEqual(task[1].text, 'Choose lockpick')
+			self.assertEqual(len(habitica.api.responses), 2)
+		self.assertEqual(habitica.api.responses[-2].body, {'text':'Restock at armory again', 'notes':'See Sam', 'streak':4})
+		self.assertEqual(habitica.api.responses[-1].body, {'text':'Choose lockpick'})
+		self.assertEqual(queue.stats(), {'recorded':5, 'sent':2, 'pending':0, 'saved':3})
+	def should_cancel_opposite_writes(self):
+		habitica, user, task = self._habitica()
+		tag = core.Tag(_data={'id':'unatco'})
+		with habitica.write_queue() as queue:
+			task[1].complete()
+			task[1].undo()
+			self.assertFalse(task[1].is_completed)
+			task.add_tag(tag)
+			task.add_tag(tag)
+			self.assertEqual(task._data['tags'], ['unatco'])
+			task.delete_tag(tag)
+			self.assertEqual(task._data['tags'], [])
+			user.sleep()
+			self.assertTrue(user.preferences.sleep)
+			user.wake_up()
+			self.assertFalse(user.preferences.sleep)
+		self.assertEqual(len(habitica.api.responses), 2)
+		self.assertEqual(queue.saved, 7)
+	def should_flush_pending_writes_before_other_requests(self):
+		habitica, user, task = self._habitica(
+			MockDataRequest('post', ['tasks', 'armory', 'checklist', 'lockpick', 'score'], {}),
+			MockDataRequest('get', ['tags'], MockData.ORDERED.TAGS),
+			MockDataRequest('post', ['tasks', 'armory', 'tags', 'unatco'], MockData.DAILIES['armory']),
+			MockDataRequest('post', ['tasks', 'armory', 'move', 'to', '0'], ['armory']),
+			)
+		with habitica.write_queue() as queue:
+			task[1].complete()
+			user.tags()
+			self.assertEqual(habitica.api.responses[-2].path, ['tasks', 'armory', 'checklist', 'lockpick', 'score'])
+			task.add_tag(core.Tag(_data={'id':'unatco'}))
+			task.move_to(0)
+			self.assertEqual(habitica.api.responses[-2].path, ['tasks', 'armory', 'tags', 'unatco'])
+			self.assertEqual(habitica.api.responses[-1].path, ['tasks', 'armory', 'move', 'to', '0'])
+		self.assertEqual(queue.stats(), {'recorded':2, 'sent':2, 'pending':0, 'saved':0})
+	def should_discard_pending_writes_on_error(self):
+		habitica, user, task = self._habitica()
+		with self.assertRaises(RuntimeError):
+			with habitica.write_queue() as queue:
+				task.update(text='Restock')
+				with habitica.write_queue():
+					task.update(notes='See Sam')
+				self.assertEqual(queue.stats()['pending'], 1)
+				raise RuntimeError('Cancelled')
+		self.assertEqual(len(habitica.api.responses), 2)
+		self.assertEqual(queue.stats(), {'recorded':1, 'sent':0, 'pending':0, 'saved':1})
+		self.assertFalse(queue.active)
+	def should_keep_unsent_writes_pending_on_failure(self):
+		habitica, user, task = self._habitica(
+			MockDataRequest('put', ['tasks', 'armory'], MockData.DAILIES['armory']),
+			MockDataRequest('post', ['tasks', 'armory', 'checklist', 'lockpick', 'score'], {}),
+			MockDataRequest('post', ['user', 'sleep'], {}),
+			)
+		with habitica.write_queue() as queue:
+			task.update(text='Restock')
+			task[1].complete()
+			user.sleep()
+			with unittest.mock.patch.object(habitica.api._api, 'post', side_effect=requests.exceptions.ConnectionError('Offline')):
+				with self.assertRaises(requests.exceptions.ConnectionError):
+					queue.flush()
+			self.assertEqual(queue.stats(), {'recorded':3, 'sent':1, 'pending':2, 'saved':0})
+		self.assertEqual([response.path for response in habitica.api.responses[-3:]], [
+			['tasks', 'armory'],
+			['tasks', 'armory', 'checklist', 'lockpick', 'score'],
+			['user', 'sleep'],
+			])
+		self.assertEqual(queue.stats(), {'recorded':3, 'sent':3, 'pending':0, 'saved':0})
+	def should_describe_queued_response(self):
+		self.assertEqual(repr(writes.Queued('POST', ('user', 'sleep'))), 'Queued(POST user/sleep)')
+
+class TestOfflineJournal(unittest.TestCase):
+	def should_save_scoring_to_journal_when_server_is_unavailable(self):
+		with tempfile.TemporaryDirectory() as tempdir:
+			offline = journal.Journal(Path(tempdir)/'journal.jsonl')
+			mock_api = MockAPI(
+				MockDataRequest('get', ['user'], MockData.USER),
+				MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.DAILIES),
+				MockDataRequest('post', ['tasks', 'armory', 'score', 'up'], {'delta':1}),
+				)
+			habitica = core.Habitica(_api=mock_api, journal=offline)
+			task = habitica.user().dailies()[0]
+			with unittest.mock.patch.object(mock_api, 'post', side_effect=requests.exceptions.ConnectTimeout('Offline')):
+				with self.assertLogs('habitica', level='WARNING'):
+					task.complete()
+				self.assertTrue(task.is_completed)
+				self.assertEqual(task._data['value'], 10)
+				with self.assertRaises(requests.exceptions.ConnectionError):
+					task.move_to(0)
+			self.assertEqual([str(entry) for entry in offline.pending()], ['POST tasks/armory/score/up'])
+			self.assertEqual(habitica.replay_journal(), {'sent':1, 'failed':0, 'skipped':0, 'pending':0})
+			self.assertEqual(habitica.api.responses[-1].path, ['tasks', 'armory', 'score', 'up'])
+	def should_save_write_with_unknown_outcome_as_uncertain(self):
+		with tempfile.TemporaryDirectory() as tempdir:
+			offline = journal.Journal(Path(tempdir)/'journal.jsonl')
+			mock_api = MockAPI(
+				MockDataRequest('get', ['user'], MockData.USER),
+				MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.DAILIES),
+				MockDataRequest('post', ['tasks', 'armory', 'score', 'up'], {'delta':1}),
+				)
+			habitica = core.Habitica(_api=mock_api, journal=offline)
+			task = habitica.user().dailies()[0]
+			with unittest.mock.patch.object(mock_api, 'post', side_effect=requests.exceptions.ReadTimeout('Timeout')):
+				with self.assertLogs('habitica', level='WARNING'):
+					task.complete()
+			self.assertEqual([entry.state for entry in offline.pending()], [journal.Entry.UNCERTAIN])
+			self.assertEqual(habitica.replay_journal(), {'sent':0, 'failed':0, 'skipped':1, 'pending':1})
+			self.assertEqual(len(habitica.api.responses), 2)
+			self.assertEqual(habitica.replay_journal(retry_uncertain=True), {'sent':1, 'failed':0, 'skipped':0, 'pending':0})
+			self.assertEqual(habitica.api.responses[-1].path, ['tasks', 'armory', 'score', 'up'])
+	def should_not_replay_scoring_that_failed_with_server_error(self):
+		with tempfile.TemporaryDirectory() as tempdir:
+			offline = journal.Journal(Path(tempdir)/'journal.jsonl')
+			mock_api = MockAPI(
+				MockDataRequest('get', ['user'], MockData.USER),
+				MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.DAILIES),
+				)
+			habitica = core.Habitica(_api=mock_api, journal=offline)
+			task = habitica.user().dailies()[0]
+			response = requests.models.Response()
+			response.status_code = 502
+			with unittest.mock.patch.object(mock_api, 'post', side_effect=requests.exceptions.HTTPError('502 Bad Gateway', response=response)):
+				with self.assertLogs('habitica', level='WARNING'):
+					task.complete()
+			self.assertEqual([entry.state for entry in offline.pending()], [journal.Entry.UNCERTAIN])
+			self.assertEqual(habitica.replay_journal(), {'sent':0, 'failed':0, 'skipped':1, 'pending':1})
+			self.assertEqual(len(habitica.api.responses), 2)
+	def should_pass_errors_through_without_journal(self):
+		mock_api = MockAPI(
+			MockDataRequest('get', ['user'], MockData.USER),
+			MockDataRequest('get', ['tasks', 'user'], MockData.ORDERED.DAILIES),
+			)
+		habitica = core.Habitica(_api=mock_api)
+		task = habitica.user().dailies()[0]
+		with unittest.mock.patch.object(mock_api, 'post', side_effect=requests.exceptions.ConnectionError('Offline')):
+			with self.assertRaises(requests.exceptions.ConnectionError):
+				task.complete()
@@ -0,0 +1,76 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import tempfile
+import requests
+from .. import core
+from .test_api import MockAPI
+from .fake_server import FakeServer, FakeState, FakeError
+
+class TestFakeServer(unittest.TestCase):
+	def setUp(self):
+		self.tempdir = tempfile.TemporaryDirectory()
+		patcher = unittest.mock.patch('habitica.config.get_cache_dir', unittest.mock.MagicMock(return_value=self.tempdir.name))
+		patcher.start()
+		self.addCleanup(patcher.stop)
+		self.addCleanup(self.tempdir.cleanup)
+	def _habitica(self, server):
+		api_obj = MockAPI(server.url, server.user_id, server.api_key)
+		self.addCleanup(api_obj.close)
+		return core.Habitica(_api=api_obj)
+	def should_serve_and_modify_state(self):
+		with FakeServer() as server:
+			habitica = self._habitica(server)
+			user = habitica.user()
+			self.assertEqual(user.name, 'JC Denton')
+			task = user.dailies()[0]
+			self.assertEqual(task.id, 'armory')
+			task.complete()
+			task[1].complete()
+			task.update(text='Restock')
+			task = user.dailies()[0]
+			self.assertTrue(task.is_completed)
+			self.assertTrue(task[1].is_completed)
+			self.assertEqual(task.text, 'Restock')
+			self.assertEqual(task.value, 11)
+
+			party = next(group for group in habitica.groups(core.Group.PARTY) if group.id == 'party')
+			self.assertEqual([member.id for member in party.members()][-2:], ['mj12trooper30', 'mj12trooper31'])
+			party.chat.post('Hello everyone')
+			self.assertEqual(party.chat.messages()[-1].text, 'Hello everyone')
+			self.assertEqual(server.stats(), {'requests':13, 'failed':0, 'throttled':0})
+			with self.assertRaises(FakeError) as e:
+				server.dispatch('GET', 'tasks/unknown')
+			self.assertEqual(e.exception.status, 404)
+	def should_serve_synthetic_data_at_scale(self):
+		state = FakeState.from_mock_data().populate(tasks=400, checklist=50, members=130, member_tasks=2, chat=100)
+		with FakeServer(state) as server:
+			habitica = self._habitica(server)
+			todos = habitica.user.todos()
+			self.assertEqual(len(todos), 100 + 2)
+			self.assertEqual(len(todos[-1].checklist), 50)
+			crowd = next(group for group in habitica.groups(core.Group.GUILDS) if group.id == 'crowd')
+			requests_before = server.stats()['requests']
+			members = list(crowd.members(includeTasks=True))
+			self.assertEqual(len(members), 130)
+			self.assertEqual(members[-1].id, 'member000129')
+			self.assertEqual(server.stats()['requests'] - requests_before, 5) # Paged by 30.
+			self.assertEqual(len(server.dispatch('GET', 'groups/party/chat')), 2 + 100)
+	def should_inject_faults(self):
+		with FakeServer(rate_limit=2, latency=(0, 0.01)) as server:
+			session = requests.Session()
+			self.addCleanup(session.close)
+			headers = {'x-api-user':server.user_id, 'x-api-key':server.api_key}
+			response = session.get(server.url + '/api/v3/status', headers=headers)
+			self.assertEqual(response.json()['data'], {'status':'up'})
+			self.assertEqual(response.headers['X-RateLimit-Remaining'], '1')
+			self.assertEqual(session.get(server.url + '/api/v3/status').status_code, 401)
+			response = session.get(server.url + '/api/v3/status', headers=headers)
+			self.assertEqual(response.status_code, 429)
+			self.assertEqual(response.headers['X-RateLimit-Remaining'], '0')
+			self.assertLessEqual(int(response.headers['Retry-After']), 60)
+			self.assertEqual(server.stats(), {'requests':3, 'failed':0, 'throttled':1})
+		with FakeServer(error_rate=1) as server:
+			with self.assertRaises(requests.exceptions.HTTPError) as e:
+				self._habitica(server).user()
+			self.assertEqual(e.exception.response.status_code, 503)
+			self.assertGreater(server.stats()['failed'], 1) # Retried.
@@ -0,0 +1,110 @@
+import unittest, unittest.mock
+unittest.defaultTestLoader.testMethodPrefix = 'should'
+import tempfile
+from pathlib import Path
+import requests
+import urllib3
+from .. import journal, api
+
+def http_error(status):
+	response = requests.models.Response()
+	response.status_code = status
+	return requests.exceptions.HTTPError('{0} Error'.format(status), response=response)
+
+class MockAPI:
+	def __init__(self, *errors):
+		self.errors = list(errors)
+		self.requests = []
+	def _call(self, method, path, body, query):
+		self.requests.append((method, path, body, query))
+		error = self.errors.pop(0) if self.errors else None
+		if error:
+			raise error
+		return {'data':{}}
+	def post(self, *path, _body=None, **query):
+		return self._call('POST', path, _body, query)
+	def put(self, *path, _body=None, **query):
+		return self._call('PUT', path, _body, query)
+	def delete(self, *path, **query):
+		return self._call('DELETE', path, None, query)
+
+class TestJournal(unittest.TestCase):
+	def setUp(self):
+		self.tempdir = tempfile.TemporaryDirectory()
+		self.journal = journal.Journal(Path(self.tempdir.name)/'journal.jsonl')
+	def tearDown(self):
+		self.tempdir.cleanup()
+	def should_detect_offline_errors(self):
+		self.assertTrue(journal.is_offline(requests.exceptions.ConnectionError()))
+		self.assertTrue(journal.is_offline(requests.exceptions.ReadTimeout()))
+		self.assertTrue(journal.is_offline(http_error(429)))
+		self.assertTrue(journal.is_offline(http_error(503)))
+		self.assertFalse(journal.is_offline(http_error(404)))
+		self.assertFalse(journal.is_offline(ValueError()))
+		self.assertTrue(journal.was_not_sent(api.CircuitOpenError()))
+		self.assertTrue(journal.was_not_sent(requests.exceptions.ConnectTimeout()))
+		self.assertTrue(journal.was_not_sent(http_error(429)))
+		self.assertTrue(journal.was_not_sent(http_error(503)))
+		self.assertFalse(journal.was_not_sent(http_error(500)))
+		self.assertFalse(journal.was_not_sent(http_error(502)))
+		self.assertFalse(journal.was_not_sent(http_error(504)))
+		self.assertFalse(journal.was_not_sent(requests.exceptions.ReadTimeout()))
+		self.assertFalse(journal.was_not_sent(requests.exceptions.ConnectionError()))
+		refused = urllib3.exceptions.NewConnectionError(None, 'Connection refused')
+		self.assertTrue(journal.was_not_sent(requests.exceptions.ConnectionError(urllib3.exceptions.MaxRetryError(None, '/', reason=refused))))
+		self.assertFalse(journal.was_not_sent(requests.exceptions.ConnectionError(urllib3.exceptions.ProtocolError('Connection aborted.'))))
+	def should_record_entries_once_per_key(self):
+		self.assertEqual(self.journal.entries(), [])
+		first = self.journal.record('post', ('tasks', 'armory', 'score', 'up'))
+		self.assertEqual(self.journal.record('post', ('tasks', 'armory', 'score', 'up'), key=first), first)
+		self.journal.record('PUT', ['tasks', 'armory'], body={'text':'Restock'}, query={'flag':True}, key='second')
+		entries = self.journal.entries()
+		self.assertEqual([entry.key for entry in entries], [first, 'second'])
+		self.assertEqual(str(entries[0]), 'POST tasks/armory/score/up')
+		self.assertEqual(entries[1].body, {'text':'Restock'})
+		self.assertEqual(entries[1].query, {'flag':True})
+		self.assertEqual([entry.state for entry in entries], [journal.Entry.PENDING] * 2)
+		with open(str(self.journal.filename), 'a') as f:
+			f.write('{"op": "write", "key": "broken"')
+		with self.assertLogs('habitica', level='WARNING'):
+			self.assertEqual(len(self.journal.pending()), 2)
+	def should_replay_entries_in_order(self):
+		self.journal.record('POST', ['tasks', 'armory', 'score', 'up'], key='first')
+		self.journal.record('PUT', ['tasks', 'armory'], body={'text':'Restock'}, key='second')
+		self.journal.record('DELETE', ['tasks', 'armory', 'tags', 'unatco'], key='third')
+		self.journal.record('POST', ['tasks', 'unknown', 'score', 'up'], key='fourth')
+		self.journal.drop('third')
+		api_obj = MockAPI(None, None, http_error(404))
+		self.assertEqual(self.journal.replay(api_obj), {'sent':2, 'failed':1, 'skipped':0, 'pending':0})
+		self.assertEqual([request[:2] for request in api_obj.requests], [
+			('POST', ('tasks', 'armory', 'score', 'up')),
+			('PUT', ('tasks', 'armory')),
+			('POST', ('tasks', 'unknown', 'score', 'up')),
+			])
+		entries = self.journal.entries()
+		self.assertEqual([(entry.key, entry.state) for entry in entries], [('fourth', journal.Entry.FAILED)])
+		self.assertEqual(entries[0].error, '404 Error')
+		self.assertEqual(self.journal.replay(api_obj)['sent'], 0)
+	def should_stop_replay_when_server_is_still_unavailable(self):
+		self.journal.record('POST', ['tasks', 'armory', 'score', 'up'], key='first')
+		self.journal.record('POST', ['tasks', 'medbay', 'score', 'up'], key='second')
+		with self.assertLogs('habitica', level='WARNING'):
+			stats = self.journal.replay(MockAPI(api.CircuitOpenError('Circuit is open')))
+		self.assertEqual(stats, {'sent':0, 'failed':0, 'skipped':0, 'pending':2})
+		self.assertEqual([entry.state for entry in self.journal.entries()], [journal.Entry.PENDING] * 2)
+
+		with self.assertLogs('habitica', level='WARNING'):
+			stats = self.journal.replay(MockAPI(None, requests.exceptions.ReadTimeout('Timeout')))
+		self.assertEqual(stats, {'sent':1, 'failed':0, 'skipped':0, 'pending':1})
+		self.assertEqual([entry.state for entry in self.journal.entries()], [journal.Entry.UNCERTAIN])
+
+		api_obj = MockAPI()
+		self.assertEqual(self.journal.replay(api_obj), {'sent':0, 'failed':0, 'skipped':1, 'pending':1})
+		self.assertEqual(api_obj.requests, [])
+		self.assertEqual(self.journal.replay(api_obj, retry_uncertain=True), {'sent':1, 'failed':0, 'skipped':0, 'pending':0})
+		self.assertEqual(api_obj.requests, [('POST', ('tasks', 'medbay', 'score', 'up'), None, {})])
+	def should_leave_entry_uncertain_on_unexpected_error(self):
+		self.journal.record('POST', ['tasks', 'armory', 'score', 'up'], key='first')
+		with self.assertRaises(ValueError):
+			self.journal.replay(MockAPI(ValueError('Unexpected')))
+		self.assertEqual([entry.state for entry in self.journal.entries()], [journal.Entry.UNCERTAIN])
@@ -41,6 +41,9 @@ setup(
         'click',
         'click-default-group',
     ],
+    extras_require={
+        'async': ['aiohttp'], # For habitica.api.AsyncAPI and habitica.core.aio
+    },
     entry_points={
         'console_scripts': [
             'habitica = habitica.cli:cli',